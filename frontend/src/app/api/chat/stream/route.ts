@@ -0,0 +1,35 @@
+import { NextRequest, NextResponse } from "next/server";
+
+const TRIAGE_URL = process.env.TRIAGE_URL || "http://triage-agent.learnflow.svc.cluster.local";
+
+// Never cache or pre-render; each request is a live event stream
+export const dynamic = "force-dynamic";
+
+export async function POST(req: NextRequest) {
+  try {
+    const body = await req.json();
+    const res = await fetch(`${TRIAGE_URL}/chat/stream`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+      body: JSON.stringify(body),
+      cache: "no-store",
+    });
+    if (!res.ok || !res.body) {
+      return NextResponse.json({ error: "Triage agent stream failed" }, { status: res.status || 502 });
+    }
+    // Hand the upstream body straight through so events reach the browser as they arrive
+    return new Response(res.body, {
+      headers: {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache, no-transform",
+        Connection: "keep-alive",
+        "X-Accel-Buffering": "no",
+      },
+    });
+  } catch {
+    return NextResponse.json(
+      { error: "Cannot reach triage agent", response: "Backend is not available. Please ensure services are running." },
+      { status: 502 }
+    );
+  }
+}
@@ -4,10 +4,21 @@ const TRIAGE_URL = process.env.TRIAGE_URL || "http://triage-agent.learnflow.svc.
 
 export async function GET(req: NextRequest) {
   const userId = req.nextUrl.searchParams.get("user_id") || "1";
+  const ifNoneMatch = req.headers.get("if-none-match");
   try {
-    const res = await fetch(`${TRIAGE_URL}/progress/${userId}`);
+    const res = await fetch(`${TRIAGE_URL}/progress/${userId}`, {
+      headers: ifNoneMatch ? { "If-None-Match": ifNoneMatch } : {},
+      cache: "no-store",
+    });
+    const etag = res.headers.get("etag");
+    const headers: Record<string, string> = { "Cache-Control": "no-cache" };
+    if (etag) headers.ETag = etag;
+    // Pass revalidation through so unchanged progress costs the browser no body
+    if (res.status === 304) {
+      return new Response(null, { status: 304, headers });
+    }
     const data = await res.json();
-    return NextResponse.json(data);
+    return NextResponse.json(data, { status: res.status, headers });
   } catch {
     return NextResponse.json({ progress: [] }, { status: 502 });
   }
@@ -8,14 +8,20 @@ CREATE TABLE IF NOT EXISTS users (
     created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- conversations and code_submissions are partitioned by month on created_at,
+-- so old months can be detached and archived (see app/partitions.py in
+-- triage-agent). A partitioned table's primary key must include the partition
+-- key. Databases created before partitioning are converted by
+-- k8s/db-partition-migration.sql.
 CREATE TABLE IF NOT EXISTS conversations (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     user_id INT REFERENCES users(id),
     agent TEXT NOT NULL,
     message TEXT NOT NULL,
     role TEXT NOT NULL CHECK (role IN ('user', 'assistant', 'system')),
-    created_at TIMESTAMP DEFAULT NOW()
-);
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
 
 CREATE TABLE IF NOT EXISTS progress (
     id SERIAL PRIMARY KEY,
@@ -27,15 +33,125 @@ CREATE TABLE IF NOT EXISTS progress (
     UNIQUE(user_id, module, topic)
 );
 
+-- Submission code, stdout and stderr are stored once per distinct text in
+-- code_blobs and referenced by id. code, stdout and stderr hold the text of
+-- rows written before code_blobs existed and are NULL otherwise; read
+-- through code_submission_texts to get either.
 CREATE TABLE IF NOT EXISTS code_submissions (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     user_id INT REFERENCES users(id),
-    code TEXT NOT NULL,
-    stdout TEXT DEFAULT '',
-    stderr TEXT DEFAULT '',
+    code TEXT,
+    stdout TEXT,
+    stderr TEXT,
     exit_code INT DEFAULT 0,
+    cached BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    code_blob BIGINT,
+    stdout_blob BIGINT,
+    stderr_blob BIGINT,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Result served from triage-agent's code result cache instead of a fresh run
+ALTER TABLE code_submissions ADD COLUMN IF NOT EXISTS cached BOOLEAN DEFAULT FALSE;
+
+-- Content-addressed submission text: hash is the sha256 of the UTF-8 text.
+-- Rows are immutable and never deleted while referenced. There are no
+-- foreign keys to them: the starter program is referenced by every run in a
+-- class, and key-share locks on one hot row would pile up.
+CREATE TABLE IF NOT EXISTS code_blobs (
+    id BIGSERIAL PRIMARY KEY,
+    hash BYTEA NOT NULL UNIQUE,
+    content TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT NOW()
 );
+-- TOAST compresses a row once it passes toast_tuple_target; the default
+-- (~2KB) would leave most tracebacks and outputs uncompressed
+ALTER TABLE code_blobs SET (toast_tuple_target = 256);
+DO $$
+BEGIN
+    ALTER TABLE code_blobs ALTER COLUMN content SET COMPRESSION lz4;
+EXCEPTION WHEN feature_not_supported THEN
+    NULL;  -- server built without lz4; pglz it is
+END;
+$$;
+
+-- Databases from before code_blobs
+ALTER TABLE code_submissions
+    ADD COLUMN IF NOT EXISTS code_blob BIGINT,
+    ADD COLUMN IF NOT EXISTS stdout_blob BIGINT,
+    ADD COLUMN IF NOT EXISTS stderr_blob BIGINT,
+    ALTER COLUMN code DROP NOT NULL,
+    ALTER COLUMN stdout DROP DEFAULT,
+    ALTER COLUMN stderr DROP DEFAULT;
+
+-- Submissions with their full text, whichever way it was stored
+CREATE OR REPLACE VIEW code_submission_texts AS
+SELECT s.id, s.user_id,
+       COALESCE(c.content, s.code) AS code,
+       COALESCE(o.content, s.stdout, '') AS stdout,
+       COALESCE(e.content, s.stderr, '') AS stderr,
+       s.exit_code, s.cached, s.created_at
+FROM code_submissions s
+LEFT JOIN code_blobs c ON c.id = s.code_blob
+LEFT JOIN code_blobs o ON o.id = s.stdout_blob
+LEFT JOIN code_blobs e ON e.id = s.stderr_blob;
+
+-- Create the partition of ``parent`` for the month containing ``month``,
+-- named <parent>_pYYYY_MM. Rows for that month that already landed in the
+-- default partition are moved into it. Returns the new partition's name, or
+-- NULL if it exists, an existing partition covers the month (a migrated
+-- <parent>_legacy table) or ``parent`` isn't partitioned.
+CREATE OR REPLACE FUNCTION learnflow_create_month_partition(parent TEXT, month DATE)
+RETURNS TEXT LANGUAGE plpgsql AS $$
+DECLARE
+    first_day DATE := date_trunc('month', month);
+    next_day DATE := date_trunc('month', month) + INTERVAL '1 month';
+    part TEXT := format('%s_p%s', parent, to_char(first_day, 'YYYY_MM'));
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass(parent) AND relkind = 'p')
+            OR to_regclass(part) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part, parent);
+    IF to_regclass(parent || '_default') IS NOT NULL THEN
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            parent || '_default', first_day, next_day, part);
+    END IF;
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   parent, part, first_day, next_day);
+    RETURN part;
+EXCEPTION WHEN invalid_object_definition THEN
+    -- "would overlap partition": the month is already covered
+    RETURN NULL;
+END;
+$$;
+
+SELECT c.relkind = 'p' AS conversations_partitioned
+FROM pg_class c WHERE c.oid = 'conversations'::regclass \gset
+
+-- History reads filter on user_id and page on (created_at, id).
+\if :conversations_partitioned
+-- Created on each partition, current and future
+CREATE INDEX IF NOT EXISTS idx_conversations_user_created
+    ON conversations (user_id, created_at, id);
+
+-- Rows outside every month partition land here rather than failing
+CREATE TABLE IF NOT EXISTS conversations_default PARTITION OF conversations DEFAULT;
+CREATE TABLE IF NOT EXISTS code_submissions_default PARTITION OF code_submissions DEFAULT;
+
+-- This month and the next two; app.partitions maintain keeps adding ahead
+SELECT learnflow_create_month_partition(t, (date_trunc('month', NOW()) + make_interval(months => m))::date)
+FROM unnest(ARRAY['conversations', 'code_submissions']) AS t, generate_series(0, 2) AS m;
+\else
+-- Not yet partitioned. CONCURRENTLY avoids locking writes on an existing
+-- table; psql runs each statement in its own transaction, which
+-- CONCURRENTLY requires.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conversations_user_created
+    ON conversations (user_id, created_at, id);
+\endif
 
 -- Seed a demo student
 INSERT INTO users (name, role) VALUES ('Maya', 'student') ON CONFLICT DO NOTHING;
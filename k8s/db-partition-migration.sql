@@ -0,0 +1,147 @@
+-- Convert conversations and code_submissions from plain tables to the
+-- month-partitioned layout in db-migration.sql. Run after db-migration.sql;
+-- on a database that is already partitioned it does nothing.
+--
+-- The existing table is not copied. It becomes the <table>_legacy partition,
+-- covering everything before the cutover (the start of next month), and new
+-- month partitions start at the cutover. The slow parts run online first:
+--
+--   1. A CHECK constraint matching the legacy partition's bounds is added
+--      NOT VALID and then validated, so neither SET NOT NULL nor ATTACH
+--      PARTITION has to scan the table while holding a lock.
+--   2. The (id, created_at) unique index that becomes the legacy partition's
+--      primary key is built CONCURRENTLY.
+--
+-- Then one short transaction swaps the names and attaches the old table.
+-- If the lock can't be taken within lock_timeout, nothing changes and the
+-- script can be run again.
+
+\set ON_ERROR_STOP on
+
+SELECT
+    EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('conversations') AND relkind = 'r')
+        AS migrate_conversations,
+    EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('code_submissions') AND relkind = 'r')
+        AS migrate_code_submissions,
+    -- Rows written during the migration must fall before the cutover, so
+    -- within a day of month end it moves on a month
+    to_char(date_trunc('month', NOW() + INTERVAL '1 day') + INTERVAL '1 month', 'YYYY-MM-DD')
+        AS cutover
+\gset
+
+-- --- conversations ---
+
+\if :migrate_conversations
+\echo Partitioning conversations (legacy rows before :cutover)
+
+-- Rows from before created_at had a default go to the legacy partition
+UPDATE conversations SET created_at = 'epoch' WHERE created_at IS NULL;
+
+ALTER TABLE conversations DROP CONSTRAINT IF EXISTS conversations_legacy_bounds;
+ALTER TABLE conversations ADD CONSTRAINT conversations_legacy_bounds
+    CHECK (created_at IS NOT NULL AND created_at < :'cutover') NOT VALID;
+ALTER TABLE conversations VALIDATE CONSTRAINT conversations_legacy_bounds;
+
+-- Rebuilt if an earlier run was interrupted and left it invalid
+DROP INDEX CONCURRENTLY IF EXISTS conversations_legacy_pkey;
+CREATE UNIQUE INDEX CONCURRENTLY conversations_legacy_pkey ON conversations (id, created_at);
+
+BEGIN;
+SET LOCAL lock_timeout = '10s';
+
+ALTER TABLE conversations RENAME TO conversations_legacy;
+ALTER INDEX idx_conversations_user_created RENAME TO conversations_legacy_user_created_idx;
+ALTER TABLE conversations_legacy ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE conversations_legacy DROP CONSTRAINT conversations_pkey;
+ALTER TABLE conversations_legacy ADD CONSTRAINT conversations_legacy_pkey
+    PRIMARY KEY USING INDEX conversations_legacy_pkey;
+
+-- Constraint names match the legacy table's, which ATTACH PARTITION requires
+CREATE TABLE conversations (
+    id INT NOT NULL DEFAULT nextval('conversations_id_seq'),
+    user_id INT CONSTRAINT conversations_user_id_fkey REFERENCES users(id),
+    agent TEXT NOT NULL,
+    message TEXT NOT NULL,
+    role TEXT NOT NULL CONSTRAINT conversations_role_check CHECK (role IN ('user', 'assistant', 'system')),
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+-- Keeps pg_get_serial_sequence('conversations', 'id') working
+ALTER SEQUENCE conversations_id_seq OWNED BY conversations.id;
+
+ALTER TABLE conversations ATTACH PARTITION conversations_legacy
+    FOR VALUES FROM (MINVALUE) TO (:'cutover');
+ALTER TABLE conversations_legacy DROP CONSTRAINT conversations_legacy_bounds;
+-- Adopts the legacy table's index instead of building a new one
+CREATE INDEX idx_conversations_user_created ON conversations (user_id, created_at, id);
+
+CREATE TABLE conversations_default PARTITION OF conversations DEFAULT;
+SELECT learnflow_create_month_partition('conversations', (:'cutover'::date + make_interval(months => m))::date)
+FROM generate_series(0, 2) AS m;
+
+COMMIT;
+\endif
+
+-- --- code_submissions ---
+
+\if :migrate_code_submissions
+\echo Partitioning code_submissions (legacy rows before :cutover)
+
+UPDATE code_submissions SET created_at = 'epoch' WHERE created_at IS NULL;
+
+ALTER TABLE code_submissions DROP CONSTRAINT IF EXISTS code_submissions_legacy_bounds;
+ALTER TABLE code_submissions ADD CONSTRAINT code_submissions_legacy_bounds
+    CHECK (created_at IS NOT NULL AND created_at < :'cutover') NOT VALID;
+ALTER TABLE code_submissions VALIDATE CONSTRAINT code_submissions_legacy_bounds;
+
+DROP INDEX CONCURRENTLY IF EXISTS code_submissions_legacy_pkey;
+CREATE UNIQUE INDEX CONCURRENTLY code_submissions_legacy_pkey ON code_submissions (id, created_at);
+
+BEGIN;
+SET LOCAL lock_timeout = '10s';
+
+ALTER TABLE code_submissions RENAME TO code_submissions_legacy;
+ALTER TABLE code_submissions_legacy ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE code_submissions_legacy DROP CONSTRAINT code_submissions_pkey;
+ALTER TABLE code_submissions_legacy ADD CONSTRAINT code_submissions_legacy_pkey
+    PRIMARY KEY USING INDEX code_submissions_legacy_pkey;
+
+-- Constraint names match the legacy table's, which ATTACH PARTITION requires
+CREATE TABLE code_submissions (
+    id INT NOT NULL DEFAULT nextval('code_submissions_id_seq'),
+    user_id INT CONSTRAINT code_submissions_user_id_fkey REFERENCES users(id),
+    code TEXT,
+    stdout TEXT,
+    stderr TEXT,
+    exit_code INT DEFAULT 0,
+    cached BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    code_blob BIGINT,
+    stdout_blob BIGINT,
+    stderr_blob BIGINT,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE code_submissions_id_seq OWNED BY code_submissions.id;
+
+ALTER TABLE code_submissions ATTACH PARTITION code_submissions_legacy
+    FOR VALUES FROM (MINVALUE) TO (:'cutover');
+ALTER TABLE code_submissions_legacy DROP CONSTRAINT code_submissions_legacy_bounds;
+
+-- The view followed the rename; point it back at the parent
+CREATE OR REPLACE VIEW code_submission_texts AS
+SELECT s.id, s.user_id,
+       COALESCE(c.content, s.code) AS code,
+       COALESCE(o.content, s.stdout, '') AS stdout,
+       COALESCE(e.content, s.stderr, '') AS stderr,
+       s.exit_code, s.cached, s.created_at
+FROM code_submissions s
+LEFT JOIN code_blobs c ON c.id = s.code_blob
+LEFT JOIN code_blobs o ON o.id = s.stdout_blob
+LEFT JOIN code_blobs e ON e.id = s.stderr_blob;
+
+CREATE TABLE code_submissions_default PARTITION OF code_submissions DEFAULT;
+SELECT learnflow_create_month_partition('code_submissions', (:'cutover'::date + make_interval(months => m))::date)
+FROM generate_series(0, 2) AS m;
+
+COMMIT;
+\endif
@@ -0,0 +1,5 @@
+"""Modules shared by the triage and concepts agents.
+
+Installed into both service images from ``libs/learnflow-common``; the
+services import from here instead of keeping their own copies.
+"""
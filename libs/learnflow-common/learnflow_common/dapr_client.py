@@ -0,0 +1,129 @@
+"""App-scoped HTTP client for calls to the local Dapr sidecar.
+
+One pooled ``httpx.AsyncClient`` is created at startup and reused for every
+service invocation and publish, so requests stop paying a TCP handshake to
+the sidecar each time.
+"""
+import os
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from learnflow_common.metrics import DOWNSTREAM_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+DAPR_MAX_CONNECTIONS = int(os.getenv("DAPR_MAX_CONNECTIONS", "100"))
+DAPR_MAX_KEEPALIVE = int(os.getenv("DAPR_MAX_KEEPALIVE", "20"))
+DAPR_KEEPALIVE_EXPIRY = float(os.getenv("DAPR_KEEPALIVE_EXPIRY", "30"))
+DAPR_HTTP2 = _env_bool("DAPR_HTTP2")
+DAPR_DEFAULT_TIMEOUT = float(os.getenv("DAPR_DEFAULT_TIMEOUT", "30"))
+
+
+class DaprClient:
+    """Pooled client for the Dapr HTTP API with per-route timeouts."""
+
+    def __init__(self, base_url: str, pubsub_name: str,
+                 route_timeouts: Optional[Dict[str, float]] = None):
+        self.base_url = base_url
+        self.pubsub_name = pubsub_name
+        self.route_timeouts = dict(route_timeouts or {})
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        if self._client is not None:
+            return
+        http2 = DAPR_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("DAPR_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1")
+                http2 = False
+        # The sidecar is plaintext localhost, so HTTP/2 has to be prior-knowledge (h2c)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=DAPR_DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=DAPR_MAX_CONNECTIONS,
+                max_keepalive_connections=DAPR_MAX_KEEPALIVE,
+                keepalive_expiry=DAPR_KEEPALIVE_EXPIRY,
+            ),
+            http1=not http2,
+            http2=http2,
+        )
+        logger.info(
+            f"Dapr client ready (max_connections={DAPR_MAX_CONNECTIONS}, "
+            f"keepalive={DAPR_MAX_KEEPALIVE}, http2={http2})"
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("Dapr client used before startup")
+        return self._client
+
+    def timeout_for(self, route: str) -> float:
+        return self.route_timeouts.get(route, DAPR_DEFAULT_TIMEOUT)
+
+    async def _request(self, method: str, target: str, operation: str, url: str,
+                       timeout: float, payload: Any = None) -> httpx.Response:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            resp = await self.client.request(method, url, json=payload, timeout=timeout)
+            outcome = f"{resp.status_code // 100}xx"
+            return resp
+        finally:
+            DOWNSTREAM_SECONDS.observe(time.perf_counter() - start, target, operation, outcome)
+
+    async def _post(self, target: str, operation: str, url: str, payload: Any, timeout: float) -> httpx.Response:
+        return await self._request("POST", target, operation, url, timeout, payload)
+
+    async def healthz(self, timeout: float) -> httpx.Response:
+        """The sidecar's own health endpoint; 204 when it is up."""
+        return await self._request("GET", "dapr", "healthz", "/v1.0/healthz", timeout)
+
+    async def invoke_get(self, app_id: str, method: str, timeout: float) -> httpx.Response:
+        """GET another service's method through Dapr service invocation, e.g. its health check."""
+        return await self._request("GET", app_id, method, f"/v1.0/invoke/{app_id}/method/{method}", timeout)
+
+    async def invoke(self, app_id: str, method: str, payload: Any, route: str) -> httpx.Response:
+        """POST to another service's method through Dapr service invocation."""
+        return await self._post(
+            app_id, method,
+            f"/v1.0/invoke/{app_id}/method/{method}",
+            payload, self.timeout_for(route),
+        )
+
+    async def publish(self, topic: str, data: Any) -> httpx.Response:
+        """Publish a single event to the configured pub/sub component."""
+        return await self._post(
+            self.pubsub_name, "publish",
+            f"/v1.0/publish/{self.pubsub_name}/{topic}",
+            data, self.timeout_for("publish"),
+        )
+
+    async def publish_bulk(self, topic: str, events: List[Any]) -> httpx.Response:
+        """Publish several events in one call; entry ids are list indexes."""
+        entries = [
+            {"entryId": str(i), "event": event, "contentType": "application/json"}
+            for i, event in enumerate(events)
+        ]
+        return await self._post(
+            self.pubsub_name, "publish_bulk",
+            f"/v1.0-alpha1/publish/bulk/{self.pubsub_name}/{topic}",
+            entries, self.timeout_for("publish"),
+        )
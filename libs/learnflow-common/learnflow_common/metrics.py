@@ -0,0 +1,272 @@
+"""In-process Prometheus metrics for the hot path.
+
+Counters, histograms and scrape-time gauges rendered in the Prometheus text
+format on ``GET /metrics``. Everything runs on the event loop thread, so an
+observation is a bisect and a few increments with no locking, and is cheap
+enough to leave on in production.
+"""
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+# Starlette appends the charset to text/* media types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds; covers sub-millisecond stages up to slow upstream calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+
+    def register(self, metric: "_Metric"):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        if registry is not None:
+            registry.register(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in self._values.items()
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, buckets: int):
+        # One slot per bucket plus +Inf; made cumulative at render time
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: "Histogram", labels: Labels):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[Labels, _HistogramChild] = {}
+
+    def observe(self, value: float, *labels: str):
+        child = self._children.get(labels)
+        if child is None:
+            child = self._children[labels] = _HistogramChild(len(self.buckets))
+        # "le" buckets are inclusive, which is what bisect_left gives
+        child.counts[bisect_left(self.buckets, value)] += 1
+        child.sum += value
+
+    def time(self, *labels: str) -> _Timer:
+        """Context manager observing the elapsed seconds of its block."""
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        child = self._children.get(labels)
+        return sum(child.counts) if child else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = _format_labels(self.labelnames + ("le",), labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{base} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge read at scrape time from a callback.
+
+    The callback returns a number, or a dict of label tuples to numbers.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Callable[[], Union[float, Dict[Labels, float]]],
+                 labelnames: Sequence[str] = (), registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self._callback = callback
+
+    def samples(self) -> List[str]:
+        try:
+            values = self._callback()
+        except Exception:
+            return []
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in values.items()
+        ]
+
+
+# --- Metrics shared by every service ---
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "learnflow_http_request_seconds", "Time to serve an HTTP request, including streaming",
+    ("method", "handler", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "learnflow_stage_seconds", "Time spent in each request-handling stage", ("stage",),
+)
+DOWNSTREAM_SECONDS = Histogram(
+    "learnflow_downstream_seconds", "Dapr sidecar call latency by target and outcome",
+    ("target", "operation", "outcome"),
+)
+DB_POOL_ACQUIRE_SECONDS = Histogram(
+    "learnflow_db_pool_acquire_seconds", "Time waiting for a database pool connection",
+)
+
+# Tasks currently blocked in timed_acquire(); non-zero means the pool is saturated
+_pool_waiting = 0
+
+
+@asynccontextmanager
+async def timed_acquire(pool):
+    """``pool.acquire()`` that records the wait in DB_POOL_ACQUIRE_SECONDS."""
+    global _pool_waiting
+    start = time.perf_counter()
+    _pool_waiting += 1
+    try:
+        conn = await pool.acquire()
+    finally:
+        _pool_waiting -= 1
+    DB_POOL_ACQUIRE_SECONDS.observe(time.perf_counter() - start)
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+def pool_waiting() -> int:
+    """Tasks waiting for a pool connection right now."""
+    return _pool_waiting
+
+
+def register_pool_gauges(pool_getter: Callable[[], Any]):
+    """Size, in-use and max connection gauges for an asyncpg pool."""
+    def read(fn: Callable[[Any], float]) -> Callable[[], Optional[float]]:
+        def callback():
+            pool = pool_getter()
+            return fn(pool) if pool is not None else None
+        return callback
+
+    Gauge("learnflow_db_pool_size", "Open connections in the database pool",
+          read(lambda p: p.get_size()))
+    Gauge("learnflow_db_pool_in_use", "Connections currently checked out of the pool",
+          read(lambda p: p.get_size() - p.get_idle_size()))
+    Gauge("learnflow_db_pool_max", "Configured maximum pool size",
+          read(lambda p: p.get_max_size()))
+    Gauge("learnflow_db_pool_waiting", "Tasks waiting for a pool connection",
+          read(lambda p: _pool_waiting))
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording HTTP_REQUEST_SECONDS per endpoint function."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router fills in the matched endpoint on the shared scope
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], handler, str(status))
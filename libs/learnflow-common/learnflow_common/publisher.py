@@ -0,0 +1,167 @@
+"""Background event publisher using the Dapr bulk publish API.
+
+``publish()`` only enqueues, so it never adds latency to a request. A worker
+drains the queue, groups events by topic and sends each group with one bulk
+publish call, retrying failed entries with backoff before giving up.
+``publish_many()`` queues a group of same-topic events that always go out in
+the same call.
+"""
+import asyncio
+import os
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from learnflow_common.dapr_client import DaprClient
+
+logger = logging.getLogger(__name__)
+
+PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", "100"))
+PUBLISH_LINGER = float(os.getenv("PUBLISH_LINGER", "0.05"))
+PUBLISH_MAX_PENDING = int(os.getenv("PUBLISH_MAX_PENDING", "10000"))
+PUBLISH_MAX_RETRIES = int(os.getenv("PUBLISH_MAX_RETRIES", "3"))
+PUBLISH_RETRY_BACKOFF = float(os.getenv("PUBLISH_RETRY_BACKOFF", "0.1"))
+
+_STOP = object()
+
+
+class EventPublisher:
+    def __init__(self, dapr: DaprClient,
+                 batch_size: int = PUBLISH_BATCH_SIZE,
+                 linger: float = PUBLISH_LINGER,
+                 max_pending: int = PUBLISH_MAX_PENDING,
+                 max_retries: int = PUBLISH_MAX_RETRIES,
+                 retry_backoff: float = PUBLISH_RETRY_BACKOFF):
+        self.dapr = dapr
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._worker: Optional[asyncio.Task] = None
+
+        self.enqueued = 0
+        self.published = 0
+        self.dropped = 0
+        self.batches = 0
+        self.retries = 0
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run(), name="event-publisher")
+
+    async def stop(self):
+        """Send everything still queued, then stop the worker."""
+        if self._worker is None:
+            return
+        await self._queue.put(_STOP)
+        await self._worker
+        self._worker = None
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                remaining.append(item)
+        if remaining:
+            await self._send_batch(remaining)
+
+    def publish(self, topic: str, data: Any) -> bool:
+        """Queue an event; returns False (and counts a drop) if the queue is full."""
+        return self.publish_many(topic, [data])
+
+    def publish_many(self, topic: str, events: List[Any]) -> bool:
+        """Queue events that go out together in one bulk publish call.
+
+        Takes one queue slot however many events there are; returns False
+        (and counts them as dropped) if the queue is full.
+        """
+        if not events:
+            return True
+        try:
+            self._queue.put_nowait((topic, events))
+        except asyncio.QueueFull:
+            self.dropped += len(events)
+            logger.warning(f"Publish queue full; dropped {len(events)} {topic} events")
+            return False
+        self.enqueued += len(events)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "published": self.published,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "retries": self.retries,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = loop.time() + self.linger
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._send_batch(batch)
+            if stopping:
+                return
+
+    async def _send_batch(self, batch: List[Tuple[str, List[Any]]]):
+        by_topic: Dict[str, List[Any]] = {}
+        for topic, events in batch:
+            by_topic.setdefault(topic, []).extend(events)
+        for topic, events in by_topic.items():
+            await self._send_topic(topic, events)
+
+    async def _send_topic(self, topic: str, events: List[Any]):
+        pending = events
+        attempt = 0
+        while True:
+            self.batches += 1
+            failed = pending
+            try:
+                resp = await self.dapr.publish_bulk(topic, pending)
+                if resp.status_code < 300:
+                    failed = []
+                else:
+                    failed = self._failed_entries(resp, pending)
+            except Exception as e:
+                logger.warning(f"Bulk publish to {topic} failed: {e}")
+            self.published += len(pending) - len(failed)
+            if not failed:
+                return
+            attempt += 1
+            if attempt > self.max_retries:
+                self.dropped += len(failed)
+                logger.error(f"Dropped {len(failed)} {topic} events after {self.max_retries} retries")
+                return
+            self.retries += 1
+            pending = failed
+            await asyncio.sleep(min(self.retry_backoff * 2 ** (attempt - 1), 5.0))
+
+    @staticmethod
+    def _failed_entries(resp, pending: List[Any]) -> List[Any]:
+        # Dapr reports partial failures as {"failedEntries": [{"entryId": ...}]}
+        try:
+            entries = resp.json().get("failedEntries") or []
+            failed = [pending[int(e["entryId"])] for e in entries]
+        except Exception:
+            return pending
+        return failed or pending
@@ -0,0 +1,65 @@
+"""Pre-serialized JSON bodies with strong ETags.
+
+Cached or otherwise static response bodies are encoded to bytes once and
+served directly. GET and HEAD requests with a matching ``If-None-Match``
+get a bodyless 304.
+"""
+import hashlib
+import json
+from typing import Any, Dict, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+CACHE_CONTROL = "no-cache"
+
+
+class Rendered(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode like FastAPI's JSONResponse does."""
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def make_etag(*parts: bytes) -> str:
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(part)
+    return f'"{digest.hexdigest()}"'
+
+
+def render(obj: Any) -> Rendered:
+    body = dumps(obj)
+    return Rendered(body, make_etag(body))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison as required for If-None-Match (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def json_response(request: Request, rendered: Rendered,
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serve pre-encoded bytes, or a 304 if a GET or HEAD client already has them.
+
+    Other methods ignore If-None-Match; RFC 9110 13.1.2 only allows a 304
+    for GET and HEAD.
+    """
+    response_headers = {"ETag": rendered.etag, "Cache-Control": CACHE_CONTROL}
+    if headers:
+        response_headers.update(headers)
+    if request.method in ("GET", "HEAD") and etag_matches(request.headers.get("if-none-match"), rendered.etag):
+        return Response(status_code=304, headers=response_headers)
+    return Response(content=rendered.body, media_type="application/json", headers=response_headers)
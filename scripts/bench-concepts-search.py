@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Benchmark concepts-agent topic search as the curriculum grows.
+
+Indexes the curriculum shards padded with synthetic topics (6 to 5,000)
+and reports per-query latency for the pure-Python and NumPy scorers, one
+query at a time and in batches of 100 through ``search_many()``.
+
+    python3 scripts/bench-concepts-search.py [--queries 2000]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "concepts-agent")
+sys.path.insert(0, SERVICE_DIR)
+
+from app.search import CurriculumIndex, np  # noqa: E402
+
+SIZES = [6, 50, 500, 5000]
+
+QUERIES = [
+    "explain for loops", "what is a variable", "how do while loops work",
+    "how do I sort a list", "what does return do in a function",
+    "explain dictionaries and hash maps", "how to iterate over a range",
+    "what are data types in python", "list comprehension example",
+    "difference between a list and a tuple", "tell me about recursion",
+]
+
+
+def _word(rng: random.Random) -> str:
+    syllables = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "zi", "pe", "so", "qu", "dra"]
+    return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+
+
+def build_topics(size: int, seed: int = 7):
+    topics = {}
+    curriculum_dir = os.path.join(SERVICE_DIR, "curriculum")
+    for name in sorted(os.listdir(curriculum_dir)):
+        if name.startswith(".") or not name.endswith(".json"):
+            continue
+        with open(os.path.join(curriculum_dir, name)) as f:
+            shard = json.load(f)
+        for key, data in shard["topics"].items():
+            topics[key] = {
+                "name": [data["topic"]],
+                "keywords": data.get("keywords", []),
+                "explanation": [data["explanation"]],
+                "examples": data["examples"],
+            }
+    rng = random.Random(seed)
+    vocab = [_word(rng) for _ in range(20000)]
+    common = ["python", "code", "example", "value", "print", "loop", "list"]
+    while len(topics) < size:
+        key = f"synthetic_{len(topics)}"
+        body = [rng.choice(vocab if rng.random() < 0.98 else common) for _ in range(120)]
+        topics[key] = {
+            "name": [" ".join(rng.sample(vocab, 2))],
+            "keywords": rng.sample(vocab, 5),
+            "explanation": [" ".join(body)],
+            "examples": [" ".join(rng.sample(vocab, 15))],
+        }
+    return dict(list(topics.items())[:size])
+
+
+def measure(index: CurriculumIndex, queries, k: int = 3):
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        index.search(q, k)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {
+        "p50": statistics.median(timings),
+        "p99": timings[int(len(timings) * 0.99) - 1],
+        "mean": statistics.fmean(timings),
+    }
+
+
+def measure_batch(index: CurriculumIndex, queries, k: int = 3, batch: int = 100) -> float:
+    """Mean microseconds per query when scored ``batch`` at a time with search_many()."""
+    start = time.perf_counter()
+    for first in range(0, len(queries), batch):
+        index.search_many(queries[first:first + batch], k)
+    return (time.perf_counter() - start) * 1e6 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    queries = [rng.choice(QUERIES) for _ in range(args.queries)]
+    modes = [False] + ([True] if np is not None else [])
+
+    print(f"{'topics':>7} {'scorer':>7} {'build ms':>9} {'p50 us':>8} {'p99 us':>8} {'mean us':>8} {'batch us':>9}")
+    for size in SIZES:
+        topics = build_topics(size)
+        for use_numpy in modes:
+            start = time.perf_counter()
+            index = CurriculumIndex(topics, use_numpy=use_numpy)
+            build_ms = (time.perf_counter() - start) * 1000
+            stats = measure(index, queries)
+            batch_us = measure_batch(index, queries)
+            print(f"{size:>7} {'numpy' if use_numpy else 'python':>7} {build_ms:>9.1f} "
+                  f"{stats['p50']:>8.1f} {stats['p99']:>8.1f} {stats['mean']:>8.1f} {batch_us:>9.1f}")
+    if np is None:
+        print("\nNumPy not installed; only the pure-Python scorer was measured.")
+
+
+if __name__ == "__main__":
+    main()
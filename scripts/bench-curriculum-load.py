@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Benchmark concepts-agent curriculum load time and memory as it grows.
+
+Writes synthetic curriculum shards (100 to 10,000 topics) to a temp directory
+and loads each size in a fresh interpreter three ways:
+
+- eager:  every shard parsed and kept resident, index built from full text
+          (how the in-code curriculum dict used to load)
+- cold:   CurriculumStore with no compiled index, so every shard is tokenized
+- warm:   CurriculumStore mapping the compiled index written by the cold run
+
+Reports load time, peak RSS and the RSS still held once loading is done.
+Synthetic topics draw from a 20,000-word vocabulary, so they have far more
+distinct terms, and postings, than real ones.
+
+    python3 scripts/bench-curriculum-load.py [--sizes 100,1000,10000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "concepts-agent")
+
+TOPICS_PER_SHARD = 50
+
+# Run in a child process so each measurement starts from a clean heap
+CHILD = r"""
+import gc, json, os, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+mode, directory = sys.argv[2], sys.argv[3]
+from app.curriculum import CurriculumStore
+from app.search import CurriculumIndex
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+base = rss_mb()
+start = time.perf_counter()
+if mode == "eager":
+    curriculum = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json") and not name.startswith("."):
+            with open(os.path.join(directory, name)) as f:
+                curriculum.update(json.load(f)["topics"])
+    index = CurriculumIndex({
+        key: {"name": [t["topic"]], "keywords": t["keywords"],
+              "explanation": [t["explanation"]], "examples": t["examples"]}
+        for key, t in curriculum.items()
+    })
+    topics = len(curriculum)
+else:
+    snapshot = CurriculumStore(directory).load()
+    topics = len(snapshot)
+    # Serve a query so the postings pages it touches are counted
+    snapshot.index.search("python loop", 3)
+elapsed = time.perf_counter() - start
+gc.collect()
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"topics": topics, "ms": elapsed * 1000, "peak_mb": peak, "delta_mb": rss_mb() - base}))
+"""
+
+
+def _word(rng: random.Random) -> str:
+    syllables = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "zi", "pe", "so", "qu", "dra"]
+    return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+
+
+def write_shards(directory: str, size: int, seed: int = 7):
+    rng = random.Random(seed)
+    vocab = [_word(rng) for _ in range(20000)]
+    for shard_no in range(0, size, TOPICS_PER_SHARD):
+        topics = {}
+        for i in range(shard_no, min(size, shard_no + TOPICS_PER_SHARD)):
+            # Roughly the size of a real topic: a few paragraphs and a handful of examples
+            paragraphs = [" ".join(rng.choice(vocab) for _ in range(80)) for _ in range(4)]
+            topics[f"topic_{i}"] = {
+                "topic": " ".join(rng.sample(vocab, 2)).title(),
+                "difficulty": rng.choice(["beginner", "intermediate", "advanced"]),
+                "keywords": rng.sample(vocab, 5),
+                "explanation": "\n\n".join(paragraphs),
+                "examples": [" ".join(rng.sample(vocab, 25)) for _ in range(3)],
+            }
+        with open(os.path.join(directory, f"{shard_no // TOPICS_PER_SHARD:04d}.json"), "w") as f:
+            json.dump({"module": f"Module {shard_no // TOPICS_PER_SHARD}", "topics": topics}, f)
+
+
+def measure(mode: str, directory: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", CHILD, SERVICE_DIR, mode, directory],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma-separated topic counts")
+    args = parser.parse_args()
+
+    print(f"{'topics':>7} {'mode':>6} {'load ms':>9} {'peak MB':>8} {'+RSS MB':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as directory:
+            write_shards(directory, size)
+            for mode in ("eager", "cold", "warm"):
+                r = measure(mode, directory)
+                print(f"{r['topics']:>7} {mode:>6} {r['ms']:>9.1f} {r['peak_mb']:>8.1f} {r['delta_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
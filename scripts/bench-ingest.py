@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Benchmark concepts-agent mastery ingestion.
+
+Plays the Dapr sidecar: sends bulk-subscribe deliveries of learning.response
+events to a running concepts agent and reports delivered events per second,
+per-delivery latency and what the agent wrote (from its /stats).
+
+    python3 scripts/bench-ingest.py [--url http://localhost:8002] [--events 50000]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+import httpx
+
+TOPICS = [
+    ("Basics", "Variables & Data Types"),
+    ("Control Flow", "For Loops"),
+    ("Control Flow", "While Loops"),
+    ("Data Structures", "Lists"),
+    ("Data Structures", "Dictionaries"),
+    ("Functions", "Functions"),
+]
+
+
+def delivery(batch_size: int, users: int) -> dict:
+    entries = []
+    for i in range(batch_size):
+        module, topic = random.choice(TOPICS)
+        entries.append({
+            "entryId": str(i),
+            "event": {
+                "specversion": "1.0",
+                "id": str(uuid.uuid4()),
+                "type": "com.dapr.event.sent",
+                "source": "triage-agent",
+                "topic": "learning.response",
+                "datacontenttype": "application/json",
+                "data": {"user_id": random.randint(1, users), "module": module, "topic": topic},
+            },
+            "contentType": "application/cloudevents+json",
+        })
+    return {"id": str(uuid.uuid4()), "topic": "learning.response", "pubsubname": "kafka-pubsub",
+            "type": "com.dapr.event.sent.bulk", "entries": entries}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8002")
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--batch", type=int, default=100, help="events per bulk delivery")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=3, help="user ids are drawn from 1..N")
+    args = parser.parse_args()
+
+    deliveries = args.events // args.batch
+    latencies = []
+    failed = 0
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+        before = (await client.get("/stats")).json()["mastery"]
+        remaining = iter(range(deliveries))
+
+        async def worker():
+            nonlocal failed
+            for _ in remaining:
+                body = delivery(args.batch, args.users)
+                start = time.perf_counter()
+                resp = await client.post("/subscribe", json=body)
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses = resp.json().get("statuses", []) if resp.status_code == 200 else []
+                failed += sum(1 for s in statuses if s.get("status") != "SUCCESS")
+                if resp.status_code != 200:
+                    failed += args.batch
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+        # Wait for the agent's next window so the writes show up in /stats
+        await asyncio.sleep(2.0)
+        after = (await client.get("/stats")).json()["mastery"]
+
+    sent = deliveries * args.batch
+    latencies.sort()
+    print(f"delivered {sent} events in {deliveries} bulk requests ({failed} not acknowledged)")
+    print(f"throughput: {sent / elapsed:,.0f} events/s")
+    print(f"delivery latency ms: p50={statistics.median(latencies):.2f} "
+          f"p95={latencies[int(len(latencies) * 0.95)]:.2f} p99={latencies[int(len(latencies) * 0.99)]:.2f}")
+    print(f"agent: flushes={after['flushes'] - before['flushes']} "
+          f"rows_upserted={after['rows_upserted'] - before['rows_upserted']} "
+          f"failed_flushes={after['failed_flushes'] - before['failed_flushes']} "
+          f"last_flush_ms={after['last_flush_ms']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -53,8 +53,15 @@ echo ""
 
 # Run database migrations
 echo "--- Running database migrations ---"
-kubectl exec -n postgres postgres-postgresql-0 -- psql -U postgres -d learnflow -f - < "$ROOT_DIR/k8s/db-migration.sql" 2>/dev/null || {
-    echo "Migration may have already been applied (tables exist)"
+# -i forwards the file on stdin; the migration is idempotent, so any error is real
+kubectl exec -i -n postgres postgres-postgresql-0 -- psql -U postgres -d learnflow -v ON_ERROR_STOP=1 -f - < "$ROOT_DIR/k8s/db-migration.sql" > /dev/null || {
+    echo "✗ Database migration failed"
+    exit 1
+}
+# Converts pre-partitioning conversations/code_submissions tables; a no-op once done
+kubectl exec -i -n postgres postgres-postgresql-0 -- psql -U postgres -d learnflow -v ON_ERROR_STOP=1 -f - < "$ROOT_DIR/k8s/db-partition-migration.sql" > /dev/null || {
+    echo "✗ Partition migration failed; the tables are unchanged, rerun once the database is idle"
+    exit 1
 }
 echo "✓ Database schema ready"
 echo ""
@@ -98,7 +105,7 @@ echo "=== Phase 4: Backend Services ==="
 
 # --- Triage Agent ---
 echo "--- Building triage-agent ---"
-docker build -t learnflow-triage:latest "$ROOT_DIR/services/triage-agent" > /dev/null 2>&1
+docker build -t learnflow-triage:latest -f "$ROOT_DIR/services/triage-agent/Dockerfile" "$ROOT_DIR" > /dev/null 2>&1
 minikube image load learnflow-triage:latest > /dev/null 2>&1
 echo "✓ triage-agent image built"
 
@@ -166,12 +173,41 @@ spec:
   ports:
   - port: 80
     targetPort: 8001
+---
+# Creates upcoming month partitions and detaches expired ones (app/partitions.py)
+apiVersion: batch/v1
+kind: CronJob
+metadata:
+  name: triage-partition-maintenance
+  namespace: learnflow
+spec:
+  schedule: "0 3 * * *"
+  concurrencyPolicy: Forbid
+  jobTemplate:
+    spec:
+      backoffLimit: 2
+      template:
+        spec:
+          restartPolicy: OnFailure
+          containers:
+          - name: maintain
+            image: learnflow-triage:latest
+            imagePullPolicy: Never
+            command: ["python", "-m", "app.partitions", "maintain"]
+            env:
+            - name: POSTGRES_PASSWORD
+              valueFrom:
+                secretKeyRef:
+                  name: postgres-credentials
+                  key: password
+            - name: PARTITION_RETENTION_MONTHS
+              value: "12"
 EOF
 echo "✓ triage-agent deployed"
 
 # --- Concepts Agent ---
 echo "--- Building concepts-agent ---"
-docker build -t learnflow-concepts:latest "$ROOT_DIR/services/concepts-agent" > /dev/null 2>&1
+docker build -t learnflow-concepts:latest -f "$ROOT_DIR/services/concepts-agent/Dockerfile" "$ROOT_DIR" > /dev/null 2>&1
 minikube image load learnflow-concepts:latest > /dev/null 2>&1
 echo "✓ concepts-agent image built"
 
@@ -0,0 +1,630 @@
+#!/usr/bin/env python3
+"""Offline load test for triage-agent and concepts-agent.
+
+Starts a stub Dapr sidecar, concepts-agent and triage-agent under uvicorn on
+this machine. It drives /chat, /run-code, /explain and /progress with a
+weighted request mix, and reports throughput and p50/p95/p99 latency per
+endpoint. Postgres comes from POSTGRES_HOST/POSTGRES_PORT if it answers there,
+with k8s/db-migration.sql applied. Otherwise the harness starts a throwaway
+local cluster when initdb is available (--pg-bin). Without either the
+services run without a pool, /progress is left out of the mix, and the report
+warns that persistence was not measured.
+
+    python3 scripts/loadtest/loadtest.py --duration 30 --save baseline
+    python3 scripts/loadtest/loadtest.py --duration 30 --compare baseline
+
+The services' requirements and libs/learnflow-common must be installed in the
+running interpreter.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(HERE, "..", ".."))
+SERVICES = os.path.join(ROOT, "services")
+RESULTS_DIR = os.path.join(HERE, "results")
+MIGRATION = os.path.join(ROOT, "k8s", "db-migration.sql")
+
+# --- Request mix ---
+
+CONCEPT_QUESTIONS = [
+    "explain for loops", "Explain for loops!", "what is a for loop",
+    "how does a while loop work", "what is a variable", "what are data types in python",
+    "how do I sort a list", "explain list comprehension", "what is a dictionary",
+    "how do dictionaries work", "explain functions", "what does return do in a function",
+    "difference between a list and a tuple", "tell me about default arguments",
+    "how do I iterate over a range", "why is my variable not defined",
+]
+
+CODE_MESSAGES = [
+    "run this: ```python\nprint('hello')\n```",
+    "```python\nfor i in range(3):\n    print(i)\n```",
+    "can you debug this error: ```python\nx = [1, 2, 3]\nprint(x[5])\n```",
+    "execute print(sum(range(10)))",
+    "I get a syntax error: ```python\ndef f(:\n    pass\n```",
+]
+
+CHATTER = ["hi", "thanks!", "ok cool", "hello there"]
+
+SNIPPETS = [
+    "print('Hello, World!')",
+    "for i in range(5):\n    print(i)",
+    "total = 0\nfor n in range(1, 11):\n    total += n\nprint(total)",
+    "nums = [3, 1, 4, 1, 5, 9]\nnums.sort()\nprint(nums)",
+    "def greet(name):\n    return f'Hello, {name}!'\n\nprint(greet('Maya'))",
+    "student = {'name': 'Maya', 'age': 16}\nfor k, v in student.items():\n    print(k, v)",
+    "print(1/0)",
+]
+
+MIXES = {
+    "default": {"chat": 50, "run_code": 20, "explain": 15, "progress": 15},
+    "chat": {"chat": 100},
+    "code": {"run_code": 100},
+    "explain": {"explain": 100},
+    "progress": {"progress": 100},
+}
+
+
+def chat_message() -> str:
+    r = random.random()
+    if r < 0.6:
+        return random.choice(CONCEPT_QUESTIONS)
+    if r < 0.9:
+        return random.choice(CODE_MESSAGES)
+    return random.choice(CHATTER)
+
+
+def snippet() -> str:
+    # Most students run one of the class exercises; some write their own
+    if random.random() < 0.8:
+        return random.choice(SNIPPETS)
+    return f"x = {random.randint(0, 10 ** 6)}\nprint(x * 2)"
+
+
+Request = Tuple[str, str, str, Optional[Dict[str, Any]]]
+
+
+def build_scenarios(triage: str, concepts: str, user_ids: List[int]) -> Dict[str, Callable[[], Request]]:
+    """Scenario name -> factory returning (base_url, method, path, json)."""
+    return {
+        "chat": lambda: (triage, "POST", "/chat",
+                         {"message": chat_message(), "user_id": random.choice(user_ids)}),
+        "run_code": lambda: (triage, "POST", "/run-code",
+                             {"code": snippet(), "user_id": random.choice(user_ids)}),
+        "explain": lambda: (concepts, "POST", "/explain",
+                            {"question": random.choice(CONCEPT_QUESTIONS), "user_id": random.choice(user_ids)}),
+        "progress": lambda: (triage, "GET", f"/progress/{random.choice(user_ids)}", None),
+    }
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    if spec in MIXES:
+        return dict(MIXES[spec])
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# --- Process management ---
+
+def log_path(name: str) -> str:
+    return os.path.join(RESULTS_DIR, "logs", f"{name}.log")
+
+
+def start_process(name: str, args: List[str], cwd: str, env: Dict[str, str]) -> Tuple[str, subprocess.Popen]:
+    log = open(log_path(name), "w")
+    return name, subprocess.Popen(args, cwd=cwd, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+
+
+def uvicorn_args(module: str, port: int, extra: List[str] = ()) -> List[str]:
+    return [sys.executable, "-m", "uvicorn", module, "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning", "--no-access-log", *extra]
+
+
+def port_in_use(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+def check_running(processes: List[Tuple[str, subprocess.Popen]]):
+    """Fail if a spawned process has exited, e.g. because it couldn't bind its port."""
+    for name, proc in processes:
+        code = proc.poll()
+        if code is not None:
+            raise RuntimeError(f"{name} exited with code {code}; see {os.path.relpath(log_path(name), ROOT)}")
+
+
+async def wait_healthy(client: httpx.AsyncClient, url: str, identify: Callable[[httpx.Response], bool],
+                       processes: List[Tuple[str, subprocess.Popen]] = (), timeout: float = 30.0):
+    """Wait until ``url`` answers and ``identify`` accepts the response.
+
+    ``identify`` tells our process apart from anything else on the port.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        check_running(processes)
+        try:
+            resp = await client.get(url)
+            if resp.status_code < 300:
+                if not identify(resp):
+                    raise RuntimeError(f"{url} is answered by something other than the expected service")
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become healthy within {timeout:.0f}s")
+
+
+def is_service(name: str) -> Callable[[httpx.Response], bool]:
+    def identify(resp: httpx.Response) -> bool:
+        try:
+            return resp.json().get("service") == name
+        except (ValueError, AttributeError):
+            return False
+    return identify
+
+
+def is_stub(resp: httpx.Response) -> bool:
+    # A real sidecar has no /stub/calls
+    try:
+        return isinstance(resp.json(), dict)
+    except ValueError:
+        return False
+
+
+# --- Local Postgres ---
+
+def find_pg_bin(path: str) -> Optional[str]:
+    """Directory with initdb, pg_ctl and psql: ``path``, else PATH, else pg_config's bindir."""
+    if path:
+        return path
+    initdb = shutil.which("initdb")
+    if initdb:
+        return os.path.dirname(initdb)
+    pg_config = shutil.which("pg_config")
+    if pg_config:
+        try:
+            return subprocess.run([pg_config, "--bindir"], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            pass
+    return None
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LocalPostgres:
+    """Throwaway cluster in a temp directory with k8s/db-migration.sql applied."""
+
+    def __init__(self, bin_dir: str):
+        self.bin_dir = bin_dir
+        self.dir = ""
+        self.port = 0
+
+    @property
+    def env(self) -> Dict[str, str]:
+        return {"POSTGRES_HOST": "127.0.0.1", "POSTGRES_PORT": str(self.port), "POSTGRES_USER": "postgres",
+                "POSTGRES_PASSWORD": "postgres", "POSTGRES_DATABASE": "learnflow"}
+
+    def start(self):
+        self.dir = tempfile.mkdtemp(prefix="learnflow-loadtest-pg-")
+        self.port = free_port()
+        data = os.path.join(self.dir, "data")
+        psql = [self._bin("psql"), "-h", "127.0.0.1", "-p", str(self.port), "-U", "postgres",
+                "-q", "-v", "ON_ERROR_STOP=1"]
+        with open(log_path("postgres-setup"), "w") as log:
+            for args in (
+                [self._bin("initdb"), "-D", data, "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+                [self._bin("pg_ctl"), "-D", data, "-l", log_path("postgres"), "-w", "start", "-o",
+                 f"-p {self.port} -k {self.dir} -c listen_addresses=127.0.0.1 -c fsync=off"],
+                psql + ["-c", "CREATE DATABASE learnflow"],
+                psql + ["-d", "learnflow", "-f", MIGRATION],
+            ):
+                if subprocess.run(args, stdout=log, stderr=subprocess.STDOUT).returncode != 0:
+                    raise RuntimeError(f"{os.path.basename(args[0])} failed; see {log_path('postgres-setup')}")
+
+    def stop(self):
+        if not self.dir:
+            return
+        subprocess.run([self._bin("pg_ctl"), "-D", os.path.join(self.dir, "data"), "-m", "fast", "-w", "stop"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.dir = ""
+
+    def _bin(self, name: str) -> str:
+        return os.path.join(self.bin_dir, name)
+
+
+def start_local_postgres(bin_path: str) -> Optional[LocalPostgres]:
+    bin_dir = find_pg_bin(bin_path)
+    if bin_dir is None:
+        print("No initdb found (pass --pg-bin); running without a database")
+        return None
+    if os.geteuid() == 0:
+        print("initdb refuses to run as root; run the harness as another user or set POSTGRES_HOST")
+        return None
+    pg = LocalPostgres(bin_dir)
+    try:
+        pg.start()
+    except (OSError, RuntimeError) as e:
+        pg.stop()
+        print(f"Local Postgres failed to start ({e}); running without a database")
+        return None
+    print(f"Started a local Postgres on port {pg.port}")
+    return pg
+
+
+async def seed_users(count: int, env: Dict[str, str]) -> Optional[List[int]]:
+    """Make sure ``count`` load-test students exist; returns their ids, or None without a database."""
+    env = {**os.environ, **env}
+    try:
+        import asyncpg
+        conn = await asyncpg.connect(
+            host=env.get("POSTGRES_HOST", "localhost"), port=int(env.get("POSTGRES_PORT", "5432")),
+            user=env.get("POSTGRES_USER", "postgres"), password=env.get("POSTGRES_PASSWORD", "postgres"),
+            database=env.get("POSTGRES_DATABASE", "learnflow"), timeout=3,
+        )
+    except Exception as e:
+        print(f"Postgres unavailable at {env.get('POSTGRES_HOST', 'localhost')} ({e})")
+        return None
+    try:
+        await conn.execute(
+            "INSERT INTO users (name) SELECT 'loadtest-' || g FROM generate_series(1, $1) g "
+            "WHERE NOT EXISTS (SELECT 1 FROM users WHERE name = 'loadtest-' || g)",
+            count,
+        )
+        rows = await conn.fetch(
+            "SELECT id FROM users WHERE name LIKE 'loadtest-%' ORDER BY id LIMIT $1", count
+        )
+        return [r["id"] for r in rows]
+    finally:
+        await conn.close()
+
+
+# --- Load generation ---
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.recording = False
+
+    def record(self, scenario: str, status: str, latency_ms: float):
+        if not self.recording:
+            return
+        self.latencies.setdefault(scenario, []).append(latency_ms)
+        counts = self.statuses.setdefault(scenario, {})
+        counts[status] = counts.get(status, 0) + 1
+
+
+async def issue(client: httpx.AsyncClient, recorder: Recorder, scenario: str,
+                request: Request, started: float):
+    base, method, path, body = request
+    try:
+        resp = await client.request(method, base + path, json=body)
+        status = str(resp.status_code)
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    recorder.record(scenario, status, (time.perf_counter() - started) * 1000)
+
+
+async def closed_loop(client, recorder, scenarios, names, weights, concurrency: int, until: float):
+    async def worker():
+        while time.perf_counter() < until:
+            name = random.choices(names, weights)[0]
+            await issue(client, recorder, name, scenarios[name](), time.perf_counter())
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def open_loop(client, recorder, scenarios, names, weights, rate: float, max_inflight: int, until: float):
+    """Constant arrival rate; latency counts from the scheduled send time, so
+    queueing behind a slow server shows up instead of being hidden."""
+    slots = asyncio.Semaphore(max_inflight)
+    tasks = set()
+    interval = 1.0 / rate
+    next_at = time.perf_counter()
+
+    async def send(name: str, scheduled: float):
+        async with slots:
+            await issue(client, recorder, name, scenarios[name](), scheduled)
+
+    while next_at < until:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        name = random.choices(names, weights)[0]
+        task = asyncio.create_task(send(name, next_at))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        next_at += interval
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], statuses: Dict[str, int], duration: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    errors = sum(n for s, n in statuses.items() if not s.startswith(("2", "3")))
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "statuses": statuses,
+        "throughput_rps": round(len(values) / duration, 1),
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0,
+    }
+
+
+# --- Baselines ---
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def results_path(name: str) -> str:
+    if name.endswith(".json") or os.sep in name:
+        return name
+    return os.path.join(RESULTS_DIR, f"{name}.json")
+
+
+def format_statuses(statuses: Dict[str, int]) -> str:
+    return " ".join(f"{status}:{n}" for status, n in sorted(statuses.items()))
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"\n{'endpoint':<10} {'reqs':>8} {'err':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'max ms':>9}  statuses")
+    rows = list(result["scenarios"].items()) + [("total", result["total"])]
+    for name, s in rows:
+        print(f"{name:<10} {s['requests']:>8} {s['errors']:>6} {s['throughput_rps']:>9.1f} "
+              f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['max_ms']:>9.2f}  "
+              f"{format_statuses(s['statuses'])}")
+    print("err counts every non-2xx/3xx response, including 429 admission rejections")
+    if not result["config"]["database"]:
+        print("\nWARNING: no database. /progress and the conversation and code-submission writers were "
+              "not measured; set POSTGRES_HOST or pass --pg-bin to include them.")
+        return
+    write_behind = result["server_stats"].get("triage", {}).get("write_behind", {})
+    for table, s in write_behind.items():
+        print(f"write-behind {table}: {s['written']} rows in {s['flushes']} flushes, "
+              f"flush avg {s['flush_ms_avg']:.2f} ms, max {s['flush_ms_max']:.2f} ms, "
+              f"{s['dropped']} dropped, {s['failed_flushes']} failed")
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Print deltas against a baseline; returns True if anything regressed past the threshold."""
+    print(f"\nvs baseline {baseline.get('name')} ({baseline.get('git_commit') or 'unknown commit'}, "
+          f"{baseline.get('timestamp')}), threshold {threshold:.0%}")
+    changed = [k for k, v in result["config"].items() if k != "duration" and baseline.get("config", {}).get(k) != v]
+    if changed:
+        print(f"  warning: config differs from the baseline ({', '.join(changed)}); deltas are not comparable")
+    regressed = False
+    for name, current in list(result["scenarios"].items()) + [("total", result["total"])]:
+        base = baseline["scenarios"].get(name) if name != "total" else baseline.get("total")
+        if not base or not base["requests"]:
+            continue
+        deltas = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            before, after = base[key], current[key]
+            change = (after - before) / before if before else 0.0
+            worse = change < -threshold if key == "throughput_rps" else change > threshold
+            # p50 is reported but too noisy on one box to fail a run
+            if worse and key != "p50_ms":
+                regressed = True
+            deltas.append(f"{key} {before:.1f}->{after:.1f} ({change:+.0%}){' !' if worse else ''}")
+        print(f"  {name:<10} " + ", ".join(deltas))
+    print("REGRESSION" if regressed else "no regression")
+    return regressed
+
+
+# --- Main ---
+
+async def run(args) -> Dict[str, Any]:
+    triage_url = args.triage_url or f"http://127.0.0.1:{args.triage_port}"
+    concepts_url = args.concepts_url or f"http://127.0.0.1:{args.concepts_port}"
+    processes: List[Tuple[str, subprocess.Popen]] = []
+    os.makedirs(os.path.dirname(log_path("")), exist_ok=True)
+    if not args.no_start:
+        for flag, port in (("--stub-port", args.stub_port), ("--concepts-port", args.concepts_port),
+                           ("--triage-port", args.triage_port)):
+            if port_in_use(port):
+                raise SystemExit(f"Port {port} is already in use; stop what holds it, pass another {flag}, "
+                                 f"or use --no-start to test running services")
+
+    pg: Optional[LocalPostgres] = None
+    pg_env: Dict[str, str] = {}
+    user_ids = None
+    if args.postgres in ("auto", "external"):
+        user_ids = await seed_users(args.users, pg_env)
+    if user_ids is None and args.postgres in ("auto", "local") and not args.no_start:
+        pg = start_local_postgres(args.pg_bin)
+        if pg is not None:
+            pg_env = pg.env
+            user_ids = await seed_users(args.users, pg_env)
+    database = user_ids is not None
+    if not user_ids:
+        user_ids = list(range(1, args.users + 1))
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        try:
+            if not args.no_start:
+                stub_env = {
+                    "STUB_LATENCY_MS": str(args.stub_latency_ms),
+                    "STUB_JITTER_MS": str(args.stub_jitter_ms),
+                    "STUB_CODE_LATENCY_MS": str(args.stub_code_latency_ms),
+                    "STUB_ERROR_RATE": str(args.stub_error_rate),
+                    "STUB_CONCEPTS_URL": "" if args.canned_concepts else concepts_url,
+                }
+                service_env = {"DAPR_HTTP_PORT": str(args.stub_port), **pg_env}
+                processes.append(start_process(
+                    "stub-sidecar", uvicorn_args("stub_sidecar:app", args.stub_port, ["--app-dir", HERE]),
+                    HERE, stub_env))
+                processes.append(start_process(
+                    "concepts-agent", uvicorn_args("app.main:app", args.concepts_port),
+                    os.path.join(SERVICES, "concepts-agent"), service_env))
+                processes.append(start_process(
+                    "triage-agent", uvicorn_args("app.main:app", args.triage_port),
+                    os.path.join(SERVICES, "triage-agent"), service_env))
+                await wait_healthy(client, f"http://127.0.0.1:{args.stub_port}/stub/calls", is_stub, processes)
+            await wait_healthy(client, f"{concepts_url}/health", is_service("concepts-agent"), processes)
+            await wait_healthy(client, f"{triage_url}/health", is_service("triage-agent"), processes)
+            # A process that lost its port may only exit after the others answered
+            await asyncio.sleep(0.5)
+            check_running(processes)
+
+            ready = (await client.get(f"{triage_url}/ready")).json()
+            database = database and ready.get("database") == "ok"
+            mix = parse_mix(args.mix)
+            if not database and "progress" in mix:
+                print("No database: leaving /progress out of the mix")
+                mix.pop("progress")
+            scenarios = build_scenarios(triage_url, concepts_url, user_ids)
+            unknown = set(mix) - set(scenarios)
+            if unknown or not mix:
+                raise SystemExit(f"Unknown or empty mix: {sorted(unknown) or args.mix}")
+            names, weights = list(mix), list(mix.values())
+
+            recorder = Recorder()
+            mode = f"open loop at {args.rate:g} req/s" if args.rate else f"closed loop, {args.concurrency} workers"
+            print(f"Mix {mix}; {mode}; warmup {args.warmup:g}s, measuring {args.duration:g}s")
+            for phase, seconds in (("warmup", args.warmup), ("measure", args.duration)):
+                if seconds <= 0:
+                    continue
+                recorder.recording = phase == "measure"
+                until = time.perf_counter() + seconds
+                started = time.perf_counter()
+                if args.rate:
+                    await open_loop(client, recorder, scenarios, names, weights, args.rate, args.concurrency, until)
+                else:
+                    await closed_loop(client, recorder, scenarios, names, weights, args.concurrency, until)
+                elapsed = time.perf_counter() - started
+            check_running(processes)
+
+            server_stats = {}
+            for name, url in (("triage", triage_url), ("concepts", concepts_url)):
+                try:
+                    server_stats[name] = (await client.get(f"{url}/stats")).json()
+                except (httpx.HTTPError, ValueError):
+                    pass
+        finally:
+            for _, proc in reversed(processes):
+                proc.terminate()
+            for _, proc in processes:
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+            if pg is not None:
+                pg.stop()
+
+    all_latencies = [v for values in recorder.latencies.values() for v in values]
+    all_statuses: Dict[str, int] = {}
+    for counts in recorder.statuses.values():
+        for status, n in counts.items():
+            all_statuses[status] = all_statuses.get(status, 0) + n
+    return {
+        "name": args.save or "",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {
+            "mix": mix, "duration": args.duration, "warmup": args.warmup,
+            "concurrency": args.concurrency, "rate": args.rate, "users": len(user_ids),
+            "database": database, "local_postgres": pg is not None, "canned_concepts": args.canned_concepts,
+            "stub_latency_ms": args.stub_latency_ms, "stub_jitter_ms": args.stub_jitter_ms,
+            "stub_code_latency_ms": args.stub_code_latency_ms, "stub_error_rate": args.stub_error_rate,
+        },
+        "scenarios": {
+            name: summarize(recorder.latencies[name], recorder.statuses[name], elapsed)
+            for name in names if name in recorder.latencies
+        },
+        "total": summarize(all_latencies, all_statuses, elapsed),
+        "server_stats": server_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before measuring")
+    parser.add_argument("--concurrency", type=int, default=32, help="workers, or max in flight with --rate")
+    parser.add_argument("--rate", type=float, default=0, help="open-loop requests/s (default: closed loop)")
+    parser.add_argument("--mix", default="default",
+                        help=f"one of {', '.join(MIXES)}, or weights like chat=60,progress=40")
+    parser.add_argument("--users", type=int, default=50, help="students to spread requests over")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--stub-latency-ms", type=float, default=20, help="sidecar latency per call")
+    parser.add_argument("--stub-jitter-ms", type=float, default=10)
+    parser.add_argument("--stub-code-latency-ms", type=float, default=50, help="simulated execution time")
+    parser.add_argument("--stub-error-rate", type=float, default=0, help="fraction of invocations failing with 500")
+    parser.add_argument("--canned-concepts", action="store_true",
+                        help="answer concept invocations in the stub instead of the real concepts-agent")
+    parser.add_argument("--stub-port", type=int, default=3599)
+    parser.add_argument("--triage-port", type=int, default=8701)
+    parser.add_argument("--concepts-port", type=int, default=8702)
+    parser.add_argument("--no-start", action="store_true", help="use already running services")
+    parser.add_argument("--postgres", choices=("auto", "external", "local", "none"), default="auto",
+                        help="external: POSTGRES_HOST only; local: a throwaway cluster; auto: external, "
+                             "else local")
+    parser.add_argument("--pg-bin", default="", help="directory with initdb, pg_ctl and psql for --postgres local")
+    parser.add_argument("--triage-url", default="")
+    parser.add_argument("--concepts-url", default="")
+    parser.add_argument("--save", metavar="NAME", help=f"save results as NAME (under {os.path.relpath(RESULTS_DIR, ROOT)})")
+    parser.add_argument("--compare", metavar="NAME", help="baseline name or path to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed p95/p99/throughput change")
+    args = parser.parse_args()
+    if args.duration <= 0:
+        parser.error("--duration must be positive")
+
+    result = asyncio.run(run(args))
+    print_report(result)
+
+    if args.save:
+        path = results_path(args.save)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved {os.path.relpath(path, ROOT)}")
+
+    if args.compare:
+        with open(results_path(args.compare)) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
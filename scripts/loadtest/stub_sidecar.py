@@ -0,0 +1,119 @@
+"""Stand-in for the Dapr sidecar used by the load-test harness.
+
+Serves the Dapr HTTP API routes the agents call. Concepts invocations are
+forwarded to a locally running concepts-agent when ``STUB_CONCEPTS_URL`` is
+set, and answered with a canned explanation otherwise. Code-runner
+executions and publishes are simulated. Every response is delayed by
+``STUB_LATENCY_MS`` plus up to ``STUB_JITTER_MS``.
+
+    STUB_LATENCY_MS=20 uvicorn stub_sidecar:app --app-dir scripts/loadtest --port 3599
+"""
+import asyncio
+import os
+import random
+from collections import Counter
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import FastAPI, Request, Response
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "20"))
+STUB_JITTER_MS = float(os.getenv("STUB_JITTER_MS", "10"))
+STUB_CODE_LATENCY_MS = float(os.getenv("STUB_CODE_LATENCY_MS", "50"))
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+STUB_CONCEPTS_URL = os.getenv("STUB_CONCEPTS_URL", "")
+
+app = FastAPI(title="Dapr sidecar stub")
+calls: Counter = Counter()
+_client: Optional[httpx.AsyncClient] = None
+
+
+async def _delay(base_ms: float):
+    await asyncio.sleep((base_ms + random.random() * STUB_JITTER_MS) / 1000)
+
+
+def _fail() -> bool:
+    return STUB_ERROR_RATE > 0 and random.random() < STUB_ERROR_RATE
+
+
+@app.on_event("startup")
+async def startup():
+    global _client
+    if STUB_CONCEPTS_URL:
+        _client = httpx.AsyncClient(base_url=STUB_CONCEPTS_URL, timeout=30,
+                                    limits=httpx.Limits(max_connections=200, max_keepalive_connections=100))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if _client is not None:
+        await _client.aclose()
+
+
+@app.post("/v1.0/invoke/{app_id}/method/{method:path}")
+async def invoke(app_id: str, method: str, request: Request):
+    calls[f"invoke:{app_id}/{method}"] += 1
+    body: Dict[str, Any] = await request.json()
+    if _fail():
+        await _delay(STUB_LATENCY_MS)
+        return Response(status_code=500, content=b'{"errorCode":"ERR_DIRECT_INVOKE"}', media_type="application/json")
+
+    if app_id == "concepts-agent":
+        await _delay(STUB_LATENCY_MS)
+        if _client is not None:
+            resp = await _client.post(f"/{method}", json=body)
+            return Response(status_code=resp.status_code, content=resp.content, media_type="application/json")
+        question = str(body.get("question", ""))
+        return {"explanation": f"Here is how {question[:40]} works.", "topic": "For Loops",
+                "module": "Control Flow", "examples": [], "difficulty": "beginner", "related": []}
+
+    if app_id == "code-runner":
+        await _delay(STUB_CODE_LATENCY_MS)
+        code = str(body.get("code", ""))
+        if "raise" in code or "1/0" in code:
+            return {"stdout": "", "stderr": "Traceback (most recent call last):\n  ...\nError\n",
+                    "exit_code": 1, "execution_time": STUB_CODE_LATENCY_MS / 1000}
+        return {"stdout": f"{len(code)}\n", "stderr": "", "exit_code": 0,
+                "execution_time": STUB_CODE_LATENCY_MS / 1000}
+
+    return Response(status_code=404, content=b'{"errorCode":"ERR_DIRECT_INVOKE"}', media_type="application/json")
+
+
+@app.get("/v1.0/invoke/{app_id}/method/{method:path}")
+async def invoke_get(app_id: str, method: str):
+    # Health checks from triage's dependency monitor
+    calls[f"invoke_get:{app_id}/{method}"] += 1
+    if app_id == "concepts-agent" and _client is not None:
+        resp = await _client.get(f"/{method}")
+        return Response(status_code=resp.status_code, content=resp.content, media_type="application/json")
+    if app_id in ("concepts-agent", "code-runner"):
+        return {"status": "healthy", "service": app_id}
+    return Response(status_code=404, content=b'{"errorCode":"ERR_DIRECT_INVOKE"}', media_type="application/json")
+
+
+@app.post("/v1.0/publish/{pubsub}/{topic}")
+async def publish(pubsub: str, topic: str):
+    calls[f"publish:{topic}"] += 1
+    await _delay(STUB_LATENCY_MS / 4)
+    return Response(status_code=204)
+
+
+@app.post("/v1.0-alpha1/publish/bulk/{pubsub}/{topic}")
+async def publish_bulk(pubsub: str, topic: str, request: Request):
+    entries = await request.json()
+    calls[f"publish_bulk:{topic}"] += 1
+    calls[f"events:{topic}"] += len(entries)
+    await _delay(STUB_LATENCY_MS / 4)
+    if _fail():
+        return Response(status_code=500, content=b'{"failedEntries":[]}', media_type="application/json")
+    return {"failedEntries": []}
+
+
+@app.get("/v1.0/healthz")
+async def healthz():
+    return Response(status_code=204)
+
+
+@app.get("/stub/calls")
+async def stub_calls():
+    return dict(calls)
@@ -0,0 +1,537 @@
+"""Curriculum content loaded from JSON shards on disk.
+
+Each ``*.json`` file in the curriculum directory holds one module::
+
+    {"module": "Control Flow",
+     "topics": {"for_loop": {"topic": ..., "difficulty": ..., "keywords": [...],
+                             "explanation": ..., "examples": [...]}}}
+
+Only topic metadata and the search index stay resident. Explanations and
+examples are read from their shard the first time a topic is served and kept
+in a bounded LRU, so memory does not grow with the size of the curriculum.
+
+A compiled index next to the shards holds the topic metadata and the BM25
+postings, packed into a file that is memory-mapped rather than read. When no
+shard's mtime or size changed since it was written, startup maps it and
+tokenizes nothing. Otherwise only the changed shards are parsed, and the
+postings are rebuilt from stored term frequencies and written back.
+
+``CurriculumStore.reload()`` builds a new immutable ``CurriculumSnapshot`` off
+the event loop and swaps it in with a single assignment. A request that has
+already taken ``store.current`` keeps using that snapshot until it finishes.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, BinaryIO, Dict, Hashable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from learnflow_common.metrics import Counter
+from learnflow_common.responses import Rendered, render
+
+from app.responses import RenderedTopic
+from app.search import TERMS_VERSION, CurriculumIndex, term_freqs, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Defaults to <CURRICULUM_DIR>/.index.json
+CURRICULUM_INDEX_FILE = os.getenv("CURRICULUM_INDEX_FILE", "")
+CURRICULUM_CACHE_SHARDS = int(os.getenv("CURRICULUM_CACHE_SHARDS", "16"))
+CURRICULUM_CACHE_TOPICS = int(os.getenv("CURRICULUM_CACHE_TOPICS", "512"))
+
+# Bump when the layout of the compiled index changes
+INDEX_FORMAT = 2
+_BUILD_ID_BYTES = 16
+
+Signature = Tuple[int, int]
+
+RELOADS_TOTAL = Counter(
+    "learnflow_curriculum_reloads_total", "Curriculum reloads by result (changed, unchanged, failed)", ("result",),
+)
+
+
+def _digest(raw: bytes) -> str:
+    return hashlib.blake2b(raw, digest_size=12).hexdigest()
+
+
+def _dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _replace(path: str, write: Callable[[BinaryIO], Any]):
+    """Write ``path`` through a temp file and an atomic rename."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class TopicMeta(NamedTuple):
+    key: str
+    topic: str
+    module: str
+    difficulty: str
+    shard: str
+    # Tokenized keyword phrases
+    keywords: Tuple[Tuple[str, ...], ...] = ()
+
+
+def render_explanation(explanation: str, examples: List[str]) -> str:
+    """Topic explanation followed by its first example as a practice prompt."""
+    if examples:
+        explanation += "\n\n### Try it yourself:\n```python\n"
+        explanation += examples[0]
+        explanation += "\n```"
+    return explanation
+
+
+class _LRU:
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class CurriculumSnapshot:
+    """One consistent view of the curriculum: metadata, search index and rendered bodies."""
+
+    def __init__(self, topics: Dict[str, TopicMeta], index: CurriculumIndex,
+                 shards: Dict[str, Tuple[Signature, str]], version: str,
+                 load_content: Callable[[str, str], Dict[str, Dict[str, Any]]],
+                 topic_cache: int = CURRICULUM_CACHE_TOPICS):
+        self.topics = topics
+        self.index = index
+        # shard file name -> (stat signature, content digest)
+        self.shards = shards
+        self.version = version
+        self.loaded_at = time.time()
+        self._load_content = load_content
+        self._rendered = _LRU(topic_cache)
+        # First token of each keyword phrase -> [(topic key, phrase)]
+        self._keywords: Dict[str, List[Tuple[str, Tuple[str, ...]]]] = {}
+        for meta in topics.values():
+            for phrase in meta.keywords:
+                self._keywords.setdefault(phrase[0], []).append((meta.key, phrase))
+        self.topic_list: Rendered = render({
+            "topics": [
+                {"key": m.key, "name": m.topic, "module": m.module, "difficulty": m.difficulty}
+                for m in topics.values()
+            ]
+        })
+
+    def __len__(self) -> int:
+        return len(self.topics)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.topics
+
+    def content(self, key: str) -> Optional[Dict[str, Any]]:
+        """``{"explanation", "examples"}`` for a topic, read from its shard on first use."""
+        meta = self.topics.get(key)
+        if meta is None:
+            return None
+        return self._load_content(meta.shard, self.shards[meta.shard][1]).get(key)
+
+    def rendered(self, key: str) -> Optional[RenderedTopic]:
+        """The encoded /explain body for a topic, or None if its content is gone."""
+        cached = self._rendered.get(key)
+        if cached is not None:
+            return cached
+        meta = self.topics.get(key)
+        content = self.content(key)
+        if meta is None or content is None:
+            return None
+        rendered = RenderedTopic({
+            "explanation": render_explanation(content["explanation"], content["examples"]),
+            "topic": meta.topic,
+            "module": meta.module,
+            "examples": content["examples"],
+            "difficulty": meta.difficulty,
+        })
+        self._rendered.put(key, rendered)
+        return rendered
+
+    def keyword_hits(self, tokens: Sequence[str]) -> Set[str]:
+        """Topics with a keyword phrase whose tokens all appear in ``tokens``."""
+        present = set(tokens)
+        return {
+            key
+            for token in present
+            for key, phrase in self._keywords.get(token, ())
+            if present.issuperset(phrase)
+        }
+
+    def match(self, key: str, score: float) -> Dict[str, Any]:
+        meta = self.topics[key]
+        return {"key": key, "topic": meta.topic, "module": meta.module, "score": round(score, 4)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "topics": len(self.topics),
+            "shards": len(self.shards),
+            "loaded_at": self.loaded_at,
+            "rendered_cached": len(self._rendered),
+            "rendered_hits": self._rendered.hits,
+            "rendered_misses": self._rendered.misses,
+        }
+
+
+class CurriculumStore:
+    def __init__(self, directory: str, index_file: Optional[str] = None,
+                 on_change: Optional[Callable[[CurriculumSnapshot], Awaitable[None]]] = None,
+                 watch_interval: float = 0.0, shard_cache: int = CURRICULUM_CACHE_SHARDS):
+        self.directory = directory
+        self.index_file = index_file or CURRICULUM_INDEX_FILE or os.path.join(directory, ".index.json")
+        root = os.path.splitext(self.index_file)[0]
+        self._terms_file = root + ".terms.json"
+        self._postings_file = root + ".postings"
+        self._on_change = on_change
+        self.watch_interval = watch_interval
+        self.current: Optional[CurriculumSnapshot] = None
+        # Shard stat signatures as of the last build, for the watcher
+        self._signatures: Dict[str, Signature] = {}
+        # (shard, content digest) -> {key: {"explanation", "examples"}}
+        self._content = _LRU(shard_cache)
+        self._reload_lock = asyncio.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+        # Reload started because a served shard no longer matched its snapshot
+        self._stale_reload: Optional[asyncio.Task] = None
+
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.shards_compiled = 0
+        self.shards_read = 0
+        self.stale_shard_reads = 0
+        self.last_reload_ms = 0.0
+
+    def load(self) -> CurriculumSnapshot:
+        """Build and install a snapshot synchronously (startup and tooling)."""
+        self.current = self._build()
+        self._signatures = {name: sig for name, (sig, _) in self.current.shards.items()}
+        return self.current
+
+    async def reload(self) -> bool:
+        """Rebuild from disk and swap the snapshot in; returns whether the content changed.
+
+        The previous snapshot stays live if the rebuild fails.
+        """
+        async with self._reload_lock:
+            start = time.perf_counter()
+            try:
+                snapshot = await asyncio.to_thread(self._build)
+            except Exception:
+                self.failed_reloads += 1
+                RELOADS_TOTAL.inc("failed")
+                raise
+            finally:
+                self.last_reload_ms = (time.perf_counter() - start) * 1000
+            previous = self.current
+            changed = previous is None or snapshot.version != previous.version
+            # An unchanged snapshot is not swapped, so its render cache stays warm
+            if changed:
+                self.current = snapshot
+            self._signatures = {name: sig for name, (sig, _) in snapshot.shards.items()}
+            self.reloads += 1
+            RELOADS_TOTAL.inc("changed" if changed else "unchanged")
+        if changed and previous is not None:
+            logger.info(f"Curriculum reloaded: {len(snapshot)} topics, version {snapshot.version}")
+            if self._on_change:
+                try:
+                    await self._on_change(snapshot)
+                except Exception as e:
+                    logger.warning(f"Curriculum change callback failed: {e}")
+        return changed
+
+    def changed_on_disk(self) -> bool:
+        """Cheap stat-only check for added, removed or modified shards."""
+        if self.current is None:
+            return True
+        try:
+            return self._scan() != self._signatures
+        except OSError:
+            return False
+
+    def start(self):
+        if self._watcher is None and self.watch_interval > 0:
+            self._watcher = asyncio.create_task(self._watch(), name="curriculum-watcher")
+
+    async def stop(self):
+        for task in (self._watcher, self._stale_reload):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._watcher = None
+        self._stale_reload = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "snapshot": self.current.stats() if self.current is not None else None,
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads,
+            "last_reload_ms": round(self.last_reload_ms, 3),
+            "shards_compiled": self.shards_compiled,
+            "shards_read": self.shards_read,
+            "stale_shard_reads": self.stale_shard_reads,
+            "content_cached_shards": len(self._content),
+            "content_hits": self._content.hits,
+            "content_misses": self._content.misses,
+        }
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            if not self.changed_on_disk():
+                continue
+            await self._reload_logged()
+
+    async def _reload_logged(self):
+        try:
+            await self.reload()
+        except Exception as e:
+            logger.error(f"Curriculum reload failed: {e}")
+
+    def _reload_soon(self):
+        """Start a background reload unless one is already pending (no-op outside a loop)."""
+        if self._stale_reload is not None and not self._stale_reload.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._stale_reload = loop.create_task(self._reload_logged(), name="curriculum-stale-reload")
+
+    # --- Building snapshots ---
+
+    def _scan(self) -> Dict[str, Signature]:
+        signatures = {}
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith(".") or not name.endswith(".json"):
+                continue
+            st = os.stat(os.path.join(self.directory, name))
+            signatures[name] = (st.st_mtime_ns, st.st_size)
+        return signatures
+
+    def _build(self) -> CurriculumSnapshot:
+        signatures = self._scan()
+        meta = self._read_index()
+        stored = meta.get("shards", {})
+
+        # Nothing changed since the index was written: map the stored postings
+        if stored and {name: tuple(e["signature"]) for name, e in stored.items()} == signatures:
+            topics = self._topics(stored)
+            index = self._open_postings(meta, list(topics))
+            if index is not None:
+                return self._snapshot(stored, topics, index)
+
+        stored_terms = self._read_terms() if stored else {}
+        compiled: Dict[str, Dict[str, Any]] = {}
+        terms: Dict[str, Dict[str, Any]] = {}
+        for name, signature in signatures.items():
+            entry, shard_terms = stored.get(name), stored_terms.get(name)
+            fresh = (entry is not None and shard_terms is not None
+                     and tuple(entry["signature"]) == signature and shard_terms["digest"] == entry["digest"])
+            if not fresh:
+                raw = self._read_shard(name)
+                digest = _digest(raw)
+                if entry is not None and shard_terms is not None and entry["digest"] == digest == shard_terms["digest"]:
+                    # Touched but not edited
+                    entry = dict(entry, signature=list(signature))
+                else:
+                    entry, shard_terms = self._compile_shard(raw, digest, signature)
+            compiled[name] = entry
+            terms[name] = shard_terms
+
+        topics = self._topics(compiled)
+        index = CurriculumIndex.from_term_freqs({key: terms[m.shard]["terms"][key] for key, m in topics.items()})
+        # Serve from the mapped file when it could be written, so the freshly
+        # built postings do not stay resident
+        index = self._write_index(compiled, terms, index) or index
+        return self._snapshot(compiled, topics, index)
+
+    def _topics(self, shards: Dict[str, Dict[str, Any]]) -> Dict[str, TopicMeta]:
+        topics: Dict[str, TopicMeta] = {}
+        for name, entry in shards.items():
+            for key, topic, difficulty, keywords in entry["topics"]:
+                if key in topics:
+                    logger.warning(f"Topic {key!r} in {name} already defined in {topics[key].shard}; skipped")
+                    continue
+                topics[key] = TopicMeta(key, topic, entry["module"], difficulty, name,
+                                        tuple(tuple(phrase) for phrase in keywords))
+        return topics
+
+    def _snapshot(self, shards: Dict[str, Dict[str, Any]], topics: Dict[str, TopicMeta],
+                  index: CurriculumIndex) -> CurriculumSnapshot:
+        version = hashlib.blake2b(digest_size=8)
+        for name, entry in shards.items():
+            version.update(f"{name}:{entry['digest']};".encode())
+        return CurriculumSnapshot(
+            topics, index,
+            {name: (tuple(entry["signature"]), entry["digest"]) for name, entry in shards.items()},
+            version.hexdigest(), self._shard_content,
+        )
+
+    def _compile_shard(self, raw: bytes, digest: str,
+                       signature: Signature) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        data = json.loads(raw)
+        topics, terms = [], {}
+        for key, t in data["topics"].items():
+            keywords = [tokens for tokens in map(tokenize, t.get("keywords", [])) if tokens]
+            topics.append([key, t["topic"], t.get("difficulty", "beginner"), keywords])
+            terms[key] = term_freqs({
+                "name": [t["topic"]],
+                "keywords": t.get("keywords", []),
+                "explanation": [t.get("explanation", "")],
+                "examples": t.get("examples", []),
+            })
+        self.shards_compiled += 1
+        entry = {"signature": list(signature), "digest": digest, "module": data["module"], "topics": topics}
+        return entry, {"digest": digest, "terms": terms}
+
+    # --- Compiled index files ---
+    #
+    # <index>.json       shard signatures, topic metadata and the term table
+    # <index>.terms.json per-shard term frequencies, read only to rebuild
+    # <index>.postings   build id header, then packed postings (memory-mapped)
+
+    def _read_json(self, path: str) -> Dict[str, Any]:
+        try:
+            with open(path, "rb") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable curriculum index {path}: {e}")
+            return {}
+
+    def _read_index(self) -> Dict[str, Any]:
+        meta = self._read_json(self.index_file)
+        if (meta.get("format") != INDEX_FORMAT or meta.get("terms_version") != TERMS_VERSION
+                or meta.get("byteorder") != sys.byteorder):
+            return {}
+        return meta
+
+    def _read_terms(self) -> Dict[str, Dict[str, Any]]:
+        return self._read_json(self._terms_file)
+
+    def _open_postings(self, meta: Dict[str, Any], keys: List[str]) -> Optional[CurriculumIndex]:
+        if meta.get("topics_count") != len(keys):
+            return None
+        try:
+            with open(self._postings_file, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        total = sum(length for _, length in meta["terms"].values())
+        # The header ties the postings to the metadata written alongside them
+        if mapped[:_BUILD_ID_BYTES] != meta["build"].encode() or len(mapped) != _BUILD_ID_BYTES + 12 * total:
+            mapped.close()
+            return None
+        return CurriculumIndex.from_postings(keys, meta["terms"], memoryview(mapped)[_BUILD_ID_BYTES:])
+
+    def _write_index(self, compiled: Dict[str, Dict[str, Any]], terms: Dict[str, Dict[str, Any]],
+                     index: CurriculumIndex) -> Optional[CurriculumIndex]:
+        # Best effort: a read-only directory only costs rebuilding on the next start
+        build = os.urandom(_BUILD_ID_BYTES // 2).hex()
+        meta = {
+            "format": INDEX_FORMAT, "terms_version": TERMS_VERSION, "byteorder": sys.byteorder,
+            "build": build, "topics_count": len(index), "shards": compiled, "terms": index.terms,
+        }
+
+        def write_postings(f):
+            f.write(build.encode())
+            index.dump_postings(f)
+
+        try:
+            _replace(self._terms_file, lambda f: f.write(_dumps(terms)))
+            _replace(self._postings_file, write_postings)
+            # Written last: readers only trust postings whose header matches it
+            _replace(self.index_file, lambda f: f.write(_dumps(meta)))
+        except OSError as e:
+            logger.warning(f"Could not write curriculum index {self.index_file}: {e}")
+            return None
+        return self._open_postings(meta, index.keys)
+
+    # --- Lazy content ---
+
+    def _read_shard(self, name: str) -> bytes:
+        with open(os.path.join(self.directory, name), "rb") as f:
+            return f.read()
+
+    def _shard_content(self, name: str, digest: str) -> Dict[str, Dict[str, Any]]:
+        cached = self._content.get((name, digest))
+        if cached is not None:
+            return cached
+        try:
+            raw = self._read_shard(name)
+        except OSError as e:
+            logger.error(f"Curriculum shard {name} unreadable: {e}")
+            return {}
+        self.shards_read += 1
+        if _digest(raw) != digest:
+            # Edited since this snapshot was built. Its content must not be
+            # served under this snapshot's metadata, so answer nothing until
+            # the reload swaps in a snapshot built from the new bytes.
+            self.stale_shard_reads += 1
+            logger.info(f"Curriculum shard {name} changed since the last reload; reloading")
+            self._reload_soon()
+            return {}
+        try:
+            content = {
+                key: {"explanation": t.get("explanation", ""), "examples": t.get("examples", [])}
+                for key, t in json.loads(raw)["topics"].items()
+            }
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.error(f"Curriculum shard {name} unparseable: {e}")
+            return {}
+        self._content.put((name, digest), content)
+        return content
+
+
+if __name__ == "__main__":
+    # Compile the index ahead of time, e.g. at image build:
+    #   python -m app.curriculum [directory]
+    logging.basicConfig(level=logging.INFO)
+    directory = sys.argv[1] if len(sys.argv) > 1 else os.getenv(
+        "CURRICULUM_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "curriculum"))
+    start = time.perf_counter()
+    store = CurriculumStore(directory)
+    snapshot = store.load()
+    print(f"{len(snapshot)} topics in {len(snapshot.shards)} shards, version {snapshot.version}, "
+          f"{store.shards_compiled} compiled, {(time.perf_counter() - start) * 1000:.1f} ms -> {store.index_file}")
@@ -0,0 +1,185 @@
+"""Batched mastery updates from learning events.
+
+Events are folded in memory into per ``(user_id, module, topic)`` deltas and
+written once per window with a single ``INSERT ... ON CONFLICT DO UPDATE``
+over unnested arrays, instead of one write per event.
+"""
+import asyncio
+import os
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from learnflow_common.metrics import STAGE_SECONDS, Counter, timed_acquire
+
+logger = logging.getLogger(__name__)
+
+INGEST_WINDOW = float(os.getenv("INGEST_WINDOW", "1.0"))
+INGEST_MAX_KEYS = int(os.getenv("INGEST_MAX_KEYS", "5000"))
+
+# Mastery points per event type; events without a module and topic are skipped.
+# A concept turn routed by triage also produces a learning.response, which
+# already credits it, so routed events don't by default.
+MASTERY_WEIGHTS = {
+    "learning.response": int(os.getenv("MASTERY_PER_EXPLANATION", "5")),
+    "learning.routed": int(os.getenv("MASTERY_PER_ROUTED", "0")),
+}
+
+# The join drops deltas for unknown users instead of failing the whole batch
+# on the users foreign key
+UPSERT_PROGRESS = """
+INSERT INTO progress (user_id, module, topic, mastery)
+SELECT x.u, x.m, x.t, LEAST(100, x.d)
+FROM unnest($1::int[], $2::text[], $3::text[], $4::int[]) AS x(u, m, t, d)
+JOIN users ON users.id = x.u
+ON CONFLICT (user_id, module, topic) DO UPDATE
+SET mastery = LEAST(100, progress.mastery + EXCLUDED.mastery), updated_at = NOW()
+"""
+
+Key = Tuple[int, str, str]
+
+EVENTS_TOTAL = Counter(
+    "learnflow_ingest_events_total", "Learning events received for mastery updates",
+    ("topic", "result"),
+)
+ROWS_UPSERTED_TOTAL = Counter("learnflow_ingest_rows_upserted_total", "Progress rows written by batched upserts")
+DROPPED_KEYS_TOTAL = Counter(
+    "learnflow_ingest_dropped_keys_total", "Pending mastery deltas dropped with the backlog over its bound",
+)
+
+
+class MasteryAggregator:
+    def __init__(self, pool_getter: Callable[[], Optional[asyncpg.Pool]],
+                 on_flush: Optional[Callable[[List[int]], Awaitable[None]]] = None,
+                 window: float = INGEST_WINDOW, max_keys: int = INGEST_MAX_KEYS):
+        self._pool_getter = pool_getter
+        self._on_flush = on_flush
+        self.window = window
+        self.max_keys = max_keys
+        self._pending: Dict[Key, int] = {}
+        self._full = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._started_at = time.monotonic()
+
+        self.received = 0
+        self.applied = 0
+        self.skipped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped_keys = 0
+        self.rows_upserted = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        if self._worker is None:
+            self._started_at = time.monotonic()
+            self._worker = asyncio.create_task(self._run(), name="mastery-aggregator")
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._stopping = True
+        self._full.set()
+        await self._worker
+        self._worker = None
+        await self.flush()
+
+    def add(self, topic: str, data: Any) -> bool:
+        """Fold one event into the pending deltas; returns False if it was skipped."""
+        self.received += 1
+        weight = MASTERY_WEIGHTS.get(topic, 0)
+        if not weight or not isinstance(data, dict):
+            self.skipped += 1
+            EVENTS_TOTAL.inc(topic, "skipped")
+            return False
+        try:
+            key = (int(data["user_id"]), str(data["module"]), str(data["topic"]))
+        except (KeyError, TypeError, ValueError):
+            self.skipped += 1
+            EVENTS_TOTAL.inc(topic, "skipped")
+            return False
+        self._pending[key] = self._pending.get(key, 0) + weight
+        self.applied += 1
+        EVENTS_TOTAL.inc(topic, "applied")
+        if len(self._pending) >= self.max_keys:
+            self._full.set()
+        return True
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pool = self._pool_getter()
+        if pool is None:
+            # Deltas wait for the database under the same bound as a failed write
+            if len(self._pending) > self.max_keys * 2:
+                batch, self._pending = self._pending, {}
+                self._drop(batch, "no database connection")
+            return
+        batch, self._pending = self._pending, {}
+        users, modules, topics, deltas = [], [], [], []
+        for (user_id, module, topic), delta in batch.items():
+            users.append(user_id)
+            modules.append(module)
+            topics.append(topic)
+            deltas.append(delta)
+        start = time.perf_counter()
+        try:
+            async with timed_acquire(pool) as conn:
+                with STAGE_SECONDS.time("progress_upsert"):
+                    status = await conn.execute(UPSERT_PROGRESS, users, modules, topics, deltas)
+        except Exception as e:
+            self.failed_flushes += 1
+            logger.error(f"Progress upsert of {len(batch)} rows failed: {e}")
+            # Deltas are additive, so fold them back in for the next window
+            # unless the backlog is already over its bound
+            if len(self._pending) + len(batch) <= self.max_keys * 2:
+                for key, delta in batch.items():
+                    self._pending[key] = self._pending.get(key, 0) + delta
+            else:
+                self._drop(batch, "progress upsert failed")
+            return
+        finally:
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        # Status is "INSERT 0 <rows>"
+        rows = int(status.rsplit(" ", 1)[-1])
+        self.rows_upserted += rows
+        ROWS_UPSERTED_TOTAL.inc(amount=rows)
+        if self._on_flush:
+            try:
+                await self._on_flush(sorted(set(users)))
+            except Exception as e:
+                logger.warning(f"Progress flush callback failed: {e}")
+
+    def _drop(self, batch: Dict[Key, int], reason: str):
+        self.dropped_keys += len(batch)
+        DROPPED_KEYS_TOTAL.inc(amount=len(batch))
+        logger.error(f"Dropped mastery deltas for {len(batch)} keys ({sum(batch.values())} points): {reason}")
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started_at
+        return {
+            "pending_keys": len(self._pending),
+            "received": self.received,
+            "applied": self.applied,
+            "skipped": self.skipped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped_keys": self.dropped_keys,
+            "rows_upserted": self.rows_upserted,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "events_per_sec": round(self.received / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            if not self._stopping:
+                await self.flush()
@@ -1,10 +1,24 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import httpx
 import os
 import logging
-from typing import Dict, Any, Optional
+import random
+import asyncio
+import asyncpg
+from typing import Dict, Any, Optional, List, Tuple
+
+from learnflow_common.dapr_client import DaprClient
+from learnflow_common.metrics import (
+    CONTENT_TYPE, REGISTRY, STAGE_SECONDS, Counter, Gauge,
+    RequestMetricsMiddleware, register_pool_gauges,
+)
+from learnflow_common.publisher import EventPublisher
+from learnflow_common.responses import dumps, json_response
+
+from app.curriculum import CurriculumSnapshot, CurriculumStore
+from app.ingest import MasteryAggregator
+from app.search import tokenize
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,6 +31,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 # Config
 DAPR_HTTP_PORT = os.getenv("DAPR_HTTP_PORT", "3500")
@@ -24,172 +39,189 @@ DAPR_URL = f"http://localhost:{DAPR_HTTP_PORT}"
 PUBSUB_NAME = "kafka-pubsub"
 STATE_STORE = "postgres-statestore"
 
+PG_HOST = os.getenv("POSTGRES_HOST", "postgres-postgresql.postgres.svc.cluster.local")
+PG_PORT = os.getenv("POSTGRES_PORT", "5432")
+PG_USER = os.getenv("POSTGRES_USER", "postgres")
+PG_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
+PG_DATABASE = os.getenv("POSTGRES_DATABASE", "learnflow")
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# Reconnect delays while the database is unreachable, doubling per failure
+DB_RECONNECT_BACKOFF_BASE = float(os.getenv("DB_RECONNECT_BACKOFF_BASE", "1"))
+DB_RECONNECT_BACKOFF_MAX = float(os.getenv("DB_RECONNECT_BACKOFF_MAX", "30"))
+
+# Bulk-subscribe deliveries from the sidecar
+INGEST_BULK_MAX_MESSAGES = int(os.getenv("INGEST_BULK_MAX_MESSAGES", "100"))
+INGEST_BULK_MAX_AWAIT_MS = int(os.getenv("INGEST_BULK_MAX_AWAIT_MS", "40"))
+
+PUBLISH_TIMEOUT = float(os.getenv("PUBLISH_TIMEOUT", "5"))
+SEARCH_MIN_SCORE = float(os.getenv("SEARCH_MIN_SCORE", "1.5"))
+RELATED_TOPICS = int(os.getenv("RELATED_TOPICS", "2"))
+EXPLAIN_BATCH_MAX = int(os.getenv("EXPLAIN_BATCH_MAX", "500"))
+
+CURRICULUM_DIR = os.getenv(
+    "CURRICULUM_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "curriculum"),
+)
+# Seconds between stat checks of the shards; 0 disables the watcher
+CURRICULUM_RELOAD_INTERVAL = float(os.getenv("CURRICULUM_RELOAD_INTERVAL", "30"))
+
+dapr = DaprClient(DAPR_URL, PUBSUB_NAME, route_timeouts={"publish": PUBLISH_TIMEOUT})
+publisher = EventPublisher(dapr)
+
+db_pool: Optional[asyncpg.Pool] = None
+db_connect_failures = 0
+_db_reconnect: Optional[asyncio.Task] = None
+
+
+async def _progress_flushed(user_ids: List[int]):
+    # Lets triage replicas drop their cached /progress for these students
+    publisher.publish("progress.updated", {"user_ids": user_ids})
+
+
+mastery = MasteryAggregator(lambda: db_pool, on_flush=_progress_flushed)
+
+
+async def _curriculum_changed(snapshot: CurriculumSnapshot):
+    # Lets triage replicas drop cached answers rendered from the old content
+    publisher.publish("curriculum.reloaded", {"version": snapshot.version, "topics_count": len(snapshot)})
+
+
+curriculum = CurriculumStore(CURRICULUM_DIR, on_change=_curriculum_changed, watch_interval=CURRICULUM_RELOAD_INTERVAL)
+
+# --- Metrics ---
+
+EXPLAIN_TOTAL = Counter(
+    "learnflow_explain_total", "Questions answered by /explain and /explain/batch, by outcome", ("outcome",),
+)
+Gauge(
+    "learnflow_queue_depth", "Items waiting in background queues",
+    lambda: {
+        ("publisher",): publisher.stats()["queue_depth"],
+        ("mastery",): mastery.stats()["pending_keys"],
+    },
+    labelnames=("queue",),
+)
+register_pool_gauges(lambda: db_pool)
+Gauge(
+    "learnflow_curriculum_topics", "Topics in the live curriculum snapshot",
+    lambda: len(curriculum.current) if curriculum.current is not None else None,
+)
+
 # --- Models ---
 
 class ExplainRequest(BaseModel):
     question: str
     user_id: int = 1
+    # Triage sets False and publishes learning.response itself once the
+    # student has actually been shown the answer
+    publish_learning: bool = True
 
 class ExplainResponse(BaseModel):
     explanation: str
     topic: str
+    module: str = ""
     examples: list = []
     difficulty: str = "beginner"
+    related: list = []
 
-# --- Python Curriculum Knowledge Base ---
-
-CURRICULUM = {
-    "variables": {
-        "topic": "Variables & Data Types",
-        "module": "Basics",
-        "difficulty": "beginner",
-        "explanation": (
-            "Variables in Python store values. Unlike many languages, Python uses **dynamic typing** - "
-            "you don't declare types explicitly.\n\n"
-            "### Basic Types\n"
-            "- `int` — whole numbers: `age = 16`\n"
-            "- `float` — decimals: `pi = 3.14`\n"
-            "- `str` — text: `name = 'Maya'`\n"
-            "- `bool` — True/False: `is_student = True`\n\n"
-            "### Type Conversion\n"
-            "```python\n"
-            "x = '42'        # string\n"
-            "y = int(x)      # now integer 42\n"
-            "z = float(x)    # now float 42.0\n"
-            "```"
-        ),
-        "examples": [
-            "name = 'Maya'\nprint(type(name))  # <class 'str'>",
-            "age = 16\nprint(age + 1)  # 17",
-            "# Multiple assignment\nx, y, z = 1, 2, 3\nprint(x, y, z)",
-        ],
-    },
-    "for_loop": {
-        "topic": "For Loops",
-        "module": "Control Flow",
-        "difficulty": "beginner",
-        "explanation": (
-            "A **for loop** iterates over a sequence (list, string, range, etc.).\n\n"
-            "### Basic Syntax\n"
-            "```python\nfor item in sequence:\n    # do something with item\n```\n\n"
-            "### Common Patterns\n"
-            "- `range(n)` — loop n times (0 to n-1)\n"
-            "- `range(start, stop)` — loop from start to stop-1\n"
-            "- `range(start, stop, step)` — with step size\n"
-            "- `enumerate()` — get index and value\n"
-        ),
-        "examples": [
-            "for i in range(5):\n    print(i)  # 0, 1, 2, 3, 4",
-            "fruits = ['apple', 'banana', 'cherry']\nfor fruit in fruits:\n    print(fruit)",
-            "for i, fruit in enumerate(fruits):\n    print(f'{i}: {fruit}')",
-            "# Sum numbers 1 to 10\ntotal = 0\nfor n in range(1, 11):\n    total += n\nprint(total)  # 55",
-        ],
-    },
-    "while_loop": {
-        "topic": "While Loops",
-        "module": "Control Flow",
-        "difficulty": "beginner",
-        "explanation": (
-            "A **while loop** repeats as long as a condition is True.\n\n"
-            "```python\nwhile condition:\n    # do something\n    # update condition\n```\n\n"
-            "### Key Points\n"
-            "- Always ensure the condition eventually becomes False\n"
-            "- Use `break` to exit early\n"
-            "- Use `continue` to skip to next iteration\n"
-        ),
-        "examples": [
-            "count = 0\nwhile count < 5:\n    print(count)\n    count += 1",
-            "# Find first power of 2 > 1000\nn = 1\nwhile n <= 1000:\n    n *= 2\nprint(n)  # 1024",
-        ],
-    },
-    "lists": {
-        "topic": "Lists",
-        "module": "Data Structures",
-        "difficulty": "beginner",
-        "explanation": (
-            "A **list** is an ordered, mutable collection.\n\n"
-            "```python\nfruits = ['apple', 'banana', 'cherry']\n```\n\n"
-            "### Common Operations\n"
-            "- Access: `fruits[0]` → 'apple'\n"
-            "- Append: `fruits.append('date')`\n"
-            "- Insert: `fruits.insert(1, 'blueberry')`\n"
-            "- Remove: `fruits.remove('banana')`\n"
-            "- Length: `len(fruits)`\n"
-            "- Slice: `fruits[1:3]`\n\n"
-            "### List Comprehension\n"
-            "```python\nsquares = [x**2 for x in range(10)]\n```"
-        ),
-        "examples": [
-            "nums = [3, 1, 4, 1, 5, 9]\nnums.sort()\nprint(nums)  # [1, 1, 3, 4, 5, 9]",
-            "# List comprehension\nevens = [x for x in range(20) if x % 2 == 0]\nprint(evens)",
-        ],
-    },
-    "functions": {
-        "topic": "Functions",
-        "module": "Functions",
-        "difficulty": "intermediate",
-        "explanation": (
-            "A **function** is a reusable block of code defined with `def`.\n\n"
-            "```python\ndef function_name(parameters):\n    # body\n    return result\n```\n\n"
-            "### Key Concepts\n"
-            "- **Parameters**: inputs to the function\n"
-            "- **Return value**: output from the function\n"
-            "- **Default arguments**: `def greet(name='World')`\n"
-            "- **Scope**: variables inside a function are local\n"
-        ),
-        "examples": [
-            "def greet(name):\n    return f'Hello, {name}!'\n\nprint(greet('Maya'))",
-            "def add(a, b=0):\n    return a + b\n\nprint(add(3, 4))  # 7\nprint(add(3))     # 3",
-            "# Multiple return values\ndef min_max(numbers):\n    return min(numbers), max(numbers)\n\nlo, hi = min_max([3, 1, 4, 1, 5])\nprint(lo, hi)  # 1 5",
-        ],
-    },
-    "dictionaries": {
-        "topic": "Dictionaries",
-        "module": "Data Structures",
-        "difficulty": "intermediate",
-        "explanation": (
-            "A **dictionary** stores key-value pairs.\n\n"
-            "```python\nstudent = {'name': 'Maya', 'age': 16, 'grade': 'A'}\n```\n\n"
-            "### Common Operations\n"
-            "- Access: `student['name']` → 'Maya'\n"
-            "- Safe access: `student.get('email', 'N/A')`\n"
-            "- Add/update: `student['email'] = 'maya@school.com'`\n"
-            "- Keys: `student.keys()`\n"
-            "- Values: `student.values()`\n"
-            "- Items: `student.items()`\n"
+# --- Curriculum ---
+
+def _accepted(snapshot: CurriculumSnapshot, tokens: List[str],
+              matches: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+    # A question naming one of a topic's keywords matches it however common the word is
+    hits = snapshot.keyword_hits(tokens)
+    return [(key, score) for key, score in matches if score >= SEARCH_MIN_SCORE or key in hits]
+
+
+def search_topics(snapshot: CurriculumSnapshot, question: str, k: int = 1) -> List[Tuple[str, float]]:
+    """Return up to k ranked (topic_key, score) matches for a question."""
+    tokens = tokenize(question)
+    return _accepted(snapshot, tokens, snapshot.index.search_tokens(tokens, k))
+
+
+def search_topics_batch(snapshot: CurriculumSnapshot, questions: List[str],
+                        k: int = 1) -> List[List[Tuple[str, float]]]:
+    """``search_topics()`` for many questions, scored in one pass over the index."""
+    return [
+        _accepted(snapshot, tokenize(question), matches)
+        for question, matches in zip(questions, snapshot.index.search_many(questions, k))
+    ]
+
+
+def fallback_explanation(question: str) -> ExplainResponse:
+    return ExplainResponse(
+        explanation=(
+            f"Great question about: *{question}*\n\n"
+            "I can help you learn Python! Here are topics I specialize in:\n"
+            "- **Variables & Data Types** — storing and using values\n"
+            "- **For Loops** — iterating over sequences\n"
+            "- **While Loops** — repeating with conditions\n"
+            "- **Lists** — ordered collections\n"
+            "- **Functions** — reusable code blocks\n"
+            "- **Dictionaries** — key-value pairs\n\n"
+            "Try asking about any of these topics!"
         ),
-        "examples": [
-            "student = {'name': 'Maya', 'age': 16}\nfor key, value in student.items():\n    print(f'{key}: {value}')",
-            "# Count word frequency\nwords = 'the cat sat on the mat'.split()\nfreq = {}\nfor w in words:\n    freq[w] = freq.get(w, 0) + 1\nprint(freq)",
-        ],
-    },
-}
-
-
-def find_topic(question: str) -> Optional[Dict]:
-    """Find the best matching curriculum topic for a question."""
-    q = question.lower()
-    topic_keywords = {
-        "variables": ["variable", "data type", "int", "float", "string", "bool", "type"],
-        "for_loop": ["for loop", "for i in", "range(", "iterate", "for each"],
-        "while_loop": ["while loop", "while ", "repeat until"],
-        "lists": ["list", "array", "append", "sort", "slice", "comprehension"],
-        "functions": ["function", "def ", "return", "parameter", "argument"],
-        "dictionaries": ["dictionary", "dict", "key", "value", "hash map"],
-    }
+        topic="General",
+        examples=[],
+        difficulty="beginner",
+    )
+
 
-    best_match = None
-    best_score = 0
+# --- Lifecycle ---
+
+async def _connect_db() -> bool:
+    global db_pool, db_connect_failures
+    try:
+        db_pool = await asyncpg.create_pool(
+            host=PG_HOST, port=int(PG_PORT), user=PG_USER,
+            password=PG_PASSWORD, database=PG_DATABASE,
+            min_size=1, max_size=2, timeout=DB_CONNECT_TIMEOUT,
+        )
+    except Exception as e:
+        db_connect_failures += 1
+        logger.error(f"DB connection failed ({db_connect_failures} in a row): {e}")
+        return False
+    db_connect_failures = 0
+    logger.info("Database pool created")
+    return True
 
-    for topic_key, keywords in topic_keywords.items():
-        score = sum(1 for kw in keywords if kw in q)
-        if score > best_score:
-            best_score = score
-            best_match = topic_key
 
-    if best_match and best_score > 0:
-        return CURRICULUM[best_match]
-    return None
+async def _reconnect_db():
+    """Retry the pool with exponential backoff until the database is reachable."""
+    while True:
+        delay = min(DB_RECONNECT_BACKOFF_MAX, DB_RECONNECT_BACKOFF_BASE * 2 ** min(db_connect_failures - 1, 30))
+        # Jitter so replicas don't reconnect to a recovering database in lockstep
+        await asyncio.sleep(delay * random.uniform(0.8, 1.0))
+        if await _connect_db():
+            return
+
+
+@app.on_event("startup")
+async def startup():
+    global _db_reconnect
+    await dapr.start()
+    publisher.start()
+    try:
+        await curriculum.reload()
+        logger.info(f"Curriculum loaded: {len(curriculum.current)} topics from {CURRICULUM_DIR}")
+    except Exception as e:
+        logger.error(f"Curriculum load failed: {e}")
+    curriculum.start()
+    # Connect before serving if we can; mastery deltas wait in memory meanwhile
+    if not await _connect_db():
+        _db_reconnect = asyncio.create_task(_reconnect_db(), name="db-reconnect")
+    mastery.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if _db_reconnect is not None:
+        _db_reconnect.cancel()
+        await asyncio.gather(_db_reconnect, return_exceptions=True)
+    await curriculum.stop()
+    await mastery.stop()
+    await publisher.stop()
+    await dapr.close()
+    if db_pool:
+        await db_pool.close()
 
 
 # --- Endpoints ---
@@ -199,83 +231,163 @@ async def health():
     return {"status": "healthy", "service": "concepts-agent"}
 
 @app.get("/ready")
-async def readiness():
-    return {"status": "ready", "topics_count": len(CURRICULUM)}
+async def readiness(response: Response):
+    snapshot = curriculum.current
+    if snapshot is None:
+        response.status_code = 503
+        return {"status": "not ready", "reason": "curriculum not loaded"}
+    return {"status": "ready", "topics_count": len(snapshot), "curriculum_version": snapshot.version}
 
 
 @app.post("/explain", response_model=ExplainResponse)
-async def explain(req: ExplainRequest):
+async def explain(req: ExplainRequest, request: Request):
     """Explain a Python concept with examples."""
     logger.info(f"Explain request: {req.question[:50]}...")
 
-    topic_data = find_topic(req.question)
-
-    if topic_data:
-        explanation = topic_data["explanation"]
-        if topic_data["examples"]:
-            explanation += "\n\n### Try it yourself:\n```python\n"
-            explanation += topic_data["examples"][0]
-            explanation += "\n```"
-
-        # Publish learning event
-        try:
-            async with httpx.AsyncClient() as client:
-                await client.post(
-                    f"{DAPR_URL}/v1.0/publish/{PUBSUB_NAME}/learning.response",
-                    json={"user_id": req.user_id, "topic": topic_data["topic"],
-                          "module": topic_data["module"]}
-                )
-        except Exception:
-            pass
-
-        return ExplainResponse(
-            explanation=explanation,
-            topic=topic_data["topic"],
-            examples=topic_data["examples"],
-            difficulty=topic_data["difficulty"],
-        )
+    # Held for the whole request so a concurrent reload cannot mix old and new content
+    snapshot = curriculum.current
+    matches = []
+    if snapshot is not None:
+        with STAGE_SECONDS.time("search"):
+            matches = search_topics(snapshot, req.question, 1 + RELATED_TOPICS)
+
+    with STAGE_SECONDS.time("render"):
+        rendered = snapshot.rendered(matches[0][0]) if matches else None
+        related = [snapshot.match(key, score) for key, score in matches[1:]]
+
+    if rendered:
+        EXPLAIN_TOTAL.inc("matched")
+        if req.publish_learning:
+            meta = snapshot.topics[matches[0][0]]
+            # Publish learning event (queued; sent in bulk in the background)
+            publisher.publish(
+                "learning.response",
+                {"user_id": req.user_id, "topic": meta.topic, "module": meta.module}
+            )
+        return json_response(request, rendered.with_related(related))
     else:
-        return ExplainResponse(
-            explanation=(
-                f"Great question about: *{req.question}*\n\n"
-                "I can help you learn Python! Here are topics I specialize in:\n"
-                "- **Variables & Data Types** — storing and using values\n"
-                "- **For Loops** — iterating over sequences\n"
-                "- **While Loops** — repeating with conditions\n"
-                "- **Lists** — ordered collections\n"
-                "- **Functions** — reusable code blocks\n"
-                "- **Dictionaries** — key-value pairs\n\n"
-                "Try asking about any of these topics!"
-            ),
-            topic="General",
-            examples=[],
-            difficulty="beginner",
-        )
+        EXPLAIN_TOTAL.inc("fallback")
+        return fallback_explanation(req.question)
+
+
+@app.post("/explain/batch", response_model=List[ExplainResponse])
+async def explain_batch(reqs: List[ExplainRequest]):
+    """Explain many questions in one call; responses come back in request order."""
+    if len(reqs) > EXPLAIN_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {EXPLAIN_BATCH_MAX} questions per batch")
+    logger.info(f"Explain batch of {len(reqs)} questions")
+
+    snapshot = curriculum.current
+    batch_matches: List[List[Tuple[str, float]]] = [[] for _ in reqs]
+    if snapshot is not None and reqs:
+        with STAGE_SECONDS.time("batch_search"):
+            batch_matches = search_topics_batch(snapshot, [r.question for r in reqs], 1 + RELATED_TOPICS)
+
+    bodies: List[bytes] = []
+    events: List[Dict[str, Any]] = []
+    matched = 0
+    with STAGE_SECONDS.time("batch_render"):
+        for req, matches in zip(reqs, batch_matches):
+            rendered = snapshot.rendered(matches[0][0]) if matches else None
+            if rendered is None:
+                bodies.append(dumps(fallback_explanation(req.question).model_dump()))
+                continue
+            related = [snapshot.match(key, score) for key, score in matches[1:]]
+            bodies.append(rendered.with_related(related).body)
+            matched += 1
+            if req.publish_learning:
+                meta = snapshot.topics[matches[0][0]]
+                events.append({"user_id": req.user_id, "topic": meta.topic, "module": meta.module})
+
+    EXPLAIN_TOTAL.inc("matched", amount=matched)
+    EXPLAIN_TOTAL.inc("fallback", amount=len(reqs) - matched)
+    # The whole batch's learning events go out in one bulk publish
+    publisher.publish_many("learning.response", events)
+    return Response(content=b"[" + b",".join(bodies) + b"]", media_type="application/json")
+
+
+@app.get("/stats")
+async def stats():
+    """In-process counters for background components."""
+    return {
+        "publisher": publisher.stats(),
+        "mastery": mastery.stats(),
+        "curriculum": curriculum.stats(),
+        "db": {"connected": db_pool is not None, "connect_failures": db_connect_failures},
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 
 @app.post("/subscribe")
 async def handle_event(event: Dict[str, Any]):
-    """Handle events from Kafka via Dapr subscription."""
-    logger.info(f"Received event: {event}")
-    return {"status": "processed"}
+    """Fold learning events into pending mastery updates.
+
+    Accepts single CloudEvents as well as bulk-subscribe deliveries
+    (``{"topic": ..., "entries": [...]}``), which are acknowledged per entry.
+    """
+    entries = event.get("entries")
+    if entries is None:
+        mastery.add(event.get("topic", ""), event.get("data"))
+        return {"status": "SUCCESS"}
+
+    topic = event.get("topic", "")
+    statuses = []
+    for entry in entries:
+        cloud_event = entry.get("event")
+        data = cloud_event.get("data") if isinstance(cloud_event, dict) else None
+        # Malformed events are acknowledged too; redelivery would not fix them
+        mastery.add(topic, data)
+        statuses.append({"entryId": entry.get("entryId"), "status": "SUCCESS"})
+    return {"statuses": statuses}
 
 @app.get("/dapr/subscribe")
 async def dapr_subscribe():
     """Dapr subscription config."""
+    bulk = {
+        "enabled": True,
+        "maxMessagesCount": INGEST_BULK_MAX_MESSAGES,
+        "maxAwaitDurationMs": INGEST_BULK_MAX_AWAIT_MS,
+    }
     return [
-        {"pubsubname": PUBSUB_NAME, "topic": "learning.routed", "route": "/subscribe"}
+        {"pubsubname": PUBSUB_NAME, "topic": topic, "route": "/subscribe", "bulkSubscribe": bulk}
+        for topic in ("learning.routed", "learning.response")
     ]
 
 
 @app.get("/topics")
-async def list_topics():
+async def list_topics(request: Request):
     """List available curriculum topics."""
-    return {
-        "topics": [
-            {"key": k, "name": v["topic"], "module": v["module"], "difficulty": v["difficulty"]}
-            for k, v in CURRICULUM.items()
-        ]
-    }
+    snapshot = curriculum.current
+    if snapshot is None:
+        return {"topics": []}
+    return json_response(request, snapshot.topic_list)
+
+
+@app.get("/search")
+async def search(q: str, k: int = 5):
+    """Rank curriculum topics for a free-text query."""
+    snapshot = curriculum.current
+    if snapshot is None:
+        return {"query": q, "results": []}
+    matches = search_topics(snapshot, q, max(1, min(k, 50)))
+    return {"query": q, "results": [snapshot.match(key, score) for key, score in matches]}
+
+
+@app.post("/curriculum/reload")
+async def reload_curriculum():
+    """Re-read the curriculum shards and swap in the new content."""
+    try:
+        changed = await curriculum.reload()
+    except Exception as e:
+        logger.error(f"Curriculum reload failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Curriculum reload failed: {e}")
+    snapshot = curriculum.current
+    return {"changed": changed, "version": snapshot.version, "topics_count": len(snapshot)}
 
 
 @app.get("/")
@@ -0,0 +1,26 @@
+"""Per-topic /explain bodies built on the shared pre-serialized responses.
+
+Curriculum content is static between loads, so each topic's body is encoded
+once; only the per-query ``related`` list is encoded per request.
+"""
+from typing import Any, Dict
+
+from learnflow_common.responses import Rendered, dumps, make_etag
+
+
+class RenderedTopic:
+    """An /explain body for one topic, minus the per-query ``related`` list."""
+
+    __slots__ = ("prefix", "unrelated")
+
+    def __init__(self, payload: Dict[str, Any]):
+        # Encode without "related", then splice it in per request
+        encoded = dumps(payload)
+        self.prefix = encoded[:-1] + b',"related":'
+        self.unrelated = Rendered(self.prefix + b"[]}", make_etag(self.prefix, b"[]"))
+
+    def with_related(self, related: list) -> Rendered:
+        if not related:
+            return self.unrelated
+        tail = dumps(related)
+        return Rendered(self.prefix + tail + b"}", make_etag(self.prefix, tail))
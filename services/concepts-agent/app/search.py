@@ -0,0 +1,254 @@
+"""BM25 inverted index over curriculum topics.
+
+Each topic is indexed once per curriculum load from its name, keywords,
+explanation and examples. Per-term BM25 contributions are precomputed into
+the postings, so a query only sums the postings of its own terms. Cost is
+the number of topics sharing those terms, which still grows with the
+curriculum for common words.
+"""
+import heapq
+import math
+from array import array
+import os
+import re
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; scoring falls back to pure Python
+    np = None
+
+SEARCH_USE_NUMPY = os.getenv("SEARCH_USE_NUMPY", "auto").lower()
+# Below this many postings per query, NumPy call overhead outweighs the win
+NUMPY_MIN_POSTINGS = int(os.getenv("SEARCH_NUMPY_MIN_POSTINGS", "256"))
+# Cap on the (query x topic) score matrix for batched search; bigger batches
+# are scored in chunks of rows
+SEARCH_BATCH_CELLS = int(os.getenv("SEARCH_BATCH_CELLS", str(1 << 21)))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Field weights (BM25F-style): matches in the name or keywords count more
+# than matches in body text
+FIELD_WEIGHTS = {"name": 3.0, "keywords": 3.0, "explanation": 1.0, "examples": 0.5}
+
+# With a large curriculum, terms found in most topics carry almost no signal
+# and only make postings long
+MAX_DF_RATIO = 0.5
+MAX_DF_MIN_DOCS = 100
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does did i in is it me my of on or "
+    "please so than that the their them then there this to use using was "
+    "we what when where which who why will with you your how about tell".split()
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+
+def _stem(token: str) -> str:
+    # Plural folding only, enough for "loops" / "loop" and "dictionaries" / "dictionary"
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+# Bump when tokenize() or FIELD_WEIGHTS change, so stored term frequencies are rebuilt
+TERMS_VERSION = 1
+
+
+def term_freqs(fields: Dict[str, Iterable[str]]) -> Dict[str, float]:
+    """Field-weighted term frequencies for one topic's ``{field: [text, ...]}``."""
+    tf: Dict[str, float] = {}
+    for field, texts in fields.items():
+        weight = FIELD_WEIGHTS.get(field, 1.0)
+        for text in texts:
+            for token in tokenize(text):
+                tf[token] = tf.get(token, 0.0) + weight
+    return tf
+
+
+class CurriculumIndex:
+    """Ranked search over topics; ``search()`` returns ``(key, score)`` pairs.
+
+    Postings are packed into two flat arrays, contributions (float64) and doc
+    ids (int32), with ``terms`` mapping each term to its ``(offset, length)``.
+    That is 12 bytes per posting instead of a tuple and a float object. The
+    arrays can be written out with ``dump_postings()`` and memory-mapped back
+    with ``from_postings()``, and NumPy views them without copying.
+    """
+
+    def __init__(self, topics: Dict[str, Dict[str, Iterable[str]]], use_numpy: Optional[bool] = None):
+        """``topics`` maps topic key to ``{field: [text, ...]}`` for the fields in FIELD_WEIGHTS."""
+        self._build({key: term_freqs(fields) for key, fields in topics.items()}, use_numpy)
+
+    @classmethod
+    def from_term_freqs(cls, topics: Dict[str, Dict[str, float]],
+                        use_numpy: Optional[bool] = None) -> "CurriculumIndex":
+        """Build from precomputed ``term_freqs()`` per topic key, skipping tokenization."""
+        index = cls.__new__(cls)
+        index._build(topics, use_numpy)
+        return index
+
+    @classmethod
+    def from_postings(cls, keys: List[str], terms: Dict[str, Tuple[int, int]], buffer: memoryview,
+                      use_numpy: Optional[bool] = None) -> "CurriculumIndex":
+        """Wrap postings written by ``dump_postings()``, e.g. a memory-mapped file, without copying."""
+        total = sum(length for _, length in terms.values())
+        index = cls.__new__(cls)
+        index.keys = keys
+        # Contributions first so the float64 array starts 8-byte aligned
+        index._set_postings(terms, buffer[8 * total:12 * total].cast("i"), buffer[:8 * total].cast("d"), use_numpy)
+        return index
+
+    def dump_postings(self, f: BinaryIO):
+        """Write contributions then doc ids, in native byte order."""
+        f.write(self.contributions)
+        f.write(self.doc_ids)
+
+    def _build(self, topics: Dict[str, Dict[str, float]], use_numpy: Optional[bool]):
+        self.keys: List[str] = list(topics)
+        n = len(self.keys)
+
+        doc_tfs: List[Dict[str, float]] = [topics[key] for key in self.keys]
+        doc_lens: List[float] = []
+        df: Dict[str, int] = {}
+        for tf in doc_tfs:
+            doc_lens.append(sum(tf.values()))
+            for token in tf:
+                df[token] = df.get(token, 0) + 1
+
+        avg_len = (sum(doc_lens) / n) if n else 0.0
+        max_df = int(n * MAX_DF_RATIO) if n >= MAX_DF_MIN_DOCS else n
+
+        idfs = {t: math.log(1 + (n - d + 0.5) / (d + 0.5)) for t, d in df.items() if d <= max_df}
+
+        postings: Dict[str, Tuple[array, array]] = {}
+        for doc_id, tf in enumerate(doc_tfs):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lens[doc_id] / avg_len) if avg_len else BM25_K1
+            for token, freq in tf.items():
+                idf = idfs.get(token)
+                if idf is None:
+                    continue
+                posting = postings.get(token)
+                if posting is None:
+                    posting = postings[token] = (array("i"), array("d"))
+                posting[0].append(doc_id)
+                posting[1].append(idf * freq * (BM25_K1 + 1) / (freq + norm))
+
+        terms: Dict[str, Tuple[int, int]] = {}
+        doc_ids, contributions = array("i"), array("d")
+        for token, (ids, scores) in postings.items():
+            terms[token] = (len(doc_ids), len(ids))
+            doc_ids.extend(ids)
+            contributions.extend(scores)
+        self._set_postings(terms, doc_ids, contributions, use_numpy)
+
+    def _set_postings(self, terms: Dict[str, Tuple[int, int]], doc_ids: Sequence[int],
+                      contributions: Sequence[float], use_numpy: Optional[bool]):
+        self.terms = terms
+        self.doc_ids = doc_ids
+        self.contributions = contributions
+        if use_numpy is None:
+            use_numpy = SEARCH_USE_NUMPY == "true" or (SEARCH_USE_NUMPY == "auto" and np is not None)
+        self.use_numpy = bool(use_numpy and np is not None)
+        if self.use_numpy:
+            self._np_doc_ids = np.frombuffer(doc_ids, dtype=np.intc)
+            self._np_contributions = np.frombuffer(contributions, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def search(self, query: str, k: int = 1) -> List[Tuple[str, float]]:
+        """Return up to ``k`` best ``(topic_key, score)`` pairs, best first."""
+        return self.search_tokens(tokenize(query), k)
+
+    def search_tokens(self, tokens: Sequence[str], k: int = 1) -> List[Tuple[str, float]]:
+        terms = [self.terms[t] for t in dict.fromkeys(tokens) if t in self.terms]
+        if not terms or k <= 0:
+            return []
+        if self.use_numpy and sum(length for _, length in terms) >= NUMPY_MIN_POSTINGS:
+            return self._search_numpy(terms, k)
+
+        scores: Dict[int, float] = {}
+        for start, length in terms:
+            end = start + length
+            for doc_id, contribution in zip(self.doc_ids[start:end], self.contributions[start:end]):
+                scores[doc_id] = scores.get(doc_id, 0.0) + contribution
+        # Ties go to the topic listed first in the curriculum
+        best = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(self.keys[doc_id], score) for doc_id, score in best]
+
+    def search_many(self, queries: Sequence[str], k: int = 1) -> List[List[Tuple[str, float]]]:
+        """``search()`` for each query, scored together; results are in query order.
+
+        With NumPy, the postings of a chunk of queries are gathered into one
+        array and summed into a dense ``(query, topic)`` score matrix with a
+        single bincount, then the top ``k`` of every row are picked at once.
+        Rankings and ties match ``search()``.
+        """
+        token_lists = [tokenize(q) for q in queries]
+        if not self.use_numpy or k <= 0 or not self.keys:
+            return [self.search_tokens(tokens, k) for tokens in token_lists]
+        spans = [[self.terms[t] for t in dict.fromkeys(tokens) if t in self.terms] for tokens in token_lists]
+        if sum(length for row in spans for _, length in row) < NUMPY_MIN_POSTINGS:
+            return [self.search_tokens(tokens, k) for tokens in token_lists]
+
+        results: List[List[Tuple[str, float]]] = []
+        chunk = max(1, SEARCH_BATCH_CELLS // len(self.keys))
+        for first in range(0, len(spans), chunk):
+            results.extend(self._search_chunk(spans[first:first + chunk], k))
+        return results
+
+    def _search_chunk(self, spans: List[List[Tuple[int, int]]], k: int) -> List[List[Tuple[str, float]]]:
+        n = len(self.keys)
+        results: List[List[Tuple[str, float]]] = [[] for _ in spans]
+        rows, starts, lengths = [], [], []
+        for row, terms in enumerate(spans):
+            for start, length in terms:
+                rows.append(row)
+                starts.append(start)
+                lengths.append(length)
+        if not rows:
+            return results
+        starts = np.asarray(starts, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        ends = np.cumsum(lengths)
+        # Positions of every gathered posting in the flat arrays
+        positions = np.arange(ends[-1]) + np.repeat(starts - (ends - lengths), lengths)
+        cells = np.repeat(np.asarray(rows, dtype=np.int64), lengths) * n + self._np_doc_ids[positions]
+        scores = np.bincount(cells, weights=self._np_contributions[positions],
+                             minlength=len(spans) * n).reshape(len(spans), n)
+
+        # Every topic scoring at least the row's k-th best is a candidate, so
+        # ties at the cut-off are settled by curriculum order as in search()
+        kk = min(k, n)
+        kth = -np.partition(-scores, kk - 1, axis=1)[:, kk - 1]
+        query_rows, doc_ids = np.nonzero((scores >= kth[:, None]) & (scores > 0))
+        best = scores[query_rows, doc_ids]
+        order = np.lexsort((doc_ids, -best, query_rows))
+        sorted_rows = query_rows[order]
+        rank = np.arange(len(order)) - np.searchsorted(sorted_rows, sorted_rows, side="left")
+        for i in order[rank < k]:
+            results[query_rows[i]].append((self.keys[doc_ids[i]], float(best[i])))
+        return results
+
+    def _search_numpy(self, terms: List[Tuple[int, int]], k: int) -> List[Tuple[str, float]]:
+        if len(terms) == 1:
+            start, length = terms[0]
+            ids = self._np_doc_ids[start:start + length]
+            contributions = self._np_contributions[start:start + length]
+        else:
+            ids = np.concatenate([self._np_doc_ids[s:s + n] for s, n in terms])
+            contributions = np.concatenate([self._np_contributions[s:s + n] for s, n in terms])
+            ids, inverse = np.unique(ids, return_inverse=True)
+            contributions = np.bincount(inverse, weights=contributions)
+        # Stable sort on -score keeps curriculum order for ties (ids are ascending)
+        order = np.argsort(-contributions, kind="stable")[:k]
+        return [(self.keys[int(ids[i])], float(contributions[i])) for i in order]
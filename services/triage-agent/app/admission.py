@@ -0,0 +1,184 @@
+"""Per-user fair-share admission control for code execution.
+
+A global cap bounds how many executions run at once. Each user has a token
+bucket limiting their submission rate, and callers that have to wait are
+queued per user and served round-robin, so one student hammering "Run"
+cannot starve the rest of the class. A full queue rejects immediately.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Hashable
+
+# Buckets are pruned once this many users have been seen
+_MAX_BUCKETS = 10000
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"code execution rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class _TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+
+class FairAdmission:
+    def __init__(self, max_concurrent: int, max_queue: int, rate: float, burst: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.rate = rate
+        self.burst = burst
+        self._active = 0
+        self._queued = 0
+        # Users with waiters, in round-robin order
+        self._waiting: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+        self._buckets: Dict[Hashable, _TokenBucket] = {}
+
+        self.admitted = 0
+        self.rejected_rate_limited = 0
+        self.rejected_queue_full = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.service_ms_ewma = 0.0
+
+    def charge(self, user_id: Hashable):
+        """Spend one of ``user_id``'s tokens; raises AdmissionRejected when rate limited."""
+        wait = self._take_token(user_id)
+        if wait > 0:
+            self.rejected_rate_limited += 1
+            raise AdmissionRejected("rate limited", wait)
+
+    @asynccontextmanager
+    async def slot(self, user_id: Hashable, charged: bool = False):
+        """Hold one execution slot for ``user_id``; raises AdmissionRejected.
+
+        With ``charged``, the caller has already spent the token with
+        ``charge()``, and it is refunded if the queue is full.
+        """
+        await self.acquire(user_id, charged)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = (time.monotonic() - start) * 1000
+            self.service_ms_ewma = elapsed if not self.service_ms_ewma else 0.8 * self.service_ms_ewma + 0.2 * elapsed
+            self.release()
+
+    async def acquire(self, user_id: Hashable, charged: bool = False):
+        immediate = self._active < self.max_concurrent and not self._queued
+        # Checked before the token is taken, so a full queue doesn't cost the user one
+        if not immediate and self._queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            if charged:
+                self._refund(user_id)
+            raise AdmissionRejected("queue full", self._estimate_wait())
+
+        if not charged:
+            self.charge(user_id)
+
+        if immediate:
+            self._active += 1
+            self._admit(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user_id, deque()).append(future)
+        self._queued += 1
+        start = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            else:
+                self._forget(user_id, future)
+            raise
+        self._admit((time.monotonic() - start) * 1000)
+
+    def release(self):
+        self._active -= 1
+        while self._active < self.max_concurrent and self._waiting:
+            user_id, waiters = next(iter(self._waiting.items()))
+            future = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                self._waiting.move_to_end(user_id)
+            else:
+                del self._waiting[user_id]
+            if future.done():
+                continue
+            self._active += 1
+            future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "users_waiting": len(self._waiting),
+            "admitted": self.admitted,
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "rejected_queue_full": self.rejected_queue_full,
+            "wait_ms_avg": round(self.wait_ms_total / self.admitted, 3) if self.admitted else 0.0,
+            "wait_ms_max": round(self.wait_ms_max, 3),
+            "service_ms_ewma": round(self.service_ms_ewma, 3),
+        }
+
+    def _admit(self, wait_ms: float):
+        self.admitted += 1
+        self.wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    def _forget(self, user_id: Hashable, future: asyncio.Future):
+        waiters = self._waiting.get(user_id)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            self._queued -= 1
+            if not waiters:
+                del self._waiting[user_id]
+
+    def _estimate_wait(self) -> float:
+        per_slot = (self.service_ms_ewma or 1000.0) / 1000
+        return per_slot * (self._queued + 1) / max(1, self.max_concurrent)
+
+    def _take_token(self, user_id: Hashable) -> float:
+        """Take one token; returns 0, or the seconds until a token is available."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= _MAX_BUCKETS:
+                self._prune(now)
+            bucket = self._buckets[user_id] = _TokenBucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+    def _refund(self, user_id: Hashable):
+        bucket = self._buckets.get(user_id)
+        if bucket is not None:
+            bucket.tokens = min(self.burst, bucket.tokens + 1)
+
+    def _prune(self, now: float):
+        # A bucket that would have refilled completely is the same as a new one
+        full_after = self.burst / self.rate
+        for user_id in [u for u, b in self._buckets.items() if now - b.updated >= full_after]:
+            del self._buckets[user_id]
@@ -0,0 +1,73 @@
+"""Tracked background work that stays ordered per key.
+
+``submit()`` starts a task that runs after every earlier task submitted under
+the same key, e.g. a conversation's user row before its assistant row, while
+tasks for different keys run concurrently. Tasks are tracked so shutdown can
+wait for them with ``drain()``.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class OrderedTasks:
+    def __init__(self, name: str):
+        self.name = name
+        self._tails: Dict[Hashable, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args: Any) -> asyncio.Task:
+        """Run ``fn(*args)`` once earlier tasks for ``key`` have finished."""
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._run(previous, fn, args), name=f"{self.name}:{key}")
+        self._tails[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._finished(key, t))
+        self.submitted += 1
+        return task
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait for every tracked task; anything still running after ``timeout`` is cancelled."""
+        while self._tasks:
+            pending = set(self._tasks)
+            done, not_done = await asyncio.wait(pending, timeout=timeout)
+            if not_done:
+                logger.warning(f"{self.name}: cancelling {len(not_done)} tasks still running at shutdown")
+                for task in not_done:
+                    task.cancel()
+                await asyncio.wait(not_done)
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._tasks),
+            "keys": len(self._tails),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    async def _run(self, previous: Optional[asyncio.Task], fn, args):
+        if previous is not None:
+            # Only ordering matters here; a failed predecessor was already logged
+            await asyncio.wait([previous])
+        try:
+            await fn(*args)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"{self.name}: background task failed: {e}")
+            return
+        self.completed += 1
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        self._tasks.discard(task)
+        if self._tails.get(key) is task:
+            del self._tails[key]
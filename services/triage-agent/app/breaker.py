@@ -0,0 +1,186 @@
+"""Circuit breakers for downstream calls.
+
+Each breaker keeps the outcomes of the last ``window`` calls. It opens when,
+after at least ``min_calls``, too many of them failed or were slow, and then
+rejects calls immediately for ``open_seconds``. After that it goes half-open
+and lets ``half_open_probes`` calls through: if they all succeed it closes,
+and any failure opens it again.
+"""
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from learnflow_common.metrics import Counter, Gauge
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "15"))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "3"))
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+_breakers: Dict[str, "CircuitBreaker"] = {}
+
+TRANSITIONS_TOTAL = Counter(
+    "learnflow_circuit_transitions_total", "Circuit breaker state changes", ("target", "state"),
+)
+REJECTED_TOTAL = Counter(
+    "learnflow_circuit_rejected_total", "Calls rejected without trying because a breaker was open", ("target",),
+)
+Gauge(
+    "learnflow_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    lambda: {(name,): _STATE_VALUES[b.current_state()] for name, b in _breakers.items()},
+    labelnames=("target",),
+)
+
+
+class CircuitOpen(Exception):
+    def __init__(self, target: str, retry_after: float):
+        super().__init__(f"{target} circuit is open")
+        self.target = target
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, slow_call_seconds: float,
+                 window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE, slow_rate: float = BREAKER_SLOW_RATE,
+                 open_seconds: float = BREAKER_OPEN_SECONDS, half_open_probes: int = BREAKER_HALF_OPEN_PROBES):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        # (failed, slow) per call, newest last
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes_inflight = 0
+        self._probes_passed = 0
+
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.opened = 0
+        _breakers[name] = self
+
+    async def call(self, fn: Callable[[], Awaitable[Any]],
+                   is_failure: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Await ``fn()`` through the breaker; raises CircuitOpen while open.
+
+        Exceptions count as failures, as do results for which ``is_failure``
+        returns True (the result is still returned).
+        """
+        probe = self._admit()
+        start = time.monotonic()
+        try:
+            result = await fn()
+        except Exception:
+            self._record(probe, True, time.monotonic() - start)
+            raise
+        except BaseException:
+            # Cancelled by the caller: says nothing about the downstream
+            if probe:
+                self._probes_inflight = max(0, self._probes_inflight - 1)
+            raise
+        self._record(probe, bool(is_failure and is_failure(result)), time.monotonic() - start)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        failed = sum(1 for f, _ in self._outcomes if f)
+        slow = sum(1 for _, s in self._outcomes if s)
+        n = len(self._outcomes)
+        return {
+            "state": self.current_state(),
+            "window_calls": n,
+            "window_error_rate": round(failed / n, 3) if n else 0.0,
+            "window_slow_rate": round(slow / n, 3) if n else 0.0,
+            "calls": self.calls,
+            "failures": self.failures,
+            "slow_calls": self.slow_calls,
+            "rejected": self.rejected,
+            "opened": self.opened,
+            "retry_after": round(self._retry_after(), 3) if self.state == OPEN else 0.0,
+        }
+
+    def current_state(self) -> str:
+        """State as callers would see it now; an expired open breaker reads as half-open."""
+        if self.state == OPEN and self._retry_after() <= 0:
+            return HALF_OPEN
+        return self.state
+
+    def _retry_after(self) -> float:
+        return self._opened_at + self.open_seconds - time.monotonic()
+
+    def _admit(self) -> bool:
+        """Let a call through, returning whether it is a half-open probe."""
+        if self.state == OPEN:
+            if self._retry_after() > 0:
+                self._reject(self._retry_after())
+            self._transition(HALF_OPEN)
+            self._probes_inflight = 0
+            self._probes_passed = 0
+        if self.state == HALF_OPEN:
+            if self._probes_inflight + self._probes_passed >= self.half_open_probes:
+                self._reject(1.0)
+            self._probes_inflight += 1
+            return True
+        return False
+
+    def _reject(self, retry_after: float):
+        self.rejected += 1
+        REJECTED_TOTAL.inc(self.name)
+        raise CircuitOpen(self.name, retry_after)
+
+    def _record(self, probe: bool, failed: bool, elapsed: float):
+        slow = elapsed >= self.slow_call_seconds
+        self.calls += 1
+        self.failures += failed
+        self.slow_calls += slow
+        if probe:
+            self._probes_inflight = max(0, self._probes_inflight - 1)
+            if self.state != HALF_OPEN:
+                return
+            if failed or slow:
+                self._trip()
+                return
+            self._probes_passed += 1
+            if self._probes_passed >= self.half_open_probes:
+                self._outcomes.clear()
+                self._transition(CLOSED)
+            return
+
+        if self.state != CLOSED:
+            return
+        self._outcomes.append((failed, slow))
+        n = len(self._outcomes)
+        if n < self.min_calls:
+            return
+        failed_n = sum(1 for f, _ in self._outcomes if f)
+        slow_n = sum(1 for _, s in self._outcomes if s)
+        if failed_n / n >= self.error_rate or slow_n / n >= self.slow_rate:
+            self._trip()
+
+    def _trip(self):
+        self._opened_at = time.monotonic()
+        self.opened += 1
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        if state != self.state:
+            self.state = state
+            TRANSITIONS_TOTAL.inc(self.name, state)
@@ -0,0 +1,169 @@
+"""Bounded in-memory caches for upstream answers.
+
+``TTLCache`` is an LRU with a per-entry TTL and a cap on total entry size.
+``get_or_load()`` coalesces concurrent misses for the same key so only one
+upstream call is in flight; the other callers wait for its result.
+
+``invalidate()`` also bumps a generation counter. A load that was in flight
+when its key was invalidated still answers its own callers, but its value is
+not stored, and callers that arrive afterwards start a fresh load.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, Type
+
+# How a get_or_load() caller got its value
+HIT = "hit"
+MISS = "miss"
+COALESCED = "coalesced"
+
+
+class TTLCache:
+    def __init__(self, max_entries: int, ttl: float, max_bytes: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # Bumped by invalidate(); a load only stores its value if neither changed
+        self._generations: Dict[Hashable, int] = {}
+        self._epoch = 0
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_loads = 0
+        self.uncacheable = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at, size = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, size: int):
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, key: Optional[Hashable] = None) -> int:
+        """Drop one key, or everything when ``key`` is None; returns entries removed.
+
+        Loads already in flight for the dropped keys won't store their values.
+        """
+        if key is None:
+            self._epoch += 1
+            self._inflight.clear()
+            count = len(self._entries)
+            self._entries.clear()
+            self.bytes = 0
+            return count
+        if key in self._inflight:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            del self._inflight[key]
+        if key in self._entries:
+            self._remove(key)
+            return 1
+        return 0
+
+    async def get_or_load(self, key: Hashable,
+                          loader: Callable[[], Awaitable[Any]],
+                          sizeof: Callable[[Any], int],
+                          cacheable: Optional[Callable[[Any], bool]] = None,
+                          unshared: Tuple[Type[Exception], ...] = ()) -> Tuple[Any, str]:
+        """Return ``(value, source)`` where source is HIT, MISS or COALESCED.
+
+        Values ``cacheable`` rejects are shared with waiting callers but not stored.
+
+        Loader errors propagate to every waiting caller and are not cached,
+        except ``unshared`` ones, which only reach the caller that ran the
+        loader. If that caller is cancelled or hits an ``unshared`` error,
+        one of the waiters runs the loader again.
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value, HIT
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            # wait() leaves the shared future alone if this caller is cancelled
+            await asyncio.wait((pending,))
+            if not pending.cancelled():
+                self.coalesced += 1
+                return pending.result(), COALESCED
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = (self._epoch, self._generations.get(key, 0))
+        try:
+            value = await loader()
+        except unshared:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure doesn't log a warning
+            future.exception()
+            raise
+        except BaseException:
+            # Cancelled: waiters retry rather than inherit the cancellation
+            future.cancel()
+            raise
+        else:
+            if generation != (self._epoch, self._generations.get(key, 0)):
+                self.stale_loads += 1
+            elif cacheable is not None and not cacheable(value):
+                self.uncacheable += 1
+            else:
+                self.set(key, value, sizeof(value))
+            future.set_result(value)
+            return value, MISS
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if key not in self._inflight:
+                self._generations.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_loads": self.stale_loads,
+            "uncacheable": self.uncacheable,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, key: Hashable):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
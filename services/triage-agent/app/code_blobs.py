@@ -0,0 +1,110 @@
+"""Content-addressed storage of code submission text.
+
+A class runs the same starter program and hits the same tracebacks thousands
+of times, so ``code``, ``stdout`` and ``stderr`` are stored once per
+distinct text in ``code_blobs``, keyed by sha256. ``code_submissions`` rows
+carry the blob ids. Postgres compresses blob text through TOAST (lz4 where
+the server has it), so it stays readable from SQL; ``code_submission_texts``
+joins it back for history reads.
+
+Each write-behind batch is one ``insert_submissions`` round trip. Hashes of
+blobs stored recently are remembered (``CODE_BLOB_KNOWN_HASHES``) and sent
+without their text.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+from app.db import STATEMENTS
+
+# code-runner truncates stdout and stderr at this many characters; stored
+# output is cut at the same point whatever the source of the result
+CODE_OUTPUT_MAX_CHARS = int(os.getenv("CODE_OUTPUT_MAX_CHARS", "10000"))
+CODE_BLOB_KNOWN_HASHES = int(os.getenv("CODE_BLOB_KNOWN_HASHES", "10000"))
+
+
+def blob_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def truncate_output(text: Optional[str]) -> str:
+    return (text or "")[:CODE_OUTPUT_MAX_CHARS]
+
+
+class CodeBlobStore:
+    """Writes submission rows ``(user_id, code, stdout, stderr, exit_code, cached, created_at)``."""
+
+    def __init__(self, known_hashes: int = CODE_BLOB_KNOWN_HASHES):
+        self.max_known = max(0, known_hashes)
+        self._known: "OrderedDict[bytes, None]" = OrderedDict()
+
+        self.rows = 0
+        self.blobs_sent = 0
+        self.blobs_skipped = 0
+        self.bytes_sent = 0
+        self.resends = 0
+
+    async def insert_submissions(self, conn: asyncpg.Connection, rows: Sequence[Tuple[Any, ...]]):
+        """Insert ``rows`` in one statement, or two if a remembered blob wasn't found."""
+        # (user_id, code hash, code, stdout hash, stdout, stderr hash, stderr, exit_code, cached, created_at)
+        prepared = []
+        for user_id, code, stdout, stderr, exit_code, cached, created_at in rows:
+            stdout, stderr = truncate_output(stdout), truncate_output(stderr)
+            prepared.append((user_id, blob_hash(code), code, blob_hash(stdout), stdout,
+                             blob_hash(stderr), stderr, exit_code, cached, created_at))
+        if await self._insert(conn, prepared, skip_known=True):
+            return
+        self.resends += 1
+        for row in prepared:
+            for hash_ in (row[1], row[3], row[5]):
+                self._known.pop(hash_, None)
+        if not await self._insert(conn, prepared, skip_known=False):
+            raise RuntimeError(f"Unresolved code blobs for {len(prepared)} submissions")
+
+    def stats(self) -> Dict[str, Any]:
+        sent = self.blobs_sent + self.blobs_skipped
+        return {
+            "rows": self.rows,
+            "blobs_sent": self.blobs_sent,
+            "blobs_skipped": self.blobs_skipped,
+            "bytes_sent": self.bytes_sent,
+            "resends": self.resends,
+            "known_hashes": len(self._known),
+            "skip_ratio": round(self.blobs_skipped / sent, 4) if sent else 0.0,
+        }
+
+    async def _insert(self, conn: asyncpg.Connection, prepared: List[Tuple[Any, ...]], skip_known: bool) -> bool:
+        texts: Dict[bytes, Optional[str]] = {}
+        for row in prepared:
+            for hash_, text in ((row[1], row[2]), (row[3], row[4]), (row[5], row[6])):
+                if hash_ not in texts:
+                    texts[hash_] = None if skip_known and hash_ in self._known else text
+        sent = [text for text in texts.values() if text is not None]
+        self.blobs_sent += len(sent)
+        self.blobs_skipped += len(texts) - len(sent)
+        self.bytes_sent += sum(len(text) for text in sent)
+
+        status = await conn.execute(
+            STATEMENTS["insert_submissions"],
+            list(texts), list(texts.values()),
+            [r[0] for r in prepared], [r[1] for r in prepared], [r[3] for r in prepared],
+            [r[5] for r in prepared], [r[7] for r in prepared], [r[8] for r in prepared],
+            [r[9] for r in prepared],
+        )
+        if int(status.rsplit(" ", 1)[-1]) != len(prepared):
+            return False
+        self.rows += len(prepared)
+        self._remember(texts)
+        return True
+
+    def _remember(self, hashes: Iterable[bytes]):
+        if not self.max_known:
+            return
+        for hash_ in hashes:
+            self._known[hash_] = None
+            self._known.move_to_end(hash_)
+        while len(self._known) > self.max_known:
+            self._known.popitem(last=False)
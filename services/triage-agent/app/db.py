@@ -0,0 +1,243 @@
+"""Postgres access for triage: a sized pool and named, prepared statements.
+
+Every query the request path runs is listed once in ``STATEMENTS``. asyncpg
+keeps a per-connection LRU of prepared statements keyed by SQL text, so a
+fixed text per name means each statement is parsed and planned once per
+connection and then only bound and executed. New connections run each
+statement once, with ``WARMUP_ARGS`` that touch no rows, before the pool
+hands them out, and ``connect()`` opens ``DB_POOL_MIN_SIZE`` connections up
+front, so the first requests after a deploy don't pay for connecting or
+planning. A statement that fails to prepare (say, against an older schema) is
+logged and skipped; only the requests that use it fail.
+
+``ping()`` is the health check; app.health runs it in the background and
+calls ``connect()`` again, with backoff, while there is no pool.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from learnflow_common.metrics import DB_POOL_ACQUIRE_SECONDS, pool_waiting, timed_acquire
+
+logger = logging.getLogger(__name__)
+
+PG_HOST = os.getenv("POSTGRES_HOST", "postgres-postgresql.postgres.svc.cluster.local")
+PG_PORT = os.getenv("POSTGRES_PORT", "5432")
+PG_USER = os.getenv("POSTGRES_USER", "postgres")
+PG_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
+PG_DATABASE = os.getenv("POSTGRES_DATABASE", "learnflow")
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Idle connections above min size are closed after this many seconds
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+# Prepared statements kept per connection; never fewer than STATEMENTS
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# Conversation ids reserved from the sequence per round trip
+DB_ID_BLOCK = int(os.getenv("DB_ID_BLOCK", "100"))
+
+# Conversation rows carry ids reserved up front, so in-memory turns match stored ones
+CONVERSATION_COLUMNS = ("id", "user_id", "agent", "message", "role", "created_at")
+# Submissions as queued; code, stdout and stderr are stored in code_blobs (app.code_blobs)
+SUBMISSION_COLUMNS = ("user_id", "code", "stdout", "stderr", "exit_code", "cached", "created_at")
+
+_HISTORY_SELECT = "SELECT id, agent, message, role, created_at FROM conversations WHERE user_id = $1"
+
+
+def insert_sql(table: str, columns: tuple) -> str:
+    placeholders = ", ".join(f"${i + 1}" for i in range(len(columns)))
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+# One round trip per batch: $1/$2 are the distinct blob hashes and their text
+# (NULL for blobs already known to be stored), $3.. the submission columns
+# with hashes in place of text. New blobs are inserted, and every hash is
+# resolved to an id, from the insert or from rows already there. Submissions
+# go in only if all their hashes resolved, so the statement writes every row
+# or none; none means a blob it assumed was stored, or one another replica
+# committed mid-statement, wasn't visible, and the caller resends with text.
+_INSERT_SUBMISSIONS = """
+WITH texts AS (
+    SELECT hash, content FROM unnest($1::bytea[], $2::text[]) AS t(hash, content)
+), added AS (
+    INSERT INTO code_blobs (hash, content)
+    SELECT hash, content FROM texts WHERE content IS NOT NULL
+    ON CONFLICT (hash) DO NOTHING
+    RETURNING id, hash
+), blob_ids AS (
+    SELECT id, hash FROM added
+    UNION ALL
+    SELECT b.id, b.hash FROM code_blobs b JOIN texts t ON t.hash = b.hash
+), resolved AS (
+    SELECT s.user_id, c.id AS code_blob, o.id AS stdout_blob, e.id AS stderr_blob,
+           s.exit_code, s.cached, s.created_at
+    FROM unnest($3::int[], $4::bytea[], $5::bytea[], $6::bytea[], $7::int[], $8::bool[], $9::timestamp[])
+        AS s(user_id, code_hash, stdout_hash, stderr_hash, exit_code, cached, created_at)
+    LEFT JOIN blob_ids c ON c.hash = s.code_hash
+    LEFT JOIN blob_ids o ON o.hash = s.stdout_hash
+    LEFT JOIN blob_ids e ON e.hash = s.stderr_hash
+)
+INSERT INTO code_submissions (user_id, code_blob, stdout_blob, stderr_blob, exit_code, cached, created_at)
+SELECT * FROM resolved
+WHERE NOT EXISTS (
+    SELECT 1 FROM resolved WHERE code_blob IS NULL OR stdout_blob IS NULL OR stderr_blob IS NULL
+)
+"""
+
+
+# History statements page on (created_at, id) through idx_conversations_user_created.
+# A NULL limit is LIMIT ALL, which the NDJSON export uses.
+STATEMENTS: Dict[str, str] = {
+    "ping": "SELECT 1",
+    "insert_conversation": insert_sql("conversations", CONVERSATION_COLUMNS),
+    "insert_submissions": _INSERT_SUBMISSIONS,
+    "reserve_conversation_ids": "SELECT nextval(pg_get_serial_sequence('conversations', 'id')) "
+                                "FROM generate_series(1, $1)",
+    "progress": "SELECT module, topic, mastery FROM progress WHERE user_id = $1 ORDER BY module, topic",
+    "history_latest": f"{_HISTORY_SELECT} ORDER BY created_at DESC, id DESC LIMIT $2",
+    "history_before": f"{_HISTORY_SELECT} AND (created_at, id) < ($2, $3) "
+                      f"ORDER BY created_at DESC, id DESC LIMIT $4",
+    "history_after": f"{_HISTORY_SELECT} AND (created_at, id) > ($2, $3) "
+                     f"ORDER BY created_at ASC, id ASC LIMIT $4",
+}
+
+
+# Arguments that run a statement without reading or writing any rows. The
+# run goes through fetch(), so the statement lands in the connection's
+# statement cache; statements not listed are only checked with prepare().
+_NO_TIME = datetime(1970, 1, 1)
+WARMUP_ARGS: Dict[str, Tuple[Any, ...]] = {
+    "ping": (),
+    "reserve_conversation_ids": (0,),
+    "insert_submissions": ([],) * 9,
+    "progress": (-1,),
+    "history_latest": (-1, 0),
+    "history_before": (-1, _NO_TIME, 0, 0),
+    "history_after": (-1, _NO_TIME, 0, 0),
+}
+
+
+async def warm_statements(conn: asyncpg.Connection, statements: Dict[str, str]) -> List[str]:
+    """Prepare each of ``statements`` on ``conn``; returns the names that failed."""
+    failed = []
+    for name, sql in statements.items():
+        try:
+            if name in WARMUP_ARGS:
+                await conn.fetch(sql, *WARMUP_ARGS[name])
+            else:
+                await conn.prepare(sql)
+        except (asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+            failed.append(name)
+            logger.error(f"Statement {name} failed to prepare, skipping: {e}")
+    return failed
+
+
+class Database:
+    """The triage connection pool and its named statements.
+
+    ``pool`` is None until ``connect()`` succeeds, so callers keep checking
+    it the way they checked a bare pool.
+    """
+
+    def __init__(self, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 statement_cache_size: int = DB_STATEMENT_CACHE_SIZE,
+                 max_inactive_lifetime: float = DB_POOL_MAX_INACTIVE_LIFETIME):
+        self.max_size = max(1, max_size)
+        self.min_size = max(0, min(min_size, self.max_size))
+        self.statement_cache_size = max(statement_cache_size, len(STATEMENTS))
+        self.max_inactive_lifetime = max_inactive_lifetime
+        self.pool: Optional[asyncpg.Pool] = None
+
+        self.connect_ms = 0.0
+        self.connects = 0
+        # Statements the last new connection couldn't prepare
+        self.failed_statements: List[str] = []
+
+    async def connect(self):
+        """Open the pool with ``min_size`` connections, each with its statements warmed."""
+        start = time.perf_counter()
+        self.pool = await asyncpg.create_pool(
+            host=PG_HOST, port=int(PG_PORT), user=PG_USER,
+            password=PG_PASSWORD, database=PG_DATABASE,
+            min_size=self.min_size, max_size=self.max_size,
+            max_inactive_connection_lifetime=self.max_inactive_lifetime,
+            statement_cache_size=self.statement_cache_size,
+            timeout=DB_CONNECT_TIMEOUT,
+            init=self._init_connection,
+        )
+        self.connect_ms = (time.perf_counter() - start) * 1000
+        self.connects += 1
+        prepared = len(STATEMENTS) - len(self.failed_statements)
+        logger.info(f"Database pool created: {self.min_size} warm connections (max {self.max_size}), "
+                    f"{prepared}/{len(STATEMENTS)} statements prepared in {self.connect_ms:.0f}ms")
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+    def acquire(self):
+        return timed_acquire(self.pool)
+
+    async def fetch(self, name: str, *args: Any) -> List[asyncpg.Record]:
+        async with timed_acquire(self.pool) as conn:
+            return await conn.fetch(STATEMENTS[name], *args)
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self.pool
+        size = pool.get_size() if pool is not None else 0
+        idle = pool.get_idle_size() if pool is not None else 0
+        acquires = DB_POOL_ACQUIRE_SECONDS.count()
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "size": size,
+            "in_use": size - idle,
+            "waiting": pool_waiting(),
+            "acquires": acquires,
+            "statements": len(STATEMENTS),
+            "failed_statements": self.failed_statements,
+            "statement_cache_size": self.statement_cache_size,
+            "connect_ms": round(self.connect_ms, 1),
+            "connects": self.connects,
+        }
+
+    async def _init_connection(self, conn: asyncpg.Connection):
+        self.failed_statements = await warm_statements(conn, STATEMENTS)
+
+    async def ping(self):
+        """Run the ping statement on a pooled connection."""
+        async with timed_acquire(self.pool) as conn:
+            await conn.fetchval(STATEMENTS["ping"])
+
+
+class ReservedIds:
+    """Row ids taken from a sequence ``block`` at a time.
+
+    Ids are unique but, across replicas, not in insertion order; history
+    orders on (created_at, id), so that only matters for ties.
+    """
+
+    def __init__(self, db: Database, statement: str, block: int = DB_ID_BLOCK):
+        self.db = db
+        self.statement = statement
+        self.block = max(1, block)
+        self._ids: Deque[int] = deque()
+        self._lock = asyncio.Lock()
+        self.reservations = 0
+
+    async def next(self) -> int:
+        if not self._ids:
+            async with self._lock:
+                # Another caller may have refilled while we waited
+                if not self._ids:
+                    rows = await self.db.fetch(self.statement, self.block)
+                    self._ids.extend(row[0] for row in rows)
+                    self.reservations += 1
+        return self._ids.popleft()
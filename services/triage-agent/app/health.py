@@ -0,0 +1,204 @@
+"""Background health checks for triage's dependencies.
+
+Each dependency has a probe that a background task runs every
+``HEALTH_INTERVAL`` seconds. It is marked down after
+``HEALTH_FAILURE_THRESHOLD`` consecutive failures, and back up after one
+success. While down it is probed with exponential backoff, from
+``HEALTH_BACKOFF_BASE`` up to ``HEALTH_BACKOFF_MAX`` seconds, so a dead
+dependency isn't hammered. The snapshot lives in memory: request handlers
+and ``/ready`` read it without any I/O, and ``require()`` lets a handler
+fail fast instead of waiting out a timeout.
+"""
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from learnflow_common.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+HEALTH_INTERVAL = float(os.getenv("HEALTH_INTERVAL", "5"))
+HEALTH_TIMEOUT = float(os.getenv("HEALTH_TIMEOUT", "2"))
+HEALTH_FAILURE_THRESHOLD = int(os.getenv("HEALTH_FAILURE_THRESHOLD", "2"))
+HEALTH_BACKOFF_BASE = float(os.getenv("HEALTH_BACKOFF_BASE", "1"))
+HEALTH_BACKOFF_MAX = float(os.getenv("HEALTH_BACKOFF_MAX", "30"))
+
+UNKNOWN = "unknown"
+UP = "up"
+DOWN = "down"
+
+_monitors: List["HealthMonitor"] = []
+
+CHECKS_TOTAL = Counter(
+    "learnflow_dependency_checks_total", "Background dependency health checks", ("dependency", "outcome"),
+)
+Gauge(
+    "learnflow_dependency_up", "Dependency health from background checks (1 up, 0 down)",
+    lambda: {
+        (dep.name,): 1.0 if dep.state == UP else 0.0
+        for monitor in _monitors for dep in monitor.dependencies.values() if dep.state != UNKNOWN
+    },
+    labelnames=("dependency",),
+)
+
+
+class DependencyDown(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is down")
+        self.name = name
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class Dependency:
+    __slots__ = ("name", "probe", "timeout", "state", "since", "checked_at", "next_check_at",
+                 "latency_ms", "last_error", "consecutive_failures", "checks", "failures")
+
+    def __init__(self, name: str, probe: Callable[[], Awaitable[Any]], timeout: float):
+        self.name = name
+        self.probe = probe
+        self.timeout = timeout
+        self.state = UNKNOWN
+        self.since = time.time()
+        self.checked_at: Optional[float] = None
+        self.next_check_at: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        self.checks = 0
+        self.failures = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "since": self.since,
+            "checked_at": self.checked_at,
+            "latency_ms": self.latency_ms,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
+
+
+class HealthMonitor:
+    """Probes registered dependencies in the background and keeps their state."""
+
+    def __init__(self, interval: float = HEALTH_INTERVAL, timeout: float = HEALTH_TIMEOUT,
+                 failure_threshold: int = HEALTH_FAILURE_THRESHOLD,
+                 backoff_base: float = HEALTH_BACKOFF_BASE, backoff_max: float = HEALTH_BACKOFF_MAX):
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = max(1, failure_threshold)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dependencies: Dict[str, Dependency] = {}
+        self._tasks: List[asyncio.Task] = []
+        _monitors.append(self)
+
+    def add(self, name: str, probe: Callable[[], Awaitable[Any]], timeout: Optional[float] = None):
+        """Register ``probe``, which raises when ``name`` is unhealthy.
+
+        Each run is bounded by ``timeout``, or the monitor's timeout if not given.
+        """
+        self.dependencies[name] = Dependency(name, probe, timeout or self.timeout)
+
+    def start(self):
+        if self._tasks:
+            return
+        for dep in self.dependencies.values():
+            self._tasks.append(asyncio.create_task(self._run(dep), name=f"health-{dep.name}"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def is_down(self, name: str) -> bool:
+        dep = self.dependencies.get(name)
+        return dep is not None and dep.state == DOWN
+
+    def require(self, *names: str):
+        """Raise DependencyDown for the first of ``names`` that is down.
+
+        A dependency that hasn't been checked yet counts as available.
+        """
+        for name in names:
+            dep = self.dependencies.get(name)
+            if dep is not None and dep.state == DOWN:
+                retry_after = (dep.next_check_at - time.time()) if dep.next_check_at else self.interval
+                raise DependencyDown(name, max(0.0, retry_after))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dep.to_dict() for name, dep in self.dependencies.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {**dep.to_dict(), "checks": dep.checks, "failures": dep.failures,
+                   "next_check_at": dep.next_check_at}
+            for name, dep in self.dependencies.items()
+        }
+
+    async def check(self, name: str) -> bool:
+        """Probe ``name`` once and update its state; returns whether it passed."""
+        dep = self.dependencies[name]
+        dep.checks += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(dep.probe(), dep.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            dep.checked_at = time.time()
+            dep.failures += 1
+            dep.consecutive_failures += 1
+            dep.last_error = str(e) or type(e).__name__
+            CHECKS_TOTAL.inc(name, "failure")
+            if dep.state != DOWN:
+                logger.warning(f"{name} health check failed: {dep.last_error}")
+                if dep.consecutive_failures >= self.failure_threshold:
+                    self._transition(dep, DOWN)
+            return False
+        dep.checked_at = time.time()
+        dep.latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        dep.consecutive_failures = 0
+        dep.last_error = None
+        CHECKS_TOTAL.inc(name, "success")
+        if dep.state != UP:
+            self._transition(dep, UP)
+        return True
+
+    def _transition(self, dep: Dependency, state: str):
+        if state == DOWN:
+            logger.error(f"{dep.name} is down after {dep.consecutive_failures} failed checks: {dep.last_error}")
+        elif dep.state == DOWN:
+            logger.info(f"{dep.name} is back up")
+        dep.state = state
+        dep.since = time.time()
+
+    def _delay(self, dep: Dependency) -> float:
+        if dep.consecutive_failures == 0:
+            return self.interval
+        if dep.state != DOWN:
+            # Failing but not yet down: confirm quickly
+            return min(self.interval, self.backoff_base)
+        exponent = dep.consecutive_failures - self.failure_threshold
+        delay = min(self.backoff_max, self.backoff_base * 2 ** min(exponent, 30))
+        # Jitter so replicas don't probe a recovering dependency in lockstep
+        return delay * random.uniform(0.8, 1.0)
+
+    async def _run(self, dep: Dependency):
+        # Dependencies checked during startup wait for their next turn
+        if dep.checked_at is None:
+            await self.check(dep.name)
+        while True:
+            delay = self._delay(dep)
+            dep.next_check_at = time.time() + delay
+            await asyncio.sleep(delay)
+            await self.check(dep.name)
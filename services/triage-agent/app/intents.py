@@ -0,0 +1,71 @@
+"""Keyword-based intent classification.
+
+``classify_intent()`` is what ``/chat`` routes on. ``IntentClassifier`` is
+the same rule with its keyword sets as parameters, so a candidate set can be
+scored side by side with the live one (see ``app.replay``).
+"""
+from typing import Dict, Iterable, List
+
+from app.keyword_matcher import KeywordMatcher
+
+CONCEPT_KEYWORDS = [
+    "explain", "what is", "what are", "how does", "how do", "why",
+    "define", "describe", "tell me about", "teach", "learn",
+    "difference between", "example", "concept", "meaning",
+    "tutorial", "help me understand", "for loop", "while loop",
+    "variable", "function", "class", "list", "dictionary", "string",
+    "integer", "boolean", "tuple", "set", "module", "import",
+]
+
+CODE_KEYWORDS = [
+    "run", "execute", "code", "error", "bug", "fix", "debug",
+    "traceback", "exception", "syntax", "indent", "output",
+    "print", "compile", "test this", "try this",
+]
+
+INTENTS = ("concept", "code")
+
+
+class IntentClassifier:
+    def __init__(self, concept_keywords: Iterable[str], code_keywords: Iterable[str]):
+        # Messages are lowercased before matching, so keywords are too
+        self.keywords: Dict[str, List[str]] = {
+            "concept": [kw.lower() for kw in concept_keywords],
+            "code": [kw.lower() for kw in code_keywords],
+        }
+        self._matcher = KeywordMatcher(self.keywords)
+
+    def classify(self, message: str) -> str:
+        """Classify student intent from message."""
+        msg_lower = message.lower()
+
+        scores = self._matcher.scores(msg_lower)
+        concept_score = scores["concept"]
+        code_score = scores["code"]
+
+        # Check if message contains code block
+        if "```" in message or msg_lower.startswith("def ") or msg_lower.startswith("for "):
+            code_score += 3
+
+        if code_score > concept_score:
+            return "code"
+        return "concept"
+
+    def classify_many(self, messages: Iterable[str]) -> List[str]:
+        """``classify()`` each message; repeated messages are classified once."""
+        seen: Dict[str, str] = {}
+        intents = []
+        for message in messages:
+            intent = seen.get(message)
+            if intent is None:
+                intent = seen[message] = self.classify(message)
+            intents.append(intent)
+        return intents
+
+
+DEFAULT_CLASSIFIER = IntentClassifier(CONCEPT_KEYWORDS, CODE_KEYWORDS)
+
+
+def classify_intent(message: str) -> str:
+    """Classify student intent from message with the live keyword sets."""
+    return DEFAULT_CLASSIFIER.classify(message)
@@ -0,0 +1,72 @@
+"""Precompiled multi-keyword matcher.
+
+All keywords are folded into one trie-shaped regular expression wrapped in a
+lookahead, so a single scan of the message finds every keyword occurrence,
+including overlapping ones. Matching cost grows with message length and
+keyword depth, not with the number of keywords.
+"""
+import re
+from typing import Dict, Iterable, List, Set
+
+
+def _trie_pattern(node: Dict[str, dict]) -> str:
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        # Greedy optional: prefer the longest keyword starting at this position
+        body = "(?:" + body + ")?"
+    return body
+
+
+class KeywordMatcher:
+    """Finds which keywords of several named groups occur in a text.
+
+    ``scores(text)[group]`` equals ``sum(1 for kw in keywords if kw in text)``
+    for each group, computed in one pass.
+    """
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        self.groups: Dict[str, List[str]] = {name: list(kws) for name, kws in groups.items()}
+        keywords = {kw for kws in self.groups.values() for kw in kws}
+
+        self._groups_of: Dict[str, List[str]] = {}
+        for name, kws in self.groups.items():
+            for kw in kws:
+                self._groups_of.setdefault(kw, []).append(name)
+
+        trie: Dict[str, dict] = {}
+        for kw in keywords:
+            node = trie
+            for ch in kw:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+
+        # The regex reports only the longest keyword at each position; every
+        # shorter keyword starting there is one of its prefixes.
+        self._prefixes: Dict[str, List[str]] = {
+            kw: [p for p in keywords if kw.startswith(p)] for kw in keywords
+        }
+        self._regex = re.compile("(?=(" + _trie_pattern(trie) + "))", re.DOTALL) if keywords else None
+
+    def matches(self, text: str) -> Set[str]:
+        """Return the set of distinct keywords that occur in ``text``."""
+        found: Set[str] = set()
+        if self._regex is None:
+            return found
+        seen: Set[str] = set()
+        for m in self._regex.finditer(text):
+            longest = m.group(1)
+            if longest not in seen:
+                seen.add(longest)
+                found.update(self._prefixes[longest])
+        return found
+
+    def scores(self, text: str) -> Dict[str, int]:
+        """Return the number of distinct keywords found per group."""
+        counts = {name: 0 for name in self.groups}
+        for kw in self.matches(text):
+            for name in self._groups_of[kw]:
+                counts[name] += 1
+        return counts
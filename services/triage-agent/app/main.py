@@ -1,11 +1,38 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import httpx
 import os
+import re
+import json
+import base64
+import hashlib
 import logging
-import asyncpg
-from typing import Dict, Any, Optional, List
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Set, Tuple
+
+from learnflow_common.dapr_client import DaprClient
+from learnflow_common.metrics import (
+    CONTENT_TYPE, REGISTRY, STAGE_SECONDS, Counter, Gauge,
+    RequestMetricsMiddleware, register_pool_gauges,
+)
+from learnflow_common.publisher import EventPublisher
+from learnflow_common.responses import Rendered, json_response, render
+
+from app.admission import AdmissionRejected, FairAdmission
+from app.background import OrderedTasks
+from app.breaker import CircuitBreaker, CircuitOpen
+from app.cache import MISS, TTLCache
+from app.code_blobs import CodeBlobStore
+from app.db import CONVERSATION_COLUMNS, DB_CONNECT_TIMEOUT, STATEMENTS, SUBMISSION_COLUMNS, Database, ReservedIds
+from app.health import HEALTH_TIMEOUT, DependencyDown, HealthMonitor
+from app.intents import classify_intent
+from app.keyword_matcher import KeywordMatcher
+from app.recent_turns import RECENT_TURNS_ENABLED, RecentTurns, Turn
+from app.replay import REPLAY_SAMPLES, ReplayReport, candidate_classifier, replay
+from app.write_behind import WriteBehindBuffer, utcnow
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,23 +45,166 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 # Config
 DAPR_HTTP_PORT = os.getenv("DAPR_HTTP_PORT", "3500")
 DAPR_URL = f"http://localhost:{DAPR_HTTP_PORT}"
 PUBSUB_NAME = "kafka-pubsub"
+# Per-pod consumer group, so every replica sees every cache-invalidation event
+BROADCAST_PUBSUB_NAME = os.getenv("BROADCAST_PUBSUB_NAME", "kafka-broadcast")
 STATE_STORE = "postgres-statestore"
 
 CONCEPTS_SERVICE = "concepts-agent"
 CODE_RUNNER_SERVICE = "code-runner"
+# Health monitor names for the other dependencies
+POSTGRES = "postgres"
+DAPR_SIDECAR = "dapr"
+
+CONCEPTS_TIMEOUT = float(os.getenv("CONCEPTS_TIMEOUT", "10"))
+CODE_RUNNER_TIMEOUT = float(os.getenv("CODE_RUNNER_TIMEOUT", "15"))
+PUBLISH_TIMEOUT = float(os.getenv("PUBLISH_TIMEOUT", "5"))
+
+# Past this, /chat answers a concept question locally while the upstream call finishes
+CONCEPT_LATENCY_BUDGET = float(os.getenv("CONCEPT_LATENCY_BUDGET", "2.5"))
+
+CONCEPT_CACHE_ENABLED = os.getenv("CONCEPT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CONCEPT_CACHE_MAX_ENTRIES = int(os.getenv("CONCEPT_CACHE_MAX_ENTRIES", "1024"))
+CONCEPT_CACHE_TTL = float(os.getenv("CONCEPT_CACHE_TTL", "300"))
+CONCEPT_CACHE_MAX_BYTES = int(os.getenv("CONCEPT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+CODE_EXEC_TIMEOUT = 5
+CODE_CACHE_ENABLED = os.getenv("CODE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+CODE_CACHE_MAX_ENTRIES = int(os.getenv("CODE_CACHE_MAX_ENTRIES", "4096"))
+CODE_CACHE_TTL = float(os.getenv("CODE_CACHE_TTL", "3600"))
+CODE_CACHE_MAX_BYTES = int(os.getenv("CODE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Runs slower than this fraction of their timeout may have been cut short or
+# slowed by load, so their results are not reused
+CODE_CACHE_MAX_TIME_RATIO = float(os.getenv("CODE_CACHE_MAX_TIME_RATIO", "0.5"))
+
+PROGRESS_CACHE_TTL = float(os.getenv("PROGRESS_CACHE_TTL", "60"))
+PROGRESS_CACHE_MAX_ENTRIES = int(os.getenv("PROGRESS_CACHE_MAX_ENTRIES", "10000"))
+PROGRESS_CACHE_MAX_BYTES = int(os.getenv("PROGRESS_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+CODE_MAX_CONCURRENT = int(os.getenv("CODE_MAX_CONCURRENT", "8"))
+CODE_MAX_QUEUE = int(os.getenv("CODE_MAX_QUEUE", "64"))
+CODE_USER_RATE = float(os.getenv("CODE_USER_RATE", "0.5"))
+CODE_USER_BURST = float(os.getenv("CODE_USER_BURST", "5"))
+
+CHAT_DRAIN_TIMEOUT = float(os.getenv("CHAT_DRAIN_TIMEOUT", "10"))
+
+CLASSIFY_BATCH_MAX_MESSAGES = int(os.getenv("CLASSIFY_BATCH_MAX_MESSAGES", "10000"))
+CLASSIFY_MAX_SAMPLES = 1000
+# Rows one /classify/batch replay may scan; full-history replays go through
+# `python -m app.replay`, which doesn't hold a serving pool connection
+CLASSIFY_REPLAY_MAX_ROWS = int(os.getenv("CLASSIFY_REPLAY_MAX_ROWS", "200000"))
+
+db = Database()
+
+dapr = DaprClient(
+    DAPR_URL, PUBSUB_NAME,
+    route_timeouts={
+        "concepts": CONCEPTS_TIMEOUT,
+        "code-runner": CODE_RUNNER_TIMEOUT,
+        "publish": PUBLISH_TIMEOUT,
+    },
+)
+
+publisher = EventPublisher(dapr)
+replay_lock = asyncio.Lock()
+
+concept_cache = TTLCache(CONCEPT_CACHE_MAX_ENTRIES, CONCEPT_CACHE_TTL, CONCEPT_CACHE_MAX_BYTES)
+code_cache = TTLCache(CODE_CACHE_MAX_ENTRIES, CODE_CACHE_TTL, CODE_CACHE_MAX_BYTES)
+progress_cache = TTLCache(PROGRESS_CACHE_MAX_ENTRIES, PROGRESS_CACHE_TTL, PROGRESS_CACHE_MAX_BYTES)
+code_admission = FairAdmission(CODE_MAX_CONCURRENT, CODE_MAX_QUEUE, CODE_USER_RATE, CODE_USER_BURST)
+
+# Calls over the concept budget, or well past the execution timeout, count as slow
+concepts_breaker = CircuitBreaker(CONCEPTS_SERVICE, slow_call_seconds=CONCEPT_LATENCY_BUDGET or CONCEPTS_TIMEOUT)
+code_breaker = CircuitBreaker(CODE_RUNNER_SERVICE, slow_call_seconds=CODE_EXEC_TIMEOUT + 2)
+
+# Conversation and submission rows are written behind the request in batches
+conversation_ids = ReservedIds(db, "reserve_conversation_ids")
+# Newest turns per student, written through as they are queued for storage
+recent_turns = RecentTurns()
+
+
+def _forget_dropped_turns(rows: List[Tuple[Any, ...]]):
+    # The ring must not serve turns that never reached the database
+    for user_id in {row[1] for row in rows}:
+        recent_turns.invalidate(user_id)
+
+
+conversation_writer = WriteBehindBuffer("conversations", CONVERSATION_COLUMNS, lambda: db.pool,
+                                        on_drop=_forget_dropped_turns)
+# Submission text goes to code_blobs, one upsert round trip per batch
+code_blobs = CodeBlobStore()
+submission_writer = WriteBehindBuffer("code_submissions", SUBMISSION_COLUMNS, lambda: db.pool,
+                                      writer=code_blobs.insert_submissions)
+
+# Per-conversation persistence and publishing that the response doesn't wait for
+chat_tasks = OrderedTasks("chat-persist")
+
+
+# --- Dependency health ---
+
+async def _probe_postgres():
+    # Without a pool (database unreachable so far) each check is a reconnect attempt
+    if db.pool is None:
+        await db.connect()
+    else:
+        await asyncio.wait_for(db.ping(), HEALTH_TIMEOUT)
+
 
-PG_HOST = os.getenv("POSTGRES_HOST", "postgres-postgresql.postgres.svc.cluster.local")
-PG_PORT = os.getenv("POSTGRES_PORT", "5432")
-PG_USER = os.getenv("POSTGRES_USER", "postgres")
-PG_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
-PG_DATABASE = os.getenv("POSTGRES_DATABASE", "learnflow")
+async def _probe_dapr():
+    (await dapr.healthz(HEALTH_TIMEOUT)).raise_for_status()
+
+
+def _probe_service(app_id: str):
+    async def probe():
+        (await dapr.invoke_get(app_id, "health", HEALTH_TIMEOUT)).raise_for_status()
+    return probe
+
+
+health_monitor = HealthMonitor()
+health_monitor.add(POSTGRES, _probe_postgres, timeout=DB_CONNECT_TIMEOUT + HEALTH_TIMEOUT)
+health_monitor.add(DAPR_SIDECAR, _probe_dapr)
+health_monitor.add(CONCEPTS_SERVICE, _probe_service(CONCEPTS_SERVICE))
+health_monitor.add(CODE_RUNNER_SERVICE, _probe_service(CODE_RUNNER_SERVICE))
+
+# --- Metrics ---
+
+INTENTS_TOTAL = Counter("learnflow_intents_total", "Classified chat intents", ("intent",))
+FALLBACKS_TOTAL = Counter(
+    "learnflow_fallbacks_total", "Chat replies produced by triage instead of a specialist",
+    ("intent", "reason"),
+)
+HTTP_STATUS_ERRORS_TOTAL = Counter(
+    "learnflow_downstream_status_errors_total", "Error statuses returned by downstream services",
+    ("target", "status"),
+)
+Gauge(
+    "learnflow_queue_depth", "Items waiting in background queues",
+    lambda: {
+        ("conversations",): conversation_writer.stats()["pending"],
+        ("code_submissions",): submission_writer.stats()["pending"],
+        ("publisher",): publisher.stats()["queue_depth"],
+        ("code_admission",): code_admission.stats()["queued"],
+        ("chat_persist",): chat_tasks.stats()["pending"],
+    },
+    labelnames=("queue",),
+)
+Gauge("learnflow_code_executions_active", "Code executions holding an admission slot",
+      lambda: code_admission.stats()["active"])
+register_pool_gauges(lambda: db.pool)
+
+
+def _count_status_error(target: str, e: httpx.HTTPStatusError):
+    HTTP_STATUS_ERRORS_TOTAL.inc(target, str(e.response.status_code))
+
+
+def _server_error(resp: httpx.Response) -> bool:
+    return resp.status_code >= 500
 
-db_pool: Optional[asyncpg.Pool] = None
 
 # --- Models ---
 
@@ -51,59 +221,188 @@ class CodeRequest(BaseModel):
     code: str
     user_id: int = 1
 
-# --- Intent Classification ---
+class ClassifyBatchRequest(BaseModel):
+    # Candidate keyword sets; a group left out keeps the live keywords
+    concept_keywords: Optional[List[str]] = None
+    code_keywords: Optional[List[str]] = None
+    # Classify these instead of stored user messages
+    messages: Optional[List[str]] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    user_id: Optional[int] = None
+    limit: Optional[int] = None
+    samples: int = REPLAY_SAMPLES
+
+# --- Concept answers ---
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_question(message: str) -> str:
+    """Cache key for a concept question: lowercased words, punctuation dropped."""
+    return " ".join(_WORD_RE.findall(message.lower()))
+
+
+async def fetch_concept(message: str, user_id: int) -> Dict[str, str]:
+    """Get a concepts-agent answer, served from cache when possible."""
+    async def load() -> Dict[str, str]:
+        health_monitor.require(DAPR_SIDECAR, CONCEPTS_SERVICE)
+        resp = await concepts_breaker.call(
+            lambda: dapr.invoke(
+                CONCEPTS_SERVICE, "explain",
+                # The answer may arrive after the student got a fallback, so
+                # triage publishes learning.response once it is served
+                {"question": message, "user_id": user_id, "publish_learning": False},
+                route="concepts",
+            ),
+            is_failure=_server_error,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        return {
+            "explanation": data.get("explanation", "I can help with that concept."),
+            "topic": data.get("topic", ""),
+            "module": data.get("module", ""),
+        }
+
+    if not CONCEPT_CACHE_ENABLED:
+        return await load()
+
+    answer, _ = await concept_cache.get_or_load(
+        normalize_question(message), load,
+        sizeof=lambda a: len(a["explanation"].encode("utf-8")),
+    )
+    return answer
+
+
+def _publish_answered(user_id: int, answer: Dict[str, str]):
+    # One learning.response per answer the student sees, whether it came
+    # from the cache, a shared load or its own call
+    if answer["module"]:
+        publisher.publish(
+            "learning.response",
+            {"user_id": user_id, "topic": answer["topic"], "module": answer["module"]}
+        )
+
+
+# Concept calls that outlived their budget; they finish to fill the cache
+_late_concepts: Set[asyncio.Task] = set()
+
+
+def _late_concept_done(task: asyncio.Task):
+    _late_concepts.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Concept call finished after its budget with an error: {task.exception()}")
+
+
+async def fetch_concept_within_budget(message: str, user_id: int) -> Optional[Dict[str, str]]:
+    """fetch_concept() bounded by CONCEPT_LATENCY_BUDGET; None if the budget ran out.
+
+    The upstream call is not cancelled when the budget runs out, so a slow
+    answer still lands in the concept cache for the next student. Only an
+    answer returned in time publishes ``learning.response``.
+    """
+    if CONCEPT_LATENCY_BUDGET <= 0:
+        answer = await fetch_concept(message, user_id)
+        _publish_answered(user_id, answer)
+        return answer
+    task = asyncio.ensure_future(fetch_concept(message, user_id))
+    try:
+        done, _ = await asyncio.wait({task}, timeout=CONCEPT_LATENCY_BUDGET)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if done:
+        answer = task.result()
+        _publish_answered(user_id, answer)
+        return answer
+    _late_concepts.add(task)
+    task.add_done_callback(_late_concept_done)
+    return None
 
-CONCEPT_KEYWORDS = [
-    "explain", "what is", "what are", "how does", "how do", "why",
-    "define", "describe", "tell me about", "teach", "learn",
-    "difference between", "example", "concept", "meaning",
-    "tutorial", "help me understand", "for loop", "while loop",
-    "variable", "function", "class", "list", "dictionary", "string",
-    "integer", "boolean", "tuple", "set", "module", "import",
-]
 
-CODE_KEYWORDS = [
-    "run", "execute", "code", "error", "bug", "fix", "debug",
-    "traceback", "exception", "syntax", "indent", "output",
-    "print", "compile", "test this", "try this",
-]
+# --- Code execution ---
 
+def code_cache_key(code: str, language: str, timeout: int) -> str:
+    """Content address of a submission; CRLF and LF line endings hash the same."""
+    normalized = code.replace("\r\n", "\n").replace("\r", "\n")
+    return hashlib.sha256(f"{language}\0{timeout}\0{normalized}".encode("utf-8")).hexdigest()
 
-def classify_intent(message: str) -> str:
-    """Classify student intent from message."""
-    msg_lower = message.lower()
 
-    concept_score = sum(1 for kw in CONCEPT_KEYWORDS if kw in msg_lower)
-    code_score = sum(1 for kw in CODE_KEYWORDS if kw in msg_lower)
+def _clean_run(result: Dict[str, Any], timeout: int) -> bool:
+    try:
+        return result.get("exit_code") == 0 and float(result["execution_time"]) < timeout * CODE_CACHE_MAX_TIME_RATIO
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+async def execute_code(code: str, user_id: int, language: str = "python",
+                       timeout: int = CODE_EXEC_TIMEOUT) -> Tuple[Dict[str, Any], bool]:
+    """Run code on code-runner; returns (result, cached).
+
+    Executions go through per-user fair-share admission and raise
+    AdmissionRejected when the user is over their rate or the queue is full.
+    With CODE_CACHE_ENABLED, identical submissions reuse a stored result and
+    concurrent ones share a single execution. Only clean runs are stored:
+    exit code 0, well inside the timeout.
+    """
+    # Every caller spends its own token, including cache hits and callers
+    # sharing another's execution; only the execution itself takes a slot
+    code_admission.charge(user_id)
+
+    async def load() -> Dict[str, Any]:
+        health_monitor.require(DAPR_SIDECAR, CODE_RUNNER_SERVICE)
+        async with code_admission.slot(user_id, charged=True):
+            resp = await code_breaker.call(
+                lambda: dapr.invoke(
+                    CODE_RUNNER_SERVICE, "execute",
+                    {"code": code, "language": language, "timeout": timeout},
+                    route="code-runner",
+                ),
+                is_failure=_server_error,
+            )
+        resp.raise_for_status()
+        return resp.json()
 
-    # Check if message contains code block
-    if "```" in message or msg_lower.startswith("def ") or msg_lower.startswith("for "):
-        code_score += 3
+    if not CODE_CACHE_ENABLED:
+        return await load(), False
 
-    if code_score > concept_score:
-        return "code"
-    return "concept"
+    result, source = await code_cache.get_or_load(
+        code_cache_key(code, language, timeout), load,
+        sizeof=lambda r: len(str(r.get("stdout", ""))) + len(str(r.get("stderr", ""))) + 64,
+        cacheable=lambda r: _clean_run(r, timeout),
+        # A full admission queue rejects the caller that ran the load, whose
+        # token is refunded; waiters queue for a slot of their own instead
+        unshared=(AdmissionRejected,),
+    )
+    return result, source != MISS
 
 
 # --- Lifecycle ---
 
 @app.on_event("startup")
 async def startup():
-    global db_pool
-    try:
-        db_pool = await asyncpg.create_pool(
-            host=PG_HOST, port=int(PG_PORT), user=PG_USER,
-            password=PG_PASSWORD, database=PG_DATABASE,
-            min_size=1, max_size=5
-        )
-        logger.info("Database pool created")
-    except Exception as e:
-        logger.error(f"DB connection failed: {e}")
+    await dapr.start()
+    publisher.start()
+    # Connect before serving if we can; otherwise the monitor keeps retrying with backoff
+    if not await health_monitor.check(POSTGRES):
+        logger.error("DB connection failed; retrying in the background")
+    health_monitor.start()
+    conversation_writer.start()
+    submission_writer.start()
 
 @app.on_event("shutdown")
 async def shutdown():
-    if db_pool:
-        await db_pool.close()
+    await health_monitor.stop()
+    await chat_tasks.drain(CHAT_DRAIN_TIMEOUT)
+    await conversation_writer.stop()
+    await submission_writer.stop()
+    for task in list(_late_concepts):
+        task.cancel()
+    await asyncio.gather(*_late_concepts, return_exceptions=True)
+    await publisher.stop()
+    await dapr.close()
+    await db.close()
 
 
 # --- Endpoints ---
@@ -114,159 +413,460 @@ async def health():
 
 @app.get("/ready")
 async def readiness():
-    checks = {"api": "ok", "database": "unknown"}
-    try:
-        if db_pool:
-            async with db_pool.acquire() as conn:
-                await conn.fetchval("SELECT 1")
-            checks["database"] = "ok"
-    except Exception as e:
-        checks["database"] = f"error: {str(e)}"
-    return checks
+    """Answered from the background health checks; probes never do I/O."""
+    snapshot = health_monitor.snapshot()
+    postgres = snapshot[POSTGRES]
+    if postgres["state"] == "up":
+        database = "ok"
+    elif postgres["last_error"]:
+        database = f"error: {postgres['last_error']}"
+    else:
+        database = "unknown"
+    return {"api": "ok", "database": database, "dependencies": snapshot}
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
-    """Main chat endpoint - classifies intent and routes to specialist."""
-    intent = classify_intent(req.message)
-    logger.info(f"User {req.user_id}: intent={intent}, message={req.message[:50]}...")
+def _database_available():
+    if not db.pool or health_monitor.is_down(POSTGRES):
+        raise HTTPException(status_code=503, detail="Database unavailable")
 
-    # Store user message in DB
-    if db_pool:
-        try:
-            async with db_pool.acquire() as conn:
-                await conn.execute(
-                    "INSERT INTO conversations (user_id, agent, message, role) VALUES ($1, $2, $3, $4)",
-                    req.user_id, "triage", req.message, "user"
-                )
-        except Exception as e:
-            logger.error(f"Failed to store message: {e}")
-
-    # Route to specialist via Dapr service invocation
+
+@app.get("/stats")
+async def stats():
+    """In-process counters for background components."""
+    return {
+        "database": db.stats(),
+        "health": health_monitor.stats(),
+        "write_behind": {
+            "conversations": conversation_writer.stats(),
+            "code_submissions": submission_writer.stats(),
+        },
+        "code_blobs": code_blobs.stats(),
+        "publisher": publisher.stats(),
+        "chat_tasks": chat_tasks.stats(),
+        "code_admission": code_admission.stats(),
+        "breakers": {
+            CONCEPTS_SERVICE: concepts_breaker.stats(),
+            CODE_RUNNER_SERVICE: code_breaker.stats(),
+        },
+        "late_concept_calls": len(_late_concepts),
+        "caches": {
+            "concepts": concept_cache.stats(),
+            "code": code_cache.stats(),
+            "progress": progress_cache.stats(),
+            "recent_turns": recent_turns.stats(),
+        },
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.post("/cache/concepts/invalidate")
+async def invalidate_concept_cache(question: Optional[str] = None):
+    """Drop cached concept answers, e.g. after the curriculum is redeployed."""
+    if question is not None:
+        removed = concept_cache.invalidate(normalize_question(question))
+    else:
+        removed = concept_cache.invalidate()
+    logger.info(f"Invalidated {removed} cached concept answers")
+    return {"invalidated": removed}
+
+
+def _too_many_requests(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": e.retry_after_header})
+
+
+async def route_message(message: str, user_id: int,
+                        intent: str) -> Tuple[str, str, Optional[Dict[str, str]]]:
+    """Route to specialist via Dapr service invocation.
+
+    Returns ``(response_text, agent_name, concept)``; ``concept`` holds the
+    ``module`` and ``topic`` the concepts agent answered with, if any.
+    """
     response_text = ""
     agent_name = ""
+    concept = None
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            if intent == "concept":
-                # Route to concepts agent
-                resp = await client.post(
-                    f"{DAPR_URL}/v1.0/invoke/{CONCEPTS_SERVICE}/method/explain",
-                    json={"question": req.message, "user_id": req.user_id}
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                response_text = data.get("explanation", "I can help with that concept.")
-                agent_name = "concepts"
-
-            elif intent == "code":
-                # Route to code runner
-                resp = await client.post(
-                    f"{DAPR_URL}/v1.0/invoke/{CODE_RUNNER_SERVICE}/method/execute",
-                    json={"code": req.message, "language": "python", "timeout": 5}
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                stdout = data.get("stdout", "")
-                stderr = data.get("stderr", "")
-                response_text = f"Output:\n{stdout}" if stdout else f"Error:\n{stderr}"
-                agent_name = "code-runner"
-
+        if intent == "concept":
+            # Route to concepts agent
+            answer = await fetch_concept_within_budget(message, user_id)
+            if answer is None:
+                logger.warning(f"Concept answer exceeded the {CONCEPT_LATENCY_BUDGET}s budget; answering locally")
+                FALLBACKS_TOTAL.inc(intent, "budget")
+                return _fallback_concept_response(message), "triage-fallback", None
+            response_text = answer["explanation"]
+            agent_name = "concepts"
+            if answer["module"]:
+                concept = {"module": answer["module"], "topic": answer["topic"]}
+
+        elif intent == "code":
+            # Route to code runner
+            data, _ = await execute_code(message, user_id)
+            stdout = data.get("stdout", "")
+            stderr = data.get("stderr", "")
+            response_text = f"Output:\n{stdout}" if stdout else f"Error:\n{stderr}"
+            agent_name = "code-runner"
+
+    except AdmissionRejected:
+        raise
+    except DependencyDown as e:
+        # The health monitor already knows; don't wait for a timeout to find out
+        FALLBACKS_TOTAL.inc(intent, "unhealthy")
+        if intent == "concept":
+            response_text = _fallback_concept_response(message)
+        else:
+            response_text = f"Code execution is unavailable right now; try again in {e.retry_after_header}s."
+        agent_name = "triage-fallback"
+    except CircuitOpen as e:
+        FALLBACKS_TOTAL.inc(intent, "circuit_open")
+        if intent == "concept":
+            response_text = _fallback_concept_response(message)
+        else:
+            response_text = f"Code execution is unavailable right now; try again in {e.retry_after_header}s."
+        agent_name = "triage-fallback"
     except httpx.HTTPStatusError as e:
         logger.error(f"Service call failed: {e}")
+        _count_status_error(CONCEPTS_SERVICE if intent == "concept" else CODE_RUNNER_SERVICE, e)
+        FALLBACKS_TOTAL.inc(intent, "status_error")
         response_text = f"I understood your {intent} question, but the specialist is unavailable right now."
         agent_name = "triage"
     except Exception as e:
         logger.error(f"Routing failed: {e}")
+        FALLBACKS_TOTAL.inc(intent, "error")
         # Fallback: provide a direct response
         if intent == "concept":
-            response_text = _fallback_concept_response(req.message)
+            response_text = _fallback_concept_response(message)
             agent_name = "triage-fallback"
         else:
             response_text = "Please use the code editor to run your code."
             agent_name = "triage-fallback"
 
-    # Publish routing event to Kafka
-    try:
-        async with httpx.AsyncClient() as client:
-            await client.post(
-                f"{DAPR_URL}/v1.0/publish/{PUBSUB_NAME}/learning.routed",
-                json={"user_id": req.user_id, "intent": intent, "agent": agent_name}
-            )
-    except Exception:
-        pass  # Non-critical
+    return response_text, agent_name, concept
+
+
+async def store_turn(user_id: int, agent: str, message: str, role: str, created_at: datetime):
+    """Queue a conversation row and add it to the student's recent turns."""
+    turn_id = await conversation_ids.next()
+    if await conversation_writer.put((turn_id, user_id, agent, message, role, created_at)):
+        if RECENT_TURNS_ENABLED:
+            recent_turns.append(user_id, Turn(turn_id, agent, message, role, created_at))
+    else:
+        recent_turns.invalidate(user_id)
+
+
+async def store_user_message(user_id: int, message: str, created_at: datetime):
+    if db.pool:
+        with STAGE_SECONDS.time("store_user_message"):
+            await store_turn(user_id, "triage", message, "user", created_at)
+
+
+async def record_turn(user_id: int, intent: str, agent_name: str, response_text: str,
+                      created_at: datetime, concept: Optional[Dict[str, str]] = None):
+    """Publish the routing event and store the assistant reply."""
+    # Publish routing event to Kafka (queued; sent in bulk in the background).
+    # A resolved concept names its module and topic; the turn's mastery credit
+    # comes from its learning.response.
+    with STAGE_SECONDS.time("publish"):
+        publisher.publish(
+            "learning.routed",
+            {"user_id": user_id, "intent": intent, "agent": agent_name, **(concept or {})}
+        )
 
     # Store assistant response
-    if db_pool and response_text:
-        try:
-            async with db_pool.acquire() as conn:
-                await conn.execute(
-                    "INSERT INTO conversations (user_id, agent, message, role) VALUES ($1, $2, $3, $4)",
-                    req.user_id, agent_name, response_text, "assistant"
-                )
-        except Exception as e:
-            logger.error(f"Failed to store response: {e}")
+    if db.pool and response_text:
+        with STAGE_SECONDS.time("store_assistant_message"):
+            await store_turn(user_id, agent_name, response_text, "assistant", created_at)
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    """Main chat endpoint - classifies intent and routes to specialist.
+
+    The user message is stored while the specialist works, and the reply is
+    stored and published after the response; both run in order per student.
+    """
+    with STAGE_SECONDS.time("classify"):
+        intent = classify_intent(req.message)
+    INTENTS_TOTAL.inc(intent)
+    logger.info(f"User {req.user_id}: intent={intent}, message={req.message[:50]}...")
+
+    chat_tasks.submit(req.user_id, store_user_message, req.user_id, req.message, utcnow())
+
+    try:
+        with STAGE_SECONDS.time("route"):
+            response_text, agent_name, concept = await route_message(req.message, req.user_id, intent)
+    except AdmissionRejected as e:
+        raise _too_many_requests(e)
+    chat_tasks.submit(req.user_id, record_turn, req.user_id, intent, agent_name, response_text, utcnow(),
+                      concept)
 
     return ChatResponse(response=response_text, agent=agent_name, intent=intent)
 
 
+# Agent each intent is routed to, announced before the specialist answers
+PLANNED_AGENTS = {"concept": "concepts", "code": "code-runner"}
+
+_PARAGRAPH_RE = re.compile(r"(?<=\n\n)")
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Server-Sent Events variant of /chat.
+
+    Emits a ``meta`` event with intent and agent immediately, ``chunk``
+    events with the reply, then ``done``. Persistence runs in the
+    background like /chat, so it never delays the stream.
+    """
+    with STAGE_SECONDS.time("classify"):
+        intent = classify_intent(req.message)
+    INTENTS_TOTAL.inc(intent)
+    logger.info(f"User {req.user_id}: intent={intent}, stream, message={req.message[:50]}...")
+
+    chat_tasks.submit(req.user_id, store_user_message, req.user_id, req.message, utcnow())
+
+    async def events():
+        yield _sse("meta", {"intent": intent, "agent": PLANNED_AGENTS[intent]})
+        try:
+            with STAGE_SECONDS.time("route"):
+                response_text, agent_name, concept = await route_message(req.message, req.user_id, intent)
+        except AdmissionRejected as e:
+            yield _sse("error", {"status": 429, "detail": str(e), "retry_after": float(e.retry_after_header)})
+            return
+        # Recorded even if the client goes away while the reply streams
+        chat_tasks.submit(req.user_id, record_turn, req.user_id, intent, agent_name, response_text, utcnow(),
+                          concept)
+        for chunk in _PARAGRAPH_RE.split(response_text):
+            if chunk:
+                yield _sse("chunk", {"text": chunk})
+        yield _sse("done", {"intent": intent, "agent": agent_name})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/run-code")
 async def run_code(req: CodeRequest):
     """Proxy code execution to code-runner service."""
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.post(
-                f"{DAPR_URL}/v1.0/invoke/{CODE_RUNNER_SERVICE}/method/execute",
-                json={"code": req.code, "language": "python", "timeout": 5}
-            )
-            resp.raise_for_status()
-            result = resp.json()
-
-            # Store submission
-            if db_pool:
-                try:
-                    async with db_pool.acquire() as conn:
-                        await conn.execute(
-                            "INSERT INTO code_submissions (user_id, code, stdout, stderr, exit_code) VALUES ($1, $2, $3, $4, $5)",
-                            req.user_id, req.code,
-                            result.get("stdout", ""), result.get("stderr", ""),
-                            result.get("exit_code", 0)
-                        )
-                except Exception:
-                    pass
-
-            return result
+        result, cached = await execute_code(req.code, req.user_id)
+
+        # Store submission
+        if db.pool:
+            await submission_writer.put((
+                req.user_id, req.code,
+                result.get("stdout", ""), result.get("stderr", ""),
+                result.get("exit_code", 0), cached, utcnow(),
+            ))
+
+        return {**result, "cached": cached}
+    except AdmissionRejected as e:
+        raise _too_many_requests(e)
+    except (CircuitOpen, DependencyDown) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after_header})
     except Exception as e:
         logger.error(f"Code execution failed: {e}")
+        if isinstance(e, httpx.HTTPStatusError):
+            _count_status_error(CODE_RUNNER_SERVICE, e)
         raise HTTPException(status_code=502, detail=str(e))
 
 
 @app.get("/progress/{user_id}")
-async def get_progress(user_id: int):
-    """Get student progress."""
-    if not db_pool:
-        raise HTTPException(status_code=503, detail="Database unavailable")
+async def get_progress(user_id: int, request: Request):
+    """Get student progress.
 
-    async with db_pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT module, topic, mastery FROM progress WHERE user_id = $1 ORDER BY module, topic",
-            user_id
-        )
-    return {"user_id": user_id, "progress": [dict(r) for r in rows]}
+    Served from a per-user cache that progress.updated events invalidate,
+    with a TTL as backstop; clients can revalidate with If-None-Match.
+    """
+    async def load() -> Rendered:
+        _database_available()
+        rows = await db.fetch("progress", user_id)
+        return render({"user_id": user_id, "progress": [dict(r) for r in rows]})
 
+    rendered, _ = await progress_cache.get_or_load(user_id, load, sizeof=lambda r: len(r.body))
+    return json_response(request, rendered)
 
-@app.get("/conversations/{user_id}")
-async def get_conversations(user_id: int, limit: int = 20):
-    """Get recent conversations for a user."""
-    if not db_pool:
-        raise HTTPException(status_code=503, detail="Database unavailable")
 
-    async with db_pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT agent, message, role, created_at FROM conversations WHERE user_id = $1 ORDER BY created_at DESC LIMIT $2",
-            user_id, limit
+HISTORY_PAGE_MAX = 200
+HISTORY_EXPORT_PREFETCH = 500
+
+
+def _encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _history_query(before: Optional[str], after: Optional[str]) -> Tuple[str, List[Any], bool]:
+    """Keyset statement on (created_at, id), served by idx_conversations_user_created.
+
+    Returns (statement name, args between user_id and limit, ascending).
+    ``after`` pages toward newer rows, so it scans ascending and the caller
+    reverses the page.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    if before:
+        return "history_before", list(_decode_cursor(before)), False
+    if after:
+        return "history_after", list(_decode_cursor(after)), True
+    return "history_latest", [], False
+
+
+@app.get("/conversations/{user_id}")
+async def get_conversations(user_id: int, limit: Optional[int] = None,
+                            before: Optional[str] = None, after: Optional[str] = None,
+                            format: str = "json"):
+    """Get conversations for a user, newest first.
+
+    Pages with keyset cursors: pass ``next_cursor`` as ``before`` for older
+    turns, or ``prev_cursor`` as ``after`` for newer ones. ``format=ndjson``
+    streams every matching row (or ``limit`` rows) for export.
+
+    The newest page is served from the recent-turns ring when it is complete
+    for the user, and otherwise seeds it.
+    """
+    latest_page = format != "ndjson" and not before and not after
+    if latest_page and RECENT_TURNS_ENABLED:
+        page_limit = max(1, min(limit or 20, HISTORY_PAGE_MAX))
+        turns = recent_turns.latest(user_id, page_limit)
+        if turns is not None:
+            return _history_page(user_id, [t.to_dict() for t in turns])
+
+    _database_available()
+
+    statement, args, ascending = _history_query(before, after)
+
+    if format == "ndjson":
+        # No limit binds NULL, i.e. LIMIT ALL
+        return StreamingResponse(_export_history(statement, [user_id, *args, limit]),
+                                 media_type="application/x-ndjson")
+
+    limit = max(1, min(limit or 20, HISTORY_PAGE_MAX))
+    if latest_page and RECENT_TURNS_ENABLED:
+        # Read enough to fill the ring too
+        fetch_limit = max(limit, recent_turns.per_user)
+        rows = await db.fetch(statement, user_id, *args, fetch_limit)
+        recent_turns.seed(user_id, rows, exhaustive=len(rows) < fetch_limit)
+        rows = rows[:limit]
+    else:
+        rows = await db.fetch(statement, user_id, *args, limit)
+    if ascending:
+        rows = list(reversed(rows))
+
+    return _history_page(user_id, [dict(r) for r in rows])
+
+
+def _history_page(user_id: int, conversations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Response body for a newest-first page of conversation rows."""
+    first, last = (conversations[0], conversations[-1]) if conversations else (None, None)
+    return {
+        "user_id": user_id,
+        "conversations": conversations,
+        "next_cursor": _encode_cursor(last["created_at"], last["id"]) if last else None,
+        "prev_cursor": _encode_cursor(first["created_at"], first["id"]) if first else None,
+    }
+
+
+async def _export_history(statement: str, args: List[Any]):
+    # Server-side cursor: rows are fetched in chunks, never all at once
+    async with db.acquire() as conn:
+        async with conn.transaction(readonly=True):
+            async for row in conn.cursor(STATEMENTS[statement], *args, prefetch=HISTORY_EXPORT_PREFETCH):
+                record = dict(row)
+                record["created_at"] = record["created_at"].isoformat() if record["created_at"] else None
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+# --- Intent replay ---
+
+@app.post("/classify/batch")
+async def classify_batch(req: ClassifyBatchRequest):
+    """Classify stored user messages (or ``messages``) with the live and a candidate keyword set.
+
+    Returns per-intent counts under both, the transitions between them, hit
+    counts for added and removed keywords, and a sample of changed messages.
+    Stored-message replays scan at most ``limit`` rows, which defaults to and
+    may not exceed CLASSIFY_REPLAY_MAX_ROWS.
+    """
+    report = ReplayReport(
+        candidate_classifier(req.concept_keywords, req.code_keywords),
+        samples=max(0, min(req.samples, CLASSIFY_MAX_SAMPLES)),
+    )
+    if req.messages is not None:
+        if len(req.messages) > CLASSIFY_BATCH_MAX_MESSAGES:
+            raise HTTPException(status_code=413, detail=f"At most {CLASSIFY_BATCH_MAX_MESSAGES} messages per batch")
+        await asyncio.get_running_loop().run_in_executor(None, report.add, list(enumerate(req.messages)))
+        return report.to_dict()
+
+    limit = CLASSIFY_REPLAY_MAX_ROWS if req.limit is None else req.limit
+    if not 0 <= limit <= CLASSIFY_REPLAY_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"limit must be between 0 and {CLASSIFY_REPLAY_MAX_ROWS}; use python -m app.replay for larger scans",
         )
-    return {"user_id": user_id, "conversations": [dict(r) for r in rows]}
+    _database_available()
+    # One scan at a time; it holds a pool connection for its whole run
+    if replay_lock.locked():
+        raise HTTPException(status_code=409, detail="A replay is already running")
+    async with replay_lock:
+        async with db.acquire() as conn:
+            await replay(conn, report, req.since, req.until, req.user_id, limit)
+    logger.info(f"Replayed {report.rows} messages; {report.changed} change intent under the candidate keywords")
+    return {**report.to_dict(), "limit": limit, "truncated": report.rows >= limit}
+
+
+# --- Event subscriptions ---
+
+@app.get("/dapr/subscribe")
+async def dapr_subscribe():
+    """Dapr subscription config."""
+    return [
+        {"pubsubname": BROADCAST_PUBSUB_NAME, "topic": "progress.updated", "route": "/events/progress-updated"},
+        {"pubsubname": BROADCAST_PUBSUB_NAME, "topic": "curriculum.reloaded", "route": "/events/curriculum-reloaded"},
+    ]
+
+
+@app.post("/events/progress-updated")
+async def on_progress_updated(event: Dict[str, Any]):
+    """Drop the cached progress of students whose mastery was just written.
+
+    A /progress load already in flight for one of them read the old rows, so
+    it is not cached either (see ``TTLCache.invalidate``).
+    """
+    data = event.get("data", event)
+    user_ids = data.get("user_ids") if isinstance(data, dict) else None
+    for user_id in user_ids or []:
+        progress_cache.invalidate(user_id)
+    return {"status": "SUCCESS"}
+
+
+@app.post("/events/curriculum-reloaded")
+async def on_curriculum_reloaded(event: Dict[str, Any]):
+    """Drop cached concept answers rendered from the previous curriculum."""
+    data = event.get("data", event)
+    version = data.get("version") if isinstance(data, dict) else None
+    removed = concept_cache.invalidate()
+    logger.info(f"Curriculum {version} live; invalidated {removed} cached concept answers")
+    return {"status": "SUCCESS"}
 
 
 @app.get("/")
@@ -276,51 +876,56 @@ async def root():
 
 # --- Fallback responses ---
 
+# Checked in order; the first keyword present in the message wins
+FALLBACK_RESPONSES = {
+    "for loop": (
+        "A **for loop** in Python iterates over a sequence (list, string, range, etc.).\n\n"
+        "```python\n# Basic for loop\nfor i in range(5):\n    print(i)  # prints 0, 1, 2, 3, 4\n\n"
+        "# Looping over a list\nfruits = ['apple', 'banana', 'cherry']\n"
+        "for fruit in fruits:\n    print(fruit)\n```\n\n"
+        "Try writing a for loop in the code editor!"
+    ),
+    "while loop": (
+        "A **while loop** repeats as long as a condition is True.\n\n"
+        "```python\ncount = 0\nwhile count < 5:\n    print(count)\n    count += 1\n```\n\n"
+        "Be careful with infinite loops - always make sure the condition eventually becomes False!"
+    ),
+    "variable": (
+        "A **variable** stores a value that you can use later.\n\n"
+        "```python\nname = 'Maya'  # string variable\nage = 16       # integer variable\npi = 3.14      # float variable\n\nprint(f'{name} is {age} years old')\n```\n\n"
+        "Python variables don't need type declarations - the type is inferred from the value."
+    ),
+    "list": (
+        "A **list** is an ordered, mutable collection in Python.\n\n"
+        "```python\nfruits = ['apple', 'banana', 'cherry']\n\n"
+        "# Access by index\nprint(fruits[0])  # 'apple'\n\n"
+        "# Add items\nfruits.append('date')\n\n"
+        "# Loop through\nfor fruit in fruits:\n    print(fruit)\n```"
+    ),
+    "function": (
+        "A **function** is a reusable block of code.\n\n"
+        "```python\ndef greet(name):\n    return f'Hello, {name}!'\n\n"
+        "result = greet('Maya')\nprint(result)  # 'Hello, Maya!'\n```\n\n"
+        "Functions help organize code and avoid repetition."
+    ),
+}
+
+FALLBACK_DEFAULT = (
+    "Great question! I can help you learn Python. Try asking about:\n"
+    "- Variables and data types\n"
+    "- For loops and while loops\n"
+    "- Lists, dictionaries, and sets\n"
+    "- Functions and classes\n\n"
+    "Or write some code in the editor and I'll help you understand it!"
+)
+
+FALLBACK_MATCHER = KeywordMatcher({kw: [kw] for kw in FALLBACK_RESPONSES})
+
+
 def _fallback_concept_response(message: str) -> str:
     """Provide a basic concept response when concepts-agent is unavailable."""
-    msg = message.lower()
-
-    if "for loop" in msg:
-        return (
-            "A **for loop** in Python iterates over a sequence (list, string, range, etc.).\n\n"
-            "```python\n# Basic for loop\nfor i in range(5):\n    print(i)  # prints 0, 1, 2, 3, 4\n\n"
-            "# Looping over a list\nfruits = ['apple', 'banana', 'cherry']\n"
-            "for fruit in fruits:\n    print(fruit)\n```\n\n"
-            "Try writing a for loop in the code editor!"
-        )
-    elif "while loop" in msg:
-        return (
-            "A **while loop** repeats as long as a condition is True.\n\n"
-            "```python\ncount = 0\nwhile count < 5:\n    print(count)\n    count += 1\n```\n\n"
-            "Be careful with infinite loops - always make sure the condition eventually becomes False!"
-        )
-    elif "variable" in msg:
-        return (
-            "A **variable** stores a value that you can use later.\n\n"
-            "```python\nname = 'Maya'  # string variable\nage = 16       # integer variable\npi = 3.14      # float variable\n\nprint(f'{name} is {age} years old')\n```\n\n"
-            "Python variables don't need type declarations - the type is inferred from the value."
-        )
-    elif "list" in msg:
-        return (
-            "A **list** is an ordered, mutable collection in Python.\n\n"
-            "```python\nfruits = ['apple', 'banana', 'cherry']\n\n"
-            "# Access by index\nprint(fruits[0])  # 'apple'\n\n"
-            "# Add items\nfruits.append('date')\n\n"
-            "# Loop through\nfor fruit in fruits:\n    print(fruit)\n```"
-        )
-    elif "function" in msg:
-        return (
-            "A **function** is a reusable block of code.\n\n"
-            "```python\ndef greet(name):\n    return f'Hello, {name}!'\n\n"
-            "result = greet('Maya')\nprint(result)  # 'Hello, Maya!'\n```\n\n"
-            "Functions help organize code and avoid repetition."
-        )
-    else:
-        return (
-            "Great question! I can help you learn Python. Try asking about:\n"
-            "- Variables and data types\n"
-            "- For loops and while loops\n"
-            "- Lists, dictionaries, and sets\n"
-            "- Functions and classes\n\n"
-            "Or write some code in the editor and I'll help you understand it!"
-        )
+    found = FALLBACK_MATCHER.matches(message.lower())
+    for keyword, response in FALLBACK_RESPONSES.items():
+        if keyword in found:
+            return response
+    return FALLBACK_DEFAULT
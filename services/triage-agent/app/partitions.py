@@ -0,0 +1,360 @@
+"""Month partition upkeep and archival for conversations and code_submissions.
+
+Both tables are range-partitioned by month on ``created_at``
+(k8s/db-migration.sql), so history reads and vacuum only touch the months
+that are still live. ``maintain`` keeps ``PARTITION_MONTHS_AHEAD`` months of
+empty partitions ready, so rows never pile up in the default partition. It
+fills in any months missed since the newest partition, and detaches months
+older than ``PARTITION_RETENTION_MONTHS``. A detached partition is an
+ordinary table that the application no longer sees.
+
+``export`` streams each detached table through a server-side cursor to
+``<dir>/<table>.ndjson.zst`` (``.ndjson.gz`` when zstandard isn't
+installed), one JSON object per row. A ``<table>.manifest.json`` beside it
+records the row count, columns, created_at range and the file's sha256.
+With ``--drop``, the table is dropped only after the file has been read back
+and its row count matches, and then ``code_blobs`` rows that no remaining
+``code_submissions`` row references are deleted.
+
+Run against the database directly with::
+
+    python -m app.partitions maintain [--dry-run]
+    python -m app.partitions export --dir /var/lib/learnflow/archive [--drop]
+    python -m app.partitions list
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import zlib
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+
+from app.db import PG_DATABASE, PG_HOST, PG_PASSWORD, PG_PORT, PG_USER
+
+try:
+    import zstandard
+except ImportError:  # exports fall back to gzip
+    zstandard = None
+
+PARTITIONED_TABLES = ("conversations", "code_submissions")
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+# Whole months kept attached before the current one
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "12"))
+# DETACH waits this long for its lock, then gives up rather than queue writers behind it
+PARTITION_LOCK_TIMEOUT = float(os.getenv("PARTITION_LOCK_TIMEOUT", "5"))
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+EXPORT_ZSTD_LEVEL = int(os.getenv("EXPORT_ZSTD_LEVEL", "10"))
+
+READ_CHUNK_BYTES = 1 << 20
+
+# code_submissions columns holding code_blobs ids
+BLOB_COLUMNS = ("code_blob", "stdout_blob", "stderr_blob")
+
+_BOUND = re.compile(r"FOR VALUES FROM \((.+)\) TO \((.+)\)")
+
+# Archives are self-contained: submission text is resolved from code_blobs
+# the way the code_submission_texts view does it
+ARCHIVE_SELECTS = {
+    "code_submissions": (
+        "SELECT s.id, s.user_id, COALESCE(c.content, s.code) AS code, "
+        "COALESCE(o.content, s.stdout, '') AS stdout, COALESCE(e.content, s.stderr, '') AS stderr, "
+        "s.exit_code, s.cached, s.created_at "
+        'FROM "{table}" s '
+        "LEFT JOIN code_blobs c ON c.id = s.code_blob "
+        "LEFT JOIN code_blobs o ON o.id = s.stdout_blob "
+        "LEFT JOIN code_blobs e ON e.id = s.stderr_blob"
+    ),
+}
+
+
+class Partition:
+    __slots__ = ("name", "lower", "upper")
+
+    def __init__(self, name: str, lower: Optional[datetime], upper: Optional[datetime]):
+        self.name = name
+        # None is MINVALUE below and, for the default partition, unbounded above
+        self.lower = lower
+        self.upper = upper
+
+    @property
+    def is_default(self) -> bool:
+        return self.lower is None and self.upper is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "from": self.lower.isoformat() if self.lower else None,
+            "to": self.upper.isoformat() if self.upper else None,
+        }
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _utc_today() -> date:
+    # created_at is a naive UTC TIMESTAMP
+    return datetime.now(timezone.utc).date()
+
+
+def _parse_bound(value: str) -> Optional[datetime]:
+    value = value.strip()
+    if value == "MINVALUE":
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+async def list_partitions(conn: asyncpg.Connection, parent: str) -> List[Partition]:
+    """The attached partitions of ``parent``, oldest first, default last."""
+    rows = await conn.fetch(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass($1)",
+        parent,
+    )
+    partitions = []
+    for row in rows:
+        match = _BOUND.match(row["bound"])
+        if match:
+            partitions.append(Partition(row["relname"], _parse_bound(match[1]), _parse_bound(match[2])))
+        else:
+            partitions.append(Partition(row["relname"], None, None))
+    partitions.sort(key=lambda p: (p.is_default, p.lower or datetime.min))
+    return partitions
+
+
+async def detached_tables(conn: asyncpg.Connection, parent: str) -> List[str]:
+    """Tables named like partitions of ``parent`` that are no longer attached."""
+    rows = await conn.fetch(
+        "SELECT relname FROM pg_class "
+        "WHERE relkind = 'r' AND NOT relispartition AND pg_table_is_visible(oid) "
+        "AND (relname = $1 || '_legacy' OR relname ~ ('^' || $1 || '_p[0-9]{4}_[0-9]{2}$')) "
+        "ORDER BY relname",
+        parent,
+    )
+    return [row["relname"] for row in rows]
+
+
+async def create_ahead(conn: asyncpg.Connection, parent: str, months_ahead: int,
+                       today: date, dry_run: bool = False) -> List[str]:
+    """Create the partitions for this month and ``months_ahead`` more; returns new names.
+
+    Months missed since the newest partition (the job didn't run, or the
+    ``_legacy`` cutover is behind) are created too. Their rows move out of
+    the default partition as each one is created.
+    """
+    partitions = await list_partitions(conn, parent)
+    first = month_start(today)
+    uppers = [p.upper for p in partitions if p.upper is not None]
+    if uppers:
+        first = min(first, month_start(max(uppers).date()))
+    last = add_months(month_start(today), months_ahead)
+    months = []
+    while first <= last:
+        months.append(first)
+        first = add_months(first, 1)
+    if dry_run:
+        existing = {p.name for p in partitions}
+        return [name for name in (f"{parent}_p{m:%Y_%m}" for m in months) if name not in existing]
+    created = []
+    for month in months:
+        name = await conn.fetchval("SELECT learnflow_create_month_partition($1, $2)", parent, month)
+        if name:
+            created.append(name)
+    return created
+
+
+async def detach_expired(conn: asyncpg.Connection, parent: str, retention_months: int,
+                         today: date, dry_run: bool = False) -> List[str]:
+    """Detach partitions wholly before the retention window; returns their names."""
+    cutoff = datetime.combine(add_months(month_start(today), -retention_months), datetime.min.time())
+    expired = [p for p in await list_partitions(conn, parent)
+               if p.upper is not None and p.upper <= cutoff]
+    if dry_run:
+        return [p.name for p in expired]
+    for partition in expired:
+        # Plain DETACH: CONCURRENTLY isn't allowed while a default partition exists
+        async with conn.transaction():
+            await conn.execute(f"SET LOCAL lock_timeout = '{int(PARTITION_LOCK_TIMEOUT * 1000)}ms'")
+            await conn.execute(f'ALTER TABLE "{parent}" DETACH PARTITION "{partition.name}"')
+    return [p.name for p in expired]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def archive_suffix() -> str:
+    return ".ndjson.zst" if zstandard is not None else ".ndjson.gz"
+
+
+def _open_compressed(path: str):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=EXPORT_ZSTD_LEVEL).stream_writer(open(path, "wb"))
+    return gzip.open(path, "wb")
+
+
+def verify_archive(path: str) -> Dict[str, Any]:
+    """Read an archive back; returns its line count and the compressed file's sha256."""
+    digest = hashlib.sha256()
+    if path.endswith(".zst"):
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    lines = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK_BYTES):
+            digest.update(chunk)
+            lines += decompressor.decompress(chunk).count(b"\n")
+    return {"rows": lines, "sha256": digest.hexdigest()}
+
+
+async def export_table(conn: asyncpg.Connection, table: str, directory: str,
+                       chunk_rows: int = EXPORT_CHUNK_ROWS, select: Optional[str] = None) -> Dict[str, Any]:
+    """Write ``table`` to ``directory`` as compressed NDJSON plus a manifest.
+
+    The file is written under a ``.partial`` name and renamed once complete,
+    then read back; a row count mismatch raises before the manifest is written.
+    ``select`` is the query to export, by default every column of ``table``.
+    """
+    path = os.path.join(directory, table + archive_suffix())
+    partial = path + ".partial"
+    rows = 0
+    first: Optional[datetime] = None
+    last: Optional[datetime] = None
+    # Server-side cursors only live inside a transaction
+    async with conn.transaction(readonly=True):
+        # No ORDER BY: a plain scan streams without sorting the whole month
+        statement = await conn.prepare(select or f'SELECT * FROM "{table}"')
+        columns = [attr.name for attr in statement.get_attributes()]
+        with _open_compressed(partial) as out:
+            cursor = await statement.cursor()
+            while True:
+                records = await cursor.fetch(chunk_rows)
+                if not records:
+                    break
+                lines = []
+                for record in records:
+                    created_at = record["created_at"]
+                    if first is None or created_at < first:
+                        first = created_at
+                    if last is None or created_at > last:
+                        last = created_at
+                    lines.append(json.dumps(dict(record), default=_json_default, ensure_ascii=False))
+                out.write(("\n".join(lines) + "\n").encode())
+                rows += len(records)
+    os.replace(partial, path)
+
+    check = verify_archive(path)
+    if check["rows"] != rows:
+        raise RuntimeError(f"{path}: exported {rows} rows but read back {check['rows']}")
+    manifest = {
+        "table": table,
+        "file": os.path.basename(path),
+        "format": archive_suffix().lstrip("."),
+        "columns": columns,
+        "rows": rows,
+        "bytes": os.path.getsize(path),
+        "sha256": check["sha256"],
+        "created_at": {"min": first.isoformat() if first else None, "max": last.isoformat() if last else None},
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(directory, f"{table}.manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+async def archive_detached(conn: asyncpg.Connection, parent: str, directory: str,
+                           drop: bool = False, chunk_rows: int = EXPORT_CHUNK_ROWS) -> List[Dict[str, Any]]:
+    """Export every detached partition of ``parent``, then drop each one if ``drop``."""
+    results = []
+    for table in await detached_tables(conn, parent):
+        select = ARCHIVE_SELECTS[parent].format(table=table) if parent in ARCHIVE_SELECTS else None
+        manifest = await export_table(conn, table, directory, chunk_rows, select)
+        if drop:
+            await conn.execute(f'DROP TABLE "{table}"')
+        results.append({"table": table, "file": manifest["file"], "rows": manifest["rows"],
+                        "bytes": manifest["bytes"], "dropped": drop})
+    return results
+
+
+async def delete_unreferenced_blobs(conn: asyncpg.Connection) -> int:
+    """Delete blobs that no code_submissions row, attached or detached, points at; returns the count.
+
+    The delete holds a SHARE ROW EXCLUSIVE lock on code_blobs. It waits for
+    submission writes in flight and holds new ones back until it commits, so a
+    writer can't link a blob as it goes. A writer that sent only the hash of a
+    deleted blob sends its text again (``CodeBlobStore.insert_submissions``).
+    """
+    tables = ["code_submissions", *await detached_tables(conn, "code_submissions")]
+    referenced = " UNION ALL ".join(f'SELECT {column} FROM "{table}"' for table in tables for column in BLOB_COLUMNS)
+    async with conn.transaction():
+        await conn.execute(f"SET LOCAL lock_timeout = '{int(PARTITION_LOCK_TIMEOUT * 1000)}ms'")
+        await conn.execute("LOCK TABLE code_blobs IN SHARE ROW EXCLUSIVE MODE")
+        status = await conn.execute(
+            f"DELETE FROM code_blobs b WHERE NOT EXISTS (SELECT 1 FROM ({referenced}) AS r(id) WHERE r.id = b.id)"
+        )
+    return int(status.rsplit(" ", 1)[-1])
+
+
+# --- CLI ---
+
+async def _main(args: argparse.Namespace) -> Dict[str, Any]:
+    conn = await asyncpg.connect(
+        host=PG_HOST, port=int(PG_PORT), user=PG_USER, password=PG_PASSWORD, database=PG_DATABASE,
+    )
+    today = _utc_today()
+    report: Dict[str, Any] = {}
+    try:
+        for parent in PARTITIONED_TABLES:
+            if args.command == "maintain":
+                report[parent] = {
+                    "created": await create_ahead(conn, parent, args.months_ahead, today, args.dry_run),
+                    "detached": await detach_expired(conn, parent, args.retention_months, today, args.dry_run),
+                }
+            elif args.command == "export":
+                report[parent] = await archive_detached(conn, parent, args.dir, args.drop, args.chunk_rows)
+            else:
+                report[parent] = {
+                    "partitions": [p.to_dict() for p in await list_partitions(conn, parent)],
+                    "detached": await detached_tables(conn, parent),
+                }
+        # Also catches up after an earlier run that dropped tables but couldn't take the lock
+        if args.command == "export" and args.drop:
+            report["code_blobs"] = {"deleted": await delete_unreferenced_blobs(conn)}
+    finally:
+        await conn.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create, detach and archive the month partitions of conversations and code_submissions.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    maintain = commands.add_parser("maintain", help="create upcoming partitions and detach expired ones")
+    maintain.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    maintain.add_argument("--retention-months", type=int, default=PARTITION_RETENTION_MONTHS,
+                          help="whole months kept attached before the current one")
+    maintain.add_argument("--dry-run", action="store_true", help="report what would change")
+    export = commands.add_parser("export", help="write detached partitions to compressed NDJSON")
+    export.add_argument("--dir", required=True, help="local directory for the archives")
+    export.add_argument("--drop", action="store_true",
+                        help="drop each table once its archive is verified, then unreferenced code blobs")
+    export.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    commands.add_parser("list", help="show attached and detached partitions")
+    print(json.dumps(asyncio.run(_main(parser.parse_args())), indent=2))
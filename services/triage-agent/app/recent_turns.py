@@ -0,0 +1,184 @@
+"""Per-user ring buffer of the most recent conversation turns.
+
+``chat()`` appends each turn as it is queued for storage (write-through), so
+the newest turns of an active student are in memory seconds before the
+write-behind flush lands them in Postgres. A user's ring becomes
+*complete*, and can answer history reads on its own, once it has been
+seeded from the database; the first read for a user does that. Completeness
+lapses after ``RECENT_TURNS_TTL`` seconds, which bounds how long turns
+written by another replica can go unseen.
+
+Turns are ``__slots__`` objects in a fixed-length deque per user, and
+users are evicted least recently used first once the total passes
+``RECENT_TURNS_MAX_BYTES``.
+"""
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Hashable, Iterable, List, Optional
+
+RECENT_TURNS_ENABLED = os.getenv("RECENT_TURNS_ENABLED", "true").lower() in ("1", "true", "yes")
+RECENT_TURNS_PER_USER = int(os.getenv("RECENT_TURNS_PER_USER", "20"))
+RECENT_TURNS_TTL = float(os.getenv("RECENT_TURNS_TTL", "60"))
+RECENT_TURNS_MAX_BYTES = int(os.getenv("RECENT_TURNS_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Rough per-turn cost beyond the message text: the slotted object, its
+# datetime and the deque slot
+TURN_OVERHEAD_BYTES = 160
+
+
+class Turn:
+    __slots__ = ("id", "agent", "message", "role", "created_at")
+
+    def __init__(self, id: int, agent: str, message: str, role: str, created_at: datetime):
+        self.id = id
+        self.agent = agent
+        self.message = message
+        self.role = role
+        self.created_at = created_at
+
+    @classmethod
+    def from_record(cls, record: Any) -> "Turn":
+        return cls(record["id"], record["agent"], record["message"], record["role"], record["created_at"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "agent": self.agent, "message": self.message,
+                "role": self.role, "created_at": self.created_at}
+
+    @property
+    def size(self) -> int:
+        return len(self.message) + TURN_OVERHEAD_BYTES
+
+
+class _UserTurns:
+    __slots__ = ("turns", "bytes", "synced_at", "exhaustive")
+
+    def __init__(self, capacity: int):
+        self.turns: Deque[Turn] = deque(maxlen=capacity)
+        self.bytes = 0
+        # monotonic time of the last database seed; None until seeded
+        self.synced_at: Optional[float] = None
+        # The ring holds the user's whole history, not just the newest turns
+        self.exhaustive = False
+
+
+class RecentTurns:
+    def __init__(self, per_user: int = RECENT_TURNS_PER_USER, ttl: float = RECENT_TURNS_TTL,
+                 max_bytes: int = RECENT_TURNS_MAX_BYTES):
+        self.per_user = max(1, per_user)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._users: "OrderedDict[Hashable, _UserTurns]" = OrderedDict()
+        self.bytes = 0
+
+        self.appended = 0
+        self.hits = 0
+        self.misses = 0
+        self.seeds = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def append(self, user_id: Hashable, turn: Turn):
+        """Record a turn just queued for storage."""
+        entry = self._entry(user_id)
+        if len(entry.turns) == entry.turns.maxlen:
+            entry.exhaustive = False
+            self._account(entry, -entry.turns[0].size)
+        entry.turns.append(turn)
+        self._account(entry, turn.size)
+        self.appended += 1
+        self._evict()
+
+    def seed(self, user_id: Hashable, records: Iterable[Any], exhaustive: bool):
+        """Fill a user's ring from a newest-first database page.
+
+        Turns appended locally that the page doesn't have yet (still in the
+        write-behind queue) are kept. ``exhaustive`` means the page holds the
+        user's entire history.
+        """
+        entry = self._entry(user_id)
+        turns = {t.id: t for t in entry.turns}
+        for record in records:
+            turns.setdefault(record["id"], Turn.from_record(record))
+        ordered = sorted(turns.values(), key=lambda t: (t.created_at, t.id))
+        entry.exhaustive = exhaustive and len(ordered) <= self.per_user
+        self._account(entry, -entry.bytes)
+        entry.turns.clear()
+        entry.turns.extend(ordered[-self.per_user:])
+        self._account(entry, sum(t.size for t in entry.turns))
+        entry.synced_at = time.monotonic()
+        self.seeds += 1
+        self._evict()
+
+    def latest(self, user_id: Hashable, limit: int) -> Optional[List[Turn]]:
+        """The newest ``limit`` turns, newest first, or None if the ring can't answer."""
+        entry = self._users.get(user_id)
+        if (entry is None or entry.synced_at is None
+                or time.monotonic() - entry.synced_at > self.ttl
+                or (limit > len(entry.turns) and not entry.exhaustive)):
+            self.misses += 1
+            return None
+        self._users.move_to_end(user_id)
+        self.hits += 1
+        turns = list(entry.turns)[-limit:]
+        turns.reverse()
+        return turns
+
+    def recent(self, user_id: Hashable, n: Optional[int] = None) -> List[Turn]:
+        """Whatever turns are in memory for a user, oldest first, complete or not."""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return []
+        turns = list(entry.turns)
+        return turns[-n:] if n else turns
+
+    def invalidate(self, user_id: Optional[Hashable] = None) -> int:
+        """Forget one user, or everyone when ``user_id`` is None; returns users removed."""
+        if user_id is None:
+            count = len(self._users)
+            self._users.clear()
+            self.bytes = 0
+        elif user_id in self._users:
+            self.bytes -= self._users.pop(user_id).bytes
+            count = 1
+        else:
+            return 0
+        self.invalidations += count
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._users),
+            "bytes": self.bytes,
+            "appended": self.appended,
+            "seeds": self.seeds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _entry(self, user_id: Hashable) -> _UserTurns:
+        entry = self._users.get(user_id)
+        if entry is None:
+            entry = self._users[user_id] = _UserTurns(self.per_user)
+        else:
+            self._users.move_to_end(user_id)
+        return entry
+
+    def _account(self, entry: _UserTurns, delta: int):
+        entry.bytes += delta
+        self.bytes += delta
+
+    def _evict(self):
+        # The user just touched is last, so it is only evicted if it alone is over the cap
+        while self.bytes > self.max_bytes and self._users:
+            _, entry = self._users.popitem(last=False)
+            self.bytes -= entry.bytes
+            self.evictions += 1
@@ -0,0 +1,210 @@
+"""Replay stored user messages through the intent classifier.
+
+Streams ``role = 'user'`` rows from ``conversations`` through a server-side
+cursor, ``REPLAY_CHUNK_ROWS`` at a time. Each chunk is classified with the
+live keyword sets and a candidate set in the default executor, so the event
+loop keeps serving while a chunk is scored. Only counters, per-keyword hit counts
+and a fixed-size reservoir sample of changed messages are kept, so memory
+stays constant however many rows are scanned.
+
+Run against the database directly with::
+
+    python -m app.replay --candidate candidate.json [--since 2026-01-01] [--limit 100000]
+
+where ``candidate.json`` is ``{"concept": [...], "code": [...]}``. A group
+that is left out keeps its live keywords.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+from app.db import PG_DATABASE, PG_HOST, PG_PASSWORD, PG_PORT, PG_USER
+from app.intents import CODE_KEYWORDS, CONCEPT_KEYWORDS, DEFAULT_CLASSIFIER, INTENTS, IntentClassifier
+from app.keyword_matcher import KeywordMatcher
+
+REPLAY_CHUNK_ROWS = int(os.getenv("REPLAY_CHUNK_ROWS", "1000"))
+REPLAY_SAMPLES = int(os.getenv("REPLAY_SAMPLES", "20"))
+
+SAMPLE_MESSAGE_CHARS = 200
+
+
+class ReplayReport:
+    """Intent counts under the live and candidate keyword sets, and how they differ."""
+
+    def __init__(self, candidate: IntentClassifier, current: IntentClassifier = DEFAULT_CLASSIFIER,
+                 samples: int = REPLAY_SAMPLES):
+        self.current_classifier = current
+        self.candidate_classifier = candidate
+        self.max_samples = samples
+        self._rng = random.Random()
+        self._started = time.monotonic()
+
+        self.added: Dict[str, List[str]] = {}
+        self.removed: Dict[str, List[str]] = {}
+        for intent in INTENTS:
+            live, cand = set(current.keywords[intent]), set(candidate.keywords[intent])
+            self.added[intent] = sorted(cand - live)
+            self.removed[intent] = sorted(live - cand)
+        changed_keywords = {kw for kws in (*self.added.values(), *self.removed.values()) for kw in kws}
+        self._diff_matcher = KeywordMatcher({kw: [kw] for kw in changed_keywords}) if changed_keywords else None
+
+        self.rows = 0
+        self.changed = 0
+        self.current = {intent: 0 for intent in INTENTS}
+        self.candidate = {intent: 0 for intent in INTENTS}
+        self.transitions: Dict[Tuple[str, str], int] = {}
+        self.keyword_hits = {kw: 0 for kw in sorted(changed_keywords)}
+        self.samples: List[Dict[str, Any]] = []
+
+    def add(self, rows: Sequence[Tuple[Any, str]]):
+        """Classify one chunk of ``(id, message)`` rows."""
+        messages = [message for _, message in rows]
+        current = self.current_classifier.classify_many(messages)
+        candidate = self.candidate_classifier.classify_many(messages)
+        for (row_id, message), before, after in zip(rows, current, candidate):
+            self.rows += 1
+            self.current[before] += 1
+            self.candidate[after] += 1
+            if before != after:
+                self.changed += 1
+                self.transitions[(before, after)] = self.transitions.get((before, after), 0) + 1
+                self._sample(row_id, message, before, after)
+        if self._diff_matcher is not None:
+            for message in messages:
+                for kw in self._diff_matcher.matches(message.lower()):
+                    self.keyword_hits[kw] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started
+        return {
+            "rows": self.rows,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "rows_per_sec": round(self.rows / elapsed, 1) if elapsed > 0 else 0.0,
+            "current": self.current,
+            "candidate": self.candidate,
+            "changed": self.changed,
+            "transitions": {f"{a}->{b}": n for (a, b), n in sorted(self.transitions.items())},
+            "keywords": {"added": self.added, "removed": self.removed},
+            "keyword_hits": self.keyword_hits,
+            "samples": self.samples,
+        }
+
+    def _sample(self, row_id: Any, message: str, before: str, after: str):
+        # Reservoir sampling over changed messages: each is kept with equal probability
+        if len(self.samples) < self.max_samples:
+            index = len(self.samples)
+            self.samples.append({})
+        else:
+            index = self._rng.randrange(self.changed)
+            if index >= self.max_samples:
+                return
+        self.samples[index] = {
+            "id": row_id, "message": message[:SAMPLE_MESSAGE_CHARS], "current": before, "candidate": after,
+        }
+
+
+def candidate_classifier(concept_keywords: Optional[Iterable[str]] = None,
+                         code_keywords: Optional[Iterable[str]] = None) -> IntentClassifier:
+    """A classifier with the given keyword sets, falling back to the live ones."""
+    return IntentClassifier(
+        CONCEPT_KEYWORDS if concept_keywords is None else concept_keywords,
+        CODE_KEYWORDS if code_keywords is None else code_keywords,
+    )
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # created_at is a naive UTC TIMESTAMP
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def replay_query(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 user_id: Optional[int] = None, limit: Optional[int] = None) -> Tuple[str, List[Any]]:
+    # No ORDER BY: a plain scan streams without sorting millions of rows
+    sql = "SELECT id, message FROM conversations WHERE role = 'user'"
+    args: List[Any] = []
+    for clause, value in (("created_at >= ", _naive_utc(since)), ("created_at < ", _naive_utc(until)),
+                          ("user_id = ", user_id)):
+        if value is not None:
+            args.append(value)
+            sql += f" AND {clause}${len(args)}"
+    if limit is not None:
+        args.append(limit)
+        sql += f" LIMIT ${len(args)}"
+    return sql, args
+
+
+async def replay(conn: asyncpg.Connection, report: ReplayReport,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 user_id: Optional[int] = None, limit: Optional[int] = None,
+                 chunk_rows: int = REPLAY_CHUNK_ROWS,
+                 on_chunk: Optional[Callable[[ReplayReport], Awaitable[None]]] = None) -> ReplayReport:
+    """Stream matching user messages into ``report`` one chunk at a time."""
+    sql, args = replay_query(since, until, user_id, limit)
+    loop = asyncio.get_running_loop()
+    # Server-side cursors only live inside a transaction
+    async with conn.transaction(readonly=True):
+        cursor = await conn.cursor(sql, *args)
+        while True:
+            rows = await cursor.fetch(chunk_rows)
+            if not rows:
+                break
+            await loop.run_in_executor(None, report.add, [(row["id"], row["message"]) for row in rows])
+            if on_chunk:
+                await on_chunk(report)
+    return report
+
+
+# --- CLI ---
+
+async def _main(args: argparse.Namespace) -> Dict[str, Any]:
+    candidate: Dict[str, List[str]] = {}
+    if args.candidate:
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+    report = ReplayReport(
+        candidate_classifier(candidate.get("concept"), candidate.get("code")), samples=args.samples,
+    )
+
+    next_progress = args.progress
+
+    async def progress(r: ReplayReport):
+        nonlocal next_progress
+        if args.progress and r.rows >= next_progress:
+            next_progress += args.progress
+            print(f"{r.rows} rows, {r.to_dict()['rows_per_sec']:.0f} rows/s, "
+                  f"{r.changed} changed", file=sys.stderr)
+
+    conn = await asyncpg.connect(
+        host=PG_HOST, port=int(PG_PORT), user=PG_USER, password=PG_PASSWORD, database=PG_DATABASE,
+    )
+    try:
+        await replay(conn, report, args.since, args.until, args.user_id, args.limit,
+                     chunk_rows=args.chunk_rows, on_chunk=progress)
+    finally:
+        await conn.close()
+    return report.to_dict()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay stored user messages through the live and a candidate intent keyword set.",
+    )
+    parser.add_argument("--candidate", help='JSON file with {"concept": [...], "code": [...]}')
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only messages at or after this ISO time (UTC)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="only messages before this ISO time (UTC)")
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--samples", type=int, default=REPLAY_SAMPLES, help="changed messages to show")
+    parser.add_argument("--chunk-rows", type=int, default=REPLAY_CHUNK_ROWS)
+    parser.add_argument("--progress", type=int, default=100000, help="report every N rows on stderr (0: off)")
+    print(json.dumps(asyncio.run(_main(parser.parse_args())), indent=2, ensure_ascii=False))
@@ -0,0 +1,206 @@
+"""Write-behind buffering for append-only inserts.
+
+Rows are queued in memory on the request path and a background worker
+flushes them in bulk with ``COPY`` once a batch fills up or the flush
+interval elapses, so requests no longer hold a pool connection per insert.
+"""
+import asyncio
+import os
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+from learnflow_common.metrics import timed_acquire
+
+from app.db import insert_sql
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.2"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+WRITE_BEHIND_ENQUEUE_TIMEOUT = float(os.getenv("WRITE_BEHIND_ENQUEUE_TIMEOUT", "1.0"))
+
+_STOP = object()
+
+
+def utcnow() -> datetime:
+    """Naive UTC timestamp matching the ``TIMESTAMP DEFAULT NOW()`` columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class WriteBehindBuffer:
+    """Bounded in-process queue of rows flushed to one table in batches.
+
+    ``put()`` waits up to ``enqueue_timeout`` for space when the queue is
+    full (backpressure) and drops the row after that, counting it. Rows
+    dropped after a failed flush are passed to ``on_drop``, if given.
+
+    Batches are written with ``COPY`` into ``columns``, or handed to
+    ``writer(conn, rows)`` for tables that need more than a plain insert.
+    """
+
+    def __init__(self, table: str, columns: Sequence[str],
+                 pool_getter: Callable[[], Optional[asyncpg.Pool]],
+                 batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+                 max_pending: int = WRITE_BEHIND_MAX_PENDING,
+                 enqueue_timeout: float = WRITE_BEHIND_ENQUEUE_TIMEOUT,
+                 on_drop: Optional[Callable[[List[Tuple[Any, ...]]], None]] = None,
+                 writer: Optional[Callable[[asyncpg.Connection, List[Tuple[Any, ...]]], Awaitable[None]]] = None):
+        self.table = table
+        self.columns = tuple(columns)
+        self._pool_getter = pool_getter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._on_drop = on_drop
+        self._writer = writer
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._worker: Optional[asyncio.Task] = None
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flush_ms_total = 0.0
+        self.flush_ms_max = 0.0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run(), name=f"write-behind-{self.table}")
+
+    async def stop(self):
+        """Flush everything still queued and stop the worker."""
+        if self._worker is None:
+            return
+        await self._queue.put(_STOP)
+        await self._worker
+        self._worker = None
+        remaining = []
+        while not self._queue.empty():
+            row = self._queue.get_nowait()
+            if row is not _STOP:
+                remaining.append(row)
+        for i in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[i:i + self.batch_size])
+
+    async def put(self, row: Tuple[Any, ...]) -> bool:
+        """Queue a row for insertion; returns False if it had to be dropped."""
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(row), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                logger.warning(f"Write-behind queue for {self.table} full; dropped row")
+                return False
+        self.enqueued += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "flush_ms_avg": round(self.flush_ms_total / self.flushes, 3) if self.flushes else 0.0,
+            "flush_ms_max": round(self.flush_ms_max, 3),
+            "last_flush_ms": round(self.last_flush_ms, 3),
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await self._queue.get()
+            if row is _STOP:
+                return
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[Tuple[Any, ...]]):
+        if not batch:
+            return
+        pool = self._pool_getter()
+        if pool is None:
+            self._drop(batch)
+            return
+        start = time.perf_counter()
+        try:
+            async with timed_acquire(pool) as conn:
+                if self._writer is not None:
+                    await self._writer(conn, batch)
+                else:
+                    await conn.copy_records_to_table(self.table, records=batch, columns=self.columns)
+            self.written += len(batch)
+        except asyncpg.PostgresError as e:
+            # A single bad row (e.g. unknown user_id) fails the whole COPY;
+            # salvage the rest one by one
+            logger.error(f"Bulk insert into {self.table} failed, retrying row by row: {e}")
+            self.failed_flushes += 1
+            await self._flush_rows(pool, batch)
+        except Exception as e:
+            logger.error(f"Bulk insert into {self.table} failed: {e}")
+            self.failed_flushes += 1
+            self._drop(batch)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.flushes += 1
+            self.flush_ms_total += elapsed
+            self.flush_ms_max = max(self.flush_ms_max, elapsed)
+            self.last_flush_ms = elapsed
+
+    async def _flush_rows(self, pool: asyncpg.Pool, batch: List[Tuple[Any, ...]]):
+        # Same text as the prepared insert statement, so the connection reuses it
+        query = insert_sql(self.table, self.columns)
+        handled = 0
+        try:
+            async with timed_acquire(pool) as conn:
+                for row in batch:
+                    try:
+                        if self._writer is not None:
+                            await self._writer(conn, [row])
+                        else:
+                            await conn.execute(query, *row)
+                        self.written += 1
+                    except asyncpg.PostgresError:
+                        self._drop([row])
+                    handled += 1
+        except Exception as e:
+            logger.error(f"Row-by-row insert into {self.table} failed: {e}")
+            self._drop(batch[handled:])
+
+    def _drop(self, rows: List[Tuple[Any, ...]]):
+        self.dropped += len(rows)
+        if self._on_drop is not None and rows:
+            try:
+                self._on_drop(rows)
+            except Exception as e:
+                logger.error(f"on_drop callback for {self.table} failed: {e}")